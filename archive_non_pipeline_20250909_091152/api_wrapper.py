@@ -14,6 +14,10 @@ from datetime import datetime
 import hashlib
 import shutil
 
+# Shared pipeline modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_extraction import PDF_BACKENDS, get_pdf_backend
+
 def run_cmd(cmd):
     """Execute a command and return output."""
     try:
@@ -81,7 +85,13 @@ def validate_pipeline_output(run_dir, start_time):
     if not os.path.exists(transcript_chunks_dir):
         return False, "transcript_chunks directory not created"
     
-    transcript_files = [f for f in os.listdir(transcript_chunks_dir) if f.endswith('.txt')]
+    # Chunks are indexed in chunk_index.json (chunk_N.txt files only with --chunk_files)
+    chunk_index = os.path.join(transcript_chunks_dir, 'chunk_index.json')
+    if os.path.exists(chunk_index):
+        with open(chunk_index, 'r', encoding='utf-8') as f:
+            transcript_files = json.load(f).get('chunks', [])
+    else:
+        transcript_files = [f for f in os.listdir(transcript_chunks_dir) if f.endswith('.txt')]
     if not transcript_files:
         return False, "No transcript text chunks were generated"
     
@@ -98,7 +108,7 @@ def validate_pipeline_output(run_dir, start_time):
     
     return True, f"Pipeline validation passed: {len(transcript_files)} chunks, {len(chunk_output_files)} outputs"
 
-def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000"):
+def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000", concurrency=None, pdf_backend=None):
     """
     Main API function for renovation estimation.
     
@@ -107,6 +117,8 @@ def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000
         polycam_path (str): Path to polycam PDF
         api_key (str): OpenAI API key
         max_tokens (str): Max tokens per chunk
+        concurrency (int): Max concurrent LLM group requests (None uses the pipeline default)
+        pdf_backend (str): PDF text extraction backend for the preflight and pipeline (None uses the default)
     
     Returns:
         dict: JSON response with status, files, and metadata
@@ -123,7 +135,9 @@ def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000
             "start_time": start_time.isoformat(),
             "transcript_file": transcript_path,
             "polycam_file": polycam_path,
-            "max_tokens": max_tokens
+            "max_tokens": max_tokens,
+            "concurrency": concurrency,
+            "pdf_backend": pdf_backend
         }
     }
     
@@ -148,21 +162,20 @@ def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000
         if transcript_ext == '.pdf':
             # Validate PDF transcript
             try:
-                import pdfplumber
-                with pdfplumber.open(transcript_path) as pdf:
-                    if len(pdf.pages) == 0:
-                        response["message"] = "Transcript PDF appears to be empty or corrupted"
-                        return response
-                    
-                    # Try to extract text from first page
-                    first_page = pdf.pages[0]
-                    text = first_page.extract_text()
-                    if not text or len(text.strip()) < 100:
-                        response["message"] = "Transcript PDF contains insufficient text for processing"
-                        return response
-                    
-                    print(f"[API] ✅ PDF transcript validated: {len(text)} characters")
-                    
+                backend = get_pdf_backend(pdf_backend)
+                if backend['page_count'](transcript_path) == 0:
+                    response["message"] = "Transcript PDF appears to be empty or corrupted"
+                    return response
+                
+                # Try to extract text from first page
+                first_page = list(backend['page_texts'](transcript_path, 0, 1))
+                text = first_page[0] if first_page else None
+                if not text or len(text.strip()) < 100:
+                    response["message"] = "Transcript PDF contains insufficient text for processing"
+                    return response
+                
+                print(f"[API] ✅ PDF transcript validated: {len(text)} characters")
+                
             except Exception as e:
                 response["message"] = f"Failed to validate transcript PDF: {str(e)}"
                 return response
@@ -248,6 +261,10 @@ def estimate_renovation(transcript_path, polycam_path, api_key, max_tokens="3000
             f'--api_key {shlex.quote(api_key)} '
             f'--max_tokens {shlex.quote(str(max_tokens))}'
         )
+        if concurrency:
+            cmd += f' --concurrency {int(concurrency)}'
+        if pdf_backend:
+            cmd += f' --pdf_backend {shlex.quote(pdf_backend)}'
         print(f"[API] Executing command: {cmd}")
         
         # Ensure API key is available via environment as well
@@ -427,12 +444,15 @@ def main():
     parser.add_argument("--polycam", required=True, help="Path to polycam PDF file")
     parser.add_argument("--api_key", required=True, help="OpenAI API key")
     parser.add_argument("--max_tokens", default="3000", help="Max tokens per chunk (default: 3000)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Max concurrent LLM group requests")
+    parser.add_argument("--pdf_backend", choices=sorted(PDF_BACKENDS), default=None, help="PDF text extraction backend (default: pdfplumber)")
     parser.add_argument("--output_json", help="Output JSON file path (optional)")
     
     args = parser.parse_args()
     
     # Run estimation
-    result = estimate_renovation(args.transcript, args.polycam, args.api_key, args.max_tokens)
+    result = estimate_renovation(args.transcript, args.polycam, args.api_key, args.max_tokens, args.concurrency,
+                                 args.pdf_backend)
     
     # Output result
     if args.output_json:
@@ -15,6 +15,7 @@ import shutil
 from datetime import datetime
 import traceback
 from archive_non_pipeline_20250909_091152.api_wrapper import estimate_renovation
+from pricing_catalog import get_catalog
 import requests
 import json
 from werkzeug.utils import secure_filename
@@ -57,13 +58,13 @@ def allowed_file(filename):
     """Check if file has allowed extension."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_estimation_async(job_id, transcript_path, polycam_path, api_key, max_tokens):
+def process_estimation_async(job_id, transcript_path, polycam_path, api_key, max_tokens, concurrency=None):
     """Process estimation in background thread."""
     try:
         jobs[job_id]['status'] = 'processing'
         jobs[job_id]['message'] = 'Starting estimation...'
         
-        result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens))
+        result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens), concurrency)
         
         if result["status"] == "success":
             jobs[job_id]['status'] = 'completed'
@@ -91,6 +92,7 @@ class FlexibleEstimateRequest(BaseModel):
     # Controls
     api_key: Optional[str] = None
     max_tokens: Optional[int] = 3000
+    concurrency: Optional[int] = None  # max concurrent LLM group requests
     response_mode: Optional[str] = "json"  # json | file | base64
 
 class EstimationResponse(BaseModel):
@@ -101,14 +103,32 @@ class EstimationResponse(BaseModel):
     file_info: Optional[dict] = None
     metadata: Optional[dict] = None
 
+@app.on_event("startup")
+async def load_pricing_catalog():
+    """Load the master pricing catalog (compiled snapshot when built) before serving requests."""
+    start = time.perf_counter()
+    try:
+        catalog = get_catalog()
+    except Exception as e:
+        print(f"[WARNING] Pricing catalog not loaded at startup: {e}")
+        return
+    print(f"[INFO] Pricing catalog {catalog.version or 'CSV'}: {len(catalog)} rows "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
+    try:
+        catalog = get_catalog()
+        pricing = {"version": catalog.version, "effective_date": catalog.effective_date, "rows": len(catalog)}
+    except Exception as e:
+        pricing = {"error": str(e)}
     return {
         "status": "healthy",
         "service": "renovation-estimation-api",
         "timestamp": datetime.now().isoformat(),
-        "api_key_set": bool(os.environ.get('OPENAI_API_KEY'))
+        "api_key_set": bool(os.environ.get('OPENAI_API_KEY')),
+        "pricing": pricing
     }
 
 # Multipart/form-data endpoint (kept for compatibility with PA file uploads)
@@ -120,6 +140,7 @@ async def estimate(
     polycam_url: Optional[str] = Form(None),
     api_key: Optional[str] = Form(None),
     max_tokens: Optional[int] = Form(3000),
+    concurrency: Optional[int] = Form(None),
     return_file: Optional[bool] = Form(False),
     response_mode: Optional[str] = Form(None)
 ):
@@ -133,6 +154,7 @@ async def estimate(
     - polycam_url: URL to polycam PDF (alternative to polycam file)
     - api_key: OpenAI API key
     - max_tokens: Max tokens per chunk
+    - concurrency: Max concurrent LLM group requests
     - return_file: If true, returns file directly instead of JSON
     
     Returns:
@@ -201,7 +223,7 @@ async def estimate(
             print(f"[API] Processing files: {transcript_path}, {polycam_path}")
 
             # Run estimation
-            result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens))
+            result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens), concurrency)
 
             if result["status"] == "success":
                 # Copy only the Excel file to accessible location
@@ -351,7 +373,7 @@ async def estimate_json(payload: FlexibleEstimateRequest = Body(...)):
                 raise HTTPException(status_code=400, detail="No API key provided. Set OPENAI_API_KEY or pass api_key")
 
             print(f"[API] Processing files: {transcript_path}, {polycam_path}")
-            result = estimate_renovation(transcript_path, polycam_path, api_key, str(payload.max_tokens or 3000))
+            result = estimate_renovation(transcript_path, polycam_path, api_key, str(payload.max_tokens or 3000), payload.concurrency)
 
             if result.get("status") != "success":
                 raise HTTPException(status_code=400, detail=result.get("message", "Estimation failed"))
@@ -411,6 +433,7 @@ async def estimate_files(
     polycam: UploadFile = File(...),
     api_key: Optional[str] = Form(None),
     max_tokens: Optional[int] = Form(3000),
+    concurrency: Optional[int] = Form(None),
     response_mode: Optional[str] = Form("json")
 ):
     """
@@ -441,7 +464,7 @@ async def estimate_files(
                 raise HTTPException(status_code=400, detail="No API key provided. Set OPENAI_API_KEY or pass api_key")
 
             print(f"[API] Processing files: {transcript_path}, {polycam_path}")
-            result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens))
+            result = estimate_renovation(transcript_path, polycam_path, api_key, str(max_tokens), concurrency)
 
             if result.get("status") != "success":
                 raise HTTPException(status_code=400, detail=result.get("message", "Estimation failed"))
@@ -638,13 +661,14 @@ async def estimate_async(payload: FlexibleEstimateRequest = Body(...)):
                 'transcript_path': transcript_path,
                 'polycam_path': polycam_path,
                 'api_key': api_key,
-                'max_tokens': payload.max_tokens or 3000
+                'max_tokens': payload.max_tokens or 3000,
+                'concurrency': payload.concurrency
             }
 
             # Start background processing
             thread = threading.Thread(
                 target=process_estimation_async,
-                args=(job_id, transcript_path, polycam_path, api_key, payload.max_tokens or 3000)
+                args=(job_id, transcript_path, polycam_path, api_key, payload.max_tokens or 3000, payload.concurrency)
             )
             thread.daemon = True
             thread.start()
@@ -846,6 +870,7 @@ async def index():
                     "polycam_url": "URL to polycam PDF (alternative to polycam file)",
                     "api_key": "Optional: OpenAI API key (or set OPENAI_API_KEY env var)",
                     "max_tokens": "Optional: Max tokens per chunk (default: 3000)",
+                    "concurrency": "Optional: Max concurrent LLM group requests (default: 4)",
                     "return_file": "Optional: If 'true', returns Excel file directly instead of JSON response",
                     "response_mode": "Optional: json | file | base64 (overrides return_file)"
                 }
@@ -862,6 +887,7 @@ async def index():
                     "polycam_url": "URL to polycam PDF (alternative to polycam_base64)",
                     "api_key": "Optional: OpenAI API key (or set OPENAI_API_KEY env var)",
                     "max_tokens": "Optional: Max tokens per chunk (default: 3000)",
+                    "concurrency": "Optional: Max concurrent LLM group requests (default: 4)",
                     "response_mode": "json | file | base64 (default: json)"
                 }
             }
@@ -4,9 +4,14 @@ import os
 import argparse
 import os
 import re
+import sys
 from pathlib import Path
 import pdfplumber
 
+# Shared PDF extraction (parallel for long PDFs) lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_extraction import iter_pdf_pages
+
 def count_tokens(text, encoding_name="cl100k_base"):
     try:
         import tiktoken
@@ -70,7 +75,7 @@ def split_by_tokens(text, max_tokens, encoding_name="cl100k_base"):
     
     return chunks
 
-def extract_text_by_section(pdf_path, output_dir, section_keywords=None, max_tokens=None):
+def extract_text_by_section(pdf_path, output_dir, section_keywords=None, max_tokens=None, workers=None):
     if section_keywords is None:
         section_keywords = [
             'kitchen', 'bathroom', 'bedroom', 'living room', 'dining room', 'foyer', 'hallway', 'closet',
@@ -82,8 +87,8 @@ def extract_text_by_section(pdf_path, output_dir, section_keywords=None, max_tok
     section_keywords = [kw.lower() for kw in section_keywords]
     
     # Extract full text first
-    with pdfplumber.open(pdf_path) as pdf:
-        full_text = "\n".join(page.extract_text() or '' for page in pdf.pages)
+    page_texts = list(iter_pdf_pages(pdf_path, workers, keep_empty=True))
+    full_text = "\n".join(page_texts)
     
     print(f"[INFO] Full text extracted: {len(full_text)} characters")
     
@@ -105,12 +110,10 @@ def extract_text_by_section(pdf_path, output_dir, section_keywords=None, max_tok
             print(f"[INFO] Created {len(chunks)} exhaustive chunks from {len(full_text)} characters")
         else:
             # If no max_tokens specified, create one chunk per page as fallback
-            with pdfplumber.open(pdf_path) as pdf:
-                for i, page in enumerate(pdf.pages, 1):
-                    text = page.extract_text() or ''
-                    out_path = Path(output_dir) / f"chunk_page_{i}.txt"
-                    with open(out_path, 'w', encoding='utf-8') as f:
-                        f.write(text)
+            for i, text in enumerate(page_texts, 1):
+                out_path = Path(output_dir) / f"chunk_page_{i}.txt"
+                with open(out_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
             print(f"[INFO] Created page-based chunks as fallback")
         return
     
@@ -178,8 +181,9 @@ def main():
     parser.add_argument("pdf", help="Input PDF file")
     parser.add_argument("--output_dir", default="chunks", help="Directory to save text chunks")
     parser.add_argument("--max_tokens", type=int, default=10000, help="Maximum tokens per chunk (optimized for GPT-4o 128k context window)")
+    parser.add_argument("--pdf_workers", type=int, default=None, help="PDF extraction processes (default: ESTIMATOR_PDF_WORKERS or CPU count; 1 = serial)")
     args = parser.parse_args()
-    extract_text_by_section(args.pdf, args.output_dir, max_tokens=args.max_tokens)
+    extract_text_by_section(args.pdf, args.output_dir, max_tokens=args.max_tokens, workers=args.pdf_workers)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
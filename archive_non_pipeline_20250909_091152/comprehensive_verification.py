@@ -4,6 +4,13 @@ Comprehensive verification of pricing sources and scope coverage
 """
 import csv
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pricing_catalog import get_catalog
+from pricing_matcher import MIN_PRICED_SCORE, get_matcher
+
+PRICING_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'master_pricing_data.csv')
 
 def analyze_pricing_sources():
     """Analyze which items use internal pricing vs estimated rates."""
@@ -18,59 +25,23 @@ def analyze_pricing_sources():
     
     print(f"📊 Total items in estimate: {len(items)}")
     
-    # Define internal pricing rates from master sheet
-    internal_rates = {
-        # Demolition
-        'DEMO-07': {'rate': 7.00, 'description': 'Demolition 1200-1800 SF'},
-        'DEMO-08': {'rate': 7.00, 'description': 'Demolition 600-1200 SF'},
-        'DEMO-09': {'rate': 5.00, 'description': 'Demolition 1200-1800 SF'},
-        'DEMO-10': {'rate': 4.00, 'description': 'Demolition 1800-2500 SF'},
-        'DEMO-11': {'rate': 4.00, 'description': 'Demolition 2500 SF+'},
-        'DEMO-12': {'rate': 11.00, 'description': 'Full gut HYBRID'},
-        
-        # Framing
-        'FRAM-01': {'rate': 77.00, 'description': 'Metal framing 8-10 ft high'},
-        'FRAM-02': {'rate': 9.00, 'description': 'Dropped ceiling SF'},
-        'FRAM-03': {'rate': 6.00, 'description': 'Mounted metal ceiling framing'},
-        'FRAM-04': {'rate': 55.00, 'description': 'Frame new soffit'},
-        
-        # Drywall
-        'CARP-10': {'rate': 4.00, 'description': '5/8" drywall wall board'},
-        'CARP-11': {'rate': 4.95, 'description': '5/8" drywall ceiling board'},
-        'CARP-12': {'rate': 7.70, 'description': '5/8" drywall quadrock'},
-        
-        # Finishes
-        'FINSH-02': {'rate': 4.00, 'description': 'Ceiling painting'},
-        'FINSH-04': {'rate': 18.00, 'description': 'Tile installation'},
-        'FINSH-05': {'rate': 10.30, 'description': 'Benjamin Moore paint'},
-        'FINSH-06': {'rate': 6.00, 'description': 'Engineered flooring'},
-        
-        # Electrical
-        'ELEC-02': {'rate': 175.00, 'description': 'Light fixture'},
-        'ELEC-05': {'rate': 165.00, 'description': 'Light fixture'},
-        'ELEC-06': {'rate': 55.00, 'description': 'Outlet'},
-        'ELEC-08': {'rate': 165.00, 'description': 'Pendant lighting'},
-        'ELEC-09': {'rate': 165.00, 'description': 'Recessed lighting'},
-        'ELEC-12': {'rate': 440.00, 'description': 'Outlet new location'},
-        
-        # Plumbing
-        'PLMB-13': {'rate': 750.00, 'description': 'New sink installation'},
-        'PLMB-14': {'rate': 650.00, 'description': 'New toilet installation'},
-        
-        # Doors
-        'DOOR-01': {'rate': 550.00, 'description': 'Standard door'},
-        'DOOR-03': {'rate': 825.00, 'description': 'Double door'},
-        
-        # Kitchen/Millwork
-        'KITC-10': {'rate': 800.00, 'description': 'Kitchen cabinets standard'},
-        'KITC-14': {'rate': 2400.00, 'description': 'Island cost'},
-        
-        # Stone
-        'STON-02': {'rate': 97.00, 'description': 'Kitchen countertop fabricate/install'},
-        
-        # Cleaning
-        'CLEN-05': {'rate': 4400.00, 'description': 'Commercial cleaning 2500 SF+'}
-    }
+    # Internal pricing from the master sheet: an item matches when the row it names
+    # (ItemCode) or, without one, a row its name and description match has its
+    # rate, as labor alone or labor + material. Rows merely sharing a price do not.
+    catalog = get_catalog(PRICING_CSV)
+    matches = get_matcher(PRICING_CSV).match([f"{item['ItemName']} {item.get('Description', '')[:120]}" for item in items])
+
+    def internal_rate(item, unit_cost, candidates):
+        code = (item.get('ItemCode') or '').strip()
+        if code:
+            records = [catalog.get(code)] if catalog.get(code) else []
+        else:
+            records = [record for record, score in candidates if score >= MIN_PRICED_SCORE]
+        for record in records:
+            if any(rate is not None and round(float(rate), 2) == round(unit_cost, 2)
+                   for rate in (record['labor'], record['unit_cost'])):
+                return record['item_code'], record['description']
+        return None
     
     # Analyze each item
     internal_pricing_count = 0
@@ -80,22 +51,19 @@ def analyze_pricing_sources():
     print("\n📋 ITEM ANALYSIS:")
     print("-" * 80)
     
-    for item in items:
+    for item, candidates in zip(items, matches):
         item_name = item['ItemName']
         unit_cost = float(item['UnitCost'].replace('$', ''))
         markup = float(item['Markup'])
         confidence = item['Confidence']
         
         # Check if this matches internal pricing
-        found_internal = False
-        for code, details in internal_rates.items():
-            if abs(unit_cost - details['rate']) < 0.01:  # Exact match
-                print(f"✅ {item_name:35} | ${unit_cost:>8.2f} | {code:>8} | {details['description']}")
-                internal_pricing_count += 1
-                found_internal = True
-                break
-        
-        if not found_internal:
+        match = internal_rate(item, unit_cost, candidates)
+        if match:
+            code, description = match
+            print(f"✅ {item_name:35} | ${unit_cost:>8.2f} | {code:>8} | {description}")
+            internal_pricing_count += 1
+        else:
             print(f"⚠️  {item_name:35} | ${unit_cost:>8.2f} | {'ESTIMATED':>8} | Market rate")
             estimated_pricing_count += 1
     
@@ -1,10 +1,20 @@
 #!/usr/bin/env python3
+import argparse
 import json
 import csv
 import os
-import openai
+import sys
 from collections import defaultdict
 
+# Shared pipeline modules live in the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from llm_cache import disable_llm_cache, get_cached_response, response_cache_key, store_response
+from group_planner import count_message_tokens
+from rate_limiter import get_scheduler
+from llm_replay import create_client, record_exchange
+
+DEDUP_SYSTEM_PROMPT = "You are a professional renovation estimator specializing in deduplication and scope optimization. Your task is to review renovation items and select the best unique scopes for each section."
+
 def create_deduplication_prompt(items):
     """Create a prompt for GPT to deduplicate and select best unique scopes."""
     
@@ -84,28 +94,34 @@ def send_to_gpt_for_deduplication(items, api_key):
     """Send items to GPT for deduplication and return cleaned results."""
     
     prompt = create_deduplication_prompt(items)
+    messages = [
+        {
+            "role": "system",
+            "content": DEDUP_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+    params = {"temperature": 0.1, "max_tokens": 4000}
     
     try:
-        client = openai.OpenAI(api_key=api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a professional renovation estimator specializing in deduplication and scope optimization. Your task is to review renovation items and select the best unique scopes for each section."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            temperature=0.1,
-            max_tokens=4000
-        )
-        
-        # Extract JSON from response
-        content = response.choices[0].message.content
+        cache_key = response_cache_key("gpt-4o", messages, **params)
+        content = get_cached_response(cache_key)
+        if content is not None:
+            print("[INFO] Using cached GPT deduplication response")
+        else:
+            # Same scheduler as the estimation calls: RPM/TPM pacing, Retry-After and backoff
+            client = create_client(api_key)
+            response = get_scheduler().call(
+                lambda: client.chat.completions.create(model="gpt-4o", messages=messages, **params),
+                count_message_tokens(messages) + params["max_tokens"], "gpt_deduplication"
+            )
+            
+            # Extract JSON from response
+            content = response.choices[0].message.content
+            record_exchange("gpt-4o", messages, params, content)
         
         # Find JSON in the response
         start = content.find('{')
@@ -114,6 +130,7 @@ def send_to_gpt_for_deduplication(items, api_key):
         if start != -1 and end != 0:
             json_str = content[start:end]
             result = json.loads(json_str)
+            store_response(cache_key, content)
             return result
         else:
             print("[ERROR] No JSON found in GPT response")
@@ -167,6 +184,12 @@ def gpt_deduplication(items, api_key):
         return items
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run GPT deduplication on sample items")
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Bypass the LLM response cache for the deduplication call')
+    args = parser.parse_args()
+    if args.no_cache:
+        disable_llm_cache()
+
     # Test with sample data
     sample_items = [
         {
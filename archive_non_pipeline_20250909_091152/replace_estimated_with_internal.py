@@ -3,6 +3,13 @@
 Replace estimated rates with internal rates where possible
 """
 import csv
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pricing_catalog import get_catalog
+
+PRICING_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'master_pricing_data.csv')
 
 def replace_estimated_with_internal():
     """Replace estimated rates with internal rates where possible."""
@@ -17,81 +24,86 @@ def replace_estimated_with_internal():
     
     print(f"Processing {len(items)} items")
     
-    # Define internal rate replacements
+    # Pricing sheet item code to use for each estimated item; rates come from the catalog
     internal_replacements = {
         # Track Installation - use FRAM-04 rate for framing
-        'Track Installation': {'new_rate': 55.00, 'code': 'FRAM-04', 'description': 'Frame new soffit'},
+        'Track Installation': 'FRAM-04',
         
         # Acoustic Insulation - use insulation rate from pricing sheet
-        'Acoustic Insulation': {'new_rate': 4.70, 'code': 'INSUL-01', 'description': 'Batt insulation (1.7 labor + 3.0 material)'},
+        'Acoustic Insulation': 'INSUL-01',
         
         # Specialty Wallpaper - use wallcovering rate
-        'Specialty Wallpaper Installation': {'new_rate': 12.00, 'code': 'FINSH-07', 'description': 'Wallcovering installation'},
+        'Specialty Wallpaper Installation': 'FINSH-07',
         
         # Wallcovering - use internal rate
-        'Wallcovering Installation': {'new_rate': 12.00, 'code': 'FINSH-07', 'description': 'Wallcovering installation'},
+        'Wallcovering Installation': 'FINSH-07',
         
         # Reeded Glass Film - use glazing rate
-        'Reeded Glass Film Installation': {'new_rate': 15.00, 'code': 'GLAZ-01', 'description': 'Glass film installation'},
+        'Reeded Glass Film Installation': 'GLAZ-01',
         
         # Rubber Base - use baseboard rate
-        'Rubber Base Installation': {'new_rate': 11.00, 'code': 'TRIM-01', 'description': 'Baseboards (5 labor + 6 material)'},
+        'Rubber Base Installation': 'TRIM-01',
         
         # Wood Base/Shoe - use crown molding rate
-        'Wood Base/Shoe Installation': {'new_rate': 17.00, 'code': 'TRIM-02', 'description': 'Crown molding (9 labor + 8 material)'},
+        'Wood Base/Shoe Installation': 'TRIM-02',
         
         # Door Hardware - use hardware rate
-        'Door Hardware Installation': {'new_rate': 200.00, 'code': 'HARD-01', 'description': 'Door hardware installation'},
+        'Door Hardware Installation': 'HARD-01',
         
         # Pull Handles - use hardware rate
-        'Pull Handles Installation': {'new_rate': 200.00, 'code': 'HARD-01', 'description': 'Door hardware installation'},
+        'Pull Handles Installation': 'HARD-01',
         
         # Feature Chandelier - use chandelier rate
-        'Feature Chandelier': {'new_rate': 165.00, 'code': 'ELEC-05', 'description': 'Light fixture installation'},
+        'Feature Chandelier': 'ELEC-05',
         
         # Track Lighting - use track rate
-        'Track Lighting': {'new_rate': 165.00, 'code': 'ELEC-08', 'description': 'Pendant lighting'},
+        'Track Lighting': 'ELEC-08',
         
         # Linear LED Strips - use undercabinet rate
-        'Linear LED Strips': {'new_rate': 110.00, 'code': 'ELEC-13', 'description': 'Undercabinet lighting per 15ft'},
+        'Linear LED Strips': 'ELEC-13',
         
         # Urinals - use urinal rate
-        'Urinals': {'new_rate': 400.00, 'code': 'PLMB-15', 'description': 'Urinal installation'},
+        'Urinals': 'PLMB-15',
         
         # Restroom Faucets - use faucet rate
-        'Restroom Faucets': {'new_rate': 200.00, 'code': 'PLMB-16', 'description': 'Faucet installation'},
+        'Restroom Faucets': 'PLMB-16',
         
         # Paper Towel Dispensers - use accessory rate
-        'Paper Towel Dispensers': {'new_rate': 150.00, 'code': 'PLMB-17', 'description': 'Accessory installation'},
+        'Paper Towel Dispensers': 'PLMB-17',
         
         # Toilet Roll Holders - use accessory rate
-        'Toilet Roll Holders': {'new_rate': 100.00, 'code': 'PLMB-18', 'description': 'Accessory installation'},
+        'Toilet Roll Holders': 'PLMB-18',
         
         # ADA Grab Bars - use grab bar rate
-        'ADA Grab Bars': {'new_rate': 200.00, 'code': 'PLMB-19', 'description': 'Grab bar installation'},
+        'ADA Grab Bars': 'PLMB-19',
         
         # Lounge Built-ins - use cabinet rate
-        'Lounge Built-ins': {'new_rate': 800.00, 'code': 'KITC-10', 'description': 'Kitchen cabinets standard'},
+        'Lounge Built-ins': 'KITC-10',
         
         # Arch Trim - use trim rate
-        'Arch Trim': {'new_rate': 17.00, 'code': 'TRIM-02', 'description': 'Crown molding (9 labor + 8 material)'},
+        'Arch Trim': 'TRIM-02',
         
         # Antique Mirror - use mirror rate
-        'Antique Mirror Installation': {'new_rate': 25.00, 'code': 'FINSH-08', 'description': 'Mirror installation'},
+        'Antique Mirror Installation': 'FINSH-08',
         
         # Metal Mesh - use mesh rate
-        'Metal Mesh Installation': {'new_rate': 35.00, 'code': 'FINSH-09', 'description': 'Metal mesh installation'}
+        'Metal Mesh Installation': 'FINSH-09'
     }
     
     # Apply internal rate replacements
+    catalog = get_catalog(PRICING_CSV)
     replacements_made = 0
     for item in items:
         item_name = item['ItemName']
         if item_name in internal_replacements:
+            code = internal_replacements[item_name]
+            record = catalog.get(code)
+            if record is None or record['unit_cost'] is None:
+                print(f"⚠️  Skipped:  {item_name:35} | {code} has no price in the master pricing sheet")
+                continue
             old_rate = float(item['UnitCost'].replace('$', ''))
-            new_rate = internal_replacements[item_name]['new_rate']
-            code = internal_replacements[item_name]['code']
-            description = internal_replacements[item_name]['description']
+            new_rate = float(record['unit_cost'])
+            description = record['description']
             
             # Update the item
             item['UnitCost'] = f"${new_rate:.2f}"
@@ -102,7 +114,7 @@ def replace_estimated_with_internal():
             new_total = quantity * new_rate * (1 + markup)
             item['Total'] = f"{new_total:.2f}"
             
-            print(f"✅ Replaced: {item_name:35} | ${old_rate:>8.2f} → ${new_rate:>8.2f} | {code}")
+            print(f"✅ Replaced: {item_name:35} | ${old_rate:>8.2f} → ${new_rate:>8.2f} | {code} {description}")
             replacements_made += 1
     
     print(f"\nApplied {replacements_made} internal rate replacements")
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+benchmark_pipeline.py
+
+Run the estimation pipeline stage by stage on fixed fixtures and report wall
+time, CPU time and peak RSS per stage as JSON.
+
+Stages: pdf_extraction, polycam_parse, chunking, grouping, llm_dispatch,
+aggregation, comprehensive_cleanup, write_final_csv, create_excel_file.
+
+LLM calls are answered by the replay stand-in (llm_replay.py); by default its
+cassettes are imported from the archived chunked_outputs/run_* directories.
+
+--transcript_pages N replaces the transcript with a synthetic N-page PDF built
+from the archived speaker blocks. --chunking_only then compares whole-document
+chunking (extract everything, then split) with streaming page-by-page
+chunking, each in a fresh process so peak RSS is not shared.
+
+--pdf_backends [NAME ...] instead times each PDF extraction backend (default:
+every installed one) on the sample PDFs and reports pages/second and word
+agreement with the first backend's text.
+
+Usage:
+  python benchmark_pipeline.py --output bench.json
+  python benchmark_pipeline.py --dispatch sequential --cache off --replay_speed 0
+  python benchmark_pipeline.py --transcript_pages 400 --chunking_only
+  python benchmark_pipeline.py --pdf_backends pdfplumber pypdfium2 --output pdf_backends.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from argparse import Namespace
+from collections import Counter
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+try:
+    import psutil  # Optional; more accurate RSS sampling
+except Exception:
+    psutil = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.path.join(SCRIPT_DIR, 'archive_non_pipeline_20250909_091152')
+DEFAULT_TRANSCRIPT = os.path.join(ARCHIVE_DIR, '20250812173901.json')
+DEFAULT_POLYCAM = os.path.join(ARCHIVE_DIR, 'Polycam1.pdf')
+DEFAULT_MASTER_PRICING = os.path.join(SCRIPT_DIR, 'Master Pricing Sheet - Q1 - 2025 (2).pdf')
+DEFAULT_PROMPT_FILE = os.path.join(SCRIPT_DIR, 'estimation_prompt.txt')
+DEFAULT_REPLAY_RUNS = os.path.join(SCRIPT_DIR, 'chunked_outputs', 'run_*')
+DEFAULT_SAMPLE_PDFS = [
+    DEFAULT_MASTER_PRICING, DEFAULT_POLYCAM,
+    os.path.join(ARCHIVE_DIR, 'Transcript1.pdf'), os.path.join(ARCHIVE_DIR, 'Transcript2.pdf'),
+]
+
+RSS_SAMPLE_SECONDS = 0.01
+
+PDF_LINES_PER_PAGE = 50
+PDF_LINE_CHARS = 95
+
+def current_rss_bytes():
+    """Return this process's resident set size in bytes (None if unknown)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def children_cpu_seconds():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class StageMeter:
+    """Measure wall time, CPU time (self + subprocesses) and sampled peak RSS of a block."""
+
+    def __init__(self, name):
+        self.name = name
+        self.extra = {}
+        self._peak = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = current_rss_bytes()
+            if rss is not None and (self._peak is None or rss > self._peak):
+                self._peak = rss
+            self._stop.wait(RSS_SAMPLE_SECONDS)
+
+    def __enter__(self):
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._children_cpu = children_cpu_seconds()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        children_cpu = children_cpu_seconds() - self._children_cpu
+        self._stop.set()
+        self._sampler.join()
+        rss = current_rss_bytes()
+        if rss is not None and (self._peak is None or rss > self._peak):
+            self._peak = rss
+        self.result = {
+            'stage': self.name,
+            'wall_seconds': round(wall, 4),
+            'cpu_seconds': round(cpu, 4),
+            'subprocess_cpu_seconds': round(children_cpu, 4),
+            'peak_rss_mb': round(self._peak / (1024 * 1024), 1) if self._peak is not None else None,
+        }
+        self.result.update(self.extra)
+        if exc is not None:
+            self.result['error'] = f"{type(exc).__name__}: {exc}"
+        return False
+
+def _pdf_string(text):
+    text = text.encode('latin-1', errors='replace').decode('latin-1')
+    return '(' + text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+def _wrap(text, width):
+    line = ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            yield line
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        yield line
+
+def write_transcript_pdf(path, pages, source=DEFAULT_TRANSCRIPT):
+    """Write a synthetic pages-long transcript PDF, cycling through source's speaker blocks."""
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = data[0]
+    blocks = [
+        f"{block.get('speaker', {}).get('name', 'Unknown')}: {block.get('words', '')}"
+        for block in data['transcript']['speaker_blocks'] if block.get('words', '').strip()
+    ]
+
+    def lines():
+        while True:
+            for block in blocks:
+                yield from _wrap(block, PDF_LINE_CHARS)
+
+    line_iter = lines()
+    # Objects: 1 catalog, 2 page tree, 3 font, 4 info, then a page and its content stream per page
+    first_page = 5
+    offsets = {}
+    with open(path, 'wb') as f:
+        def obj(number, body):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode('latin-1') + body + b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n")
+        kids = " ".join(f"{first_page + 2 * i} 0 R" for i in range(pages))
+        obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode('latin-1'))
+        obj(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        obj(4, b"<< /Producer (benchmark_pipeline.py) >>")
+        for i in range(pages):
+            page_obj = first_page + 2 * i
+            text = " T* ".join(f"{_pdf_string(next(line_iter))} Tj" for _ in range(PDF_LINES_PER_PAGE))
+            stream = f"BT /F1 9 Tf 14 TL 36 760 Td {text} ET".encode('latin-1')
+            obj(page_obj, f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                          f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_obj + 1} 0 R >>".encode('latin-1'))
+            obj(page_obj + 1, f"<< /Length {len(stream)} >>\nstream\n".encode('latin-1') + stream + b"\nendstream")
+        xref = f.tell()
+        count = first_page + 2 * pages
+        f.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode('latin-1'))
+        for number in range(1, count):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode('latin-1'))
+        f.write(f"trailer\n<< /Size {count} /Root 1 0 R /Info 4 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('latin-1'))
+    return path
+
+def _chunking_variant(variant, transcript, chunks_dir, chunk_tokens, log_path, queue):
+    with open(log_path, 'a', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        from pdf_extraction import extract_pdf_text
+        from process_transcript import process_transcript, split_by_tokens
+        from chunk_store import count_chunks, write_chunk_store
+        import pdfplumber  # noqa: F401  (imported up front so it is part of the baseline)
+        os.makedirs(chunks_dir, exist_ok=True)
+        baseline = current_rss_bytes()
+        meter = StageMeter(f'chunking_{variant}')
+        try:
+            with meter:
+                if variant == 'streaming':
+                    if not process_transcript(transcript, chunks_dir, chunk_tokens):
+                        raise RuntimeError(f"Chunking failed for {transcript}")
+                else:
+                    text = extract_pdf_text(transcript)
+                    write_chunk_store(chunks_dir, [text], lambda pieces: split_by_tokens(''.join(pieces), chunk_tokens))
+                meter.extra['chunks'] = count_chunks(chunks_dir)
+                meter.extra['baseline_rss_mb'] = round(baseline / (1024 * 1024), 1) if baseline is not None else None
+        except Exception:
+            pass  # recorded as the stage's error
+    queue.put(meter.result)
+
+def run_chunking_comparison(args, run_dir, log_path):
+    """Chunk the transcript whole-document and streaming, each in a fresh process."""
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for variant in ('whole_document', 'streaming'):
+        queue = context.Queue()
+        process = context.Process(target=_chunking_variant, args=(
+            variant, args.transcript, os.path.join(run_dir, f'chunks_{variant}'), args.chunk_tokens, log_path, queue
+        ))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    return results
+
+def text_agreement(text, reference):
+    """Word-level Dice agreement (0-1) of two extractions, ignoring word order and spacing."""
+    words, reference_words = Counter(text.split()), Counter(reference.split())
+    total = sum(words.values()) + sum(reference_words.values())
+    return round(2 * sum((words & reference_words).values()) / total, 4) if total else 1.0
+
+def run_backend_comparison(args):
+    """Extract each sample PDF serially with every backend; one result per (PDF, backend)."""
+    from pdf_extraction import available_pdf_backends, get_pdf_backend
+
+    backends = args.pdf_backends or available_pdf_backends()
+    results = []
+    for pdf_path in args.pdf or DEFAULT_SAMPLE_PDFS:
+        reference = None
+        for name in backends:
+            meter = StageMeter(name)
+            meter.extra['pdf'] = os.path.relpath(pdf_path, SCRIPT_DIR)
+            try:
+                with meter:
+                    page_texts = [page_text or '' for page_text in get_pdf_backend(name)['page_texts'](pdf_path)]
+            except Exception:
+                results.append(meter.result)  # recorded as the backend's error
+                continue
+            text = "\n".join(page_texts)
+            wall = meter.result['wall_seconds']
+            meter.result.update(
+                pages=len(page_texts), characters=len(text),
+                pages_per_second=round(len(page_texts) / wall, 1) if wall else None,
+            )
+            if reference is None:
+                reference = (name, text)
+            meter.result['agreement_with'] = reference[0]
+            meter.result['agreement'] = text_agreement(text, reference[1])
+            results.append(meter.result)
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def prepare_cassettes(args, work_dir):
+    if args.cassettes:
+        return args.cassettes
+    from llm_replay import import_run
+    cassette_dir = os.path.join(work_dir, 'cassettes')
+    count = sum(import_run(run_dir, cassette_dir) for run_dir in sorted(glob.glob(args.replay_runs)))
+    if not count:
+        raise ValueError(f"No replayable responses found in {args.replay_runs}; pass --cassettes")
+    return cassette_dir
+
+def run_stages(args, run_dir):
+    """Run the pipeline once, returning a list of per-stage results."""
+    from chunk_store import count_chunks, load_chunks
+    from pdf_extraction import extract_pdf_text_cached
+    from polycam_parser import process_polycam
+    from group_planner import plan_groups
+    from send_files_to_chatgpt_text import COMPLETION_PARAMS, ESTIMATION_MODEL, build_static_prompt
+    from run_chunked_estimation import (
+        FORCEFUL_INSTRUCTION, PROCESS_INSTRUCTION, dispatch_groups, is_process_chunk
+    )
+    from comprehensive_cleanup import (
+        aggregate_chunk_outputs, comprehensive_cleanup, create_excel_file, write_final_csv
+    )
+
+    results = []
+    state = {}
+
+    def stage_pdf_extraction(meter):
+        texts = [extract_pdf_text_cached(path) for path in (args.master_pricing, args.polycam)]
+        meter.extra['characters'] = sum(len(text) for text in texts)
+
+    def stage_polycam_parse(meter):
+        summary_path = process_polycam(args.polycam, os.path.join(run_dir, 'polycam_chunks'))
+        state['polycam_input'] = summary_path or args.polycam
+
+    def stage_chunking(meter):
+        chunks_dir = os.path.join(run_dir, 'transcript_chunks')
+        if 'takeoff' in os.path.basename(args.transcript).lower():
+            from process_takeoff import process_takeoff_file
+            ok = process_takeoff_file(args.transcript, chunks_dir, args.chunk_tokens)
+        else:
+            from process_transcript import process_transcript
+            ok = process_transcript(args.transcript, chunks_dir, args.chunk_tokens)
+        if not ok:
+            raise RuntimeError(f"Chunking failed for {args.transcript}")
+        state['chunk_dir'] = chunks_dir
+        meter.extra['chunks'] = count_chunks(chunks_dir)
+
+    def stage_grouping(meter):
+        with open(args.prompt_file, 'r', encoding='utf-8') as f:
+            state['prompt_instructions'] = f.read()
+        _, chunk_texts = load_chunks(state['chunk_dir'])
+        system_guardrails, static_prefix = build_static_prompt(
+            args.master_pricing, state['polycam_input'], state['prompt_instructions']
+        )
+        plan = plan_groups(
+            chunk_texts, system_guardrails, static_prefix, args.max_tokens,
+            completion_tokens=COMPLETION_PARAMS['max_tokens'],
+            reserve_instruction=FORCEFUL_INSTRUCTION + PROCESS_INSTRUCTION,
+            instruction_for=lambda text: PROCESS_INSTRUCTION if is_process_chunk(text) else "",
+            model=ESTIMATION_MODEL,
+        )
+        state['chunk_groups'] = [[chunk_texts[idx] for idx in group['chunks']] for group in plan]
+        meter.extra['groups'] = len(plan)
+        meter.extra['predicted_prompt_tokens'] = sum(group['predicted_prompt_tokens'] for group in plan)
+
+    def stage_llm_dispatch(meter):
+        dispatch_args = Namespace(
+            master_pricing=args.master_pricing, sample_scope=None, api_key='replay',
+            dispatch=args.dispatch, concurrency=args.concurrency,
+        )
+        partial = None
+        if args.stream and args.dispatch == 'concurrent':
+            from comprehensive_cleanup import convert_estimation_item
+            from stream_parser import PartialResults
+            partial = PartialResults(os.path.join(run_dir, 'partial_items.jsonl'), convert_estimation_item)
+        success_count, fail_count = dispatch_groups(
+            state['chunk_groups'], run_dir, state['prompt_instructions'], dispatch_args,
+            state['polycam_input'], partial
+        )
+        state['partial'] = partial
+        meter.extra['groups_succeeded'] = success_count
+        meter.extra['groups_failed'] = fail_count
+
+    def stage_aggregation(meter):
+        partial = state.get('partial')
+        state['items'] = aggregate_chunk_outputs(run_dir, parsed_items=partial.verified_items() if partial else None) or []
+        meter.extra['items'] = len(state['items'])
+
+    def stage_comprehensive_cleanup(meter):
+        state['cleaned_items'] = comprehensive_cleanup(state['items'])
+        meter.extra['items'] = len(state['cleaned_items'])
+
+    def stage_write_final_csv(meter):
+        write_final_csv(state['cleaned_items'], os.path.join(run_dir, 'benchmark_final.csv'))
+
+    def stage_create_excel_file(meter):
+        create_excel_file(state['cleaned_items'], os.path.join(run_dir, 'benchmark_final.xlsx'))
+
+    stages = [
+        ('pdf_extraction', stage_pdf_extraction),
+        ('polycam_parse', stage_polycam_parse),
+        ('chunking', stage_chunking),
+        ('grouping', stage_grouping),
+        ('llm_dispatch', stage_llm_dispatch),
+        ('aggregation', stage_aggregation),
+        ('comprehensive_cleanup', stage_comprehensive_cleanup),
+        ('write_final_csv', stage_write_final_csv),
+        ('create_excel_file', stage_create_excel_file),
+    ]
+    for name, stage in stages:
+        meter = StageMeter(name)
+        try:
+            with meter:
+                stage(meter)
+        except Exception:
+            # Later stages depend on this one's output
+            results.append(meter.result)
+            break
+        results.append(meter.result)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the estimation pipeline per stage (wall/CPU/peak RSS as JSON)")
+    parser.add_argument('--transcript', default=DEFAULT_TRANSCRIPT, help='Transcript fixture (JSON or PDF)')
+    parser.add_argument('--polycam', default=DEFAULT_POLYCAM, help='Polycam PDF fixture')
+    parser.add_argument('--master_pricing', default=DEFAULT_MASTER_PRICING, help='Master pricing PDF')
+    parser.add_argument('--prompt_file', default=DEFAULT_PROMPT_FILE, help='Prompt file')
+    parser.add_argument('--cassettes', default=None, help='Replay cassette directory (default: import --replay_runs)')
+    parser.add_argument('--replay_runs', default=DEFAULT_REPLAY_RUNS, help='Glob of run directories to import as cassettes')
+    parser.add_argument('--replay_speed', type=float, default=1.0, help='Replay latency divisor (0 = no simulated latency)')
+    parser.add_argument('--dispatch', choices=['concurrent', 'sequential'], default='concurrent')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--stream', action='store_true', help='Stream completions (concurrent dispatch only)')
+    parser.add_argument('--cache', choices=['on', 'off'], default='on',
+                        help='on: reuse the benchmark cache directory across runs; off: empty cache and no LLM response cache')
+    parser.add_argument('--chunk_tokens', type=int, default=1500, help='Tokens per transcript chunk')
+    parser.add_argument('--transcript_pages', type=int, default=None,
+                        help='Benchmark a synthetic transcript PDF with this many pages instead of --transcript')
+    parser.add_argument('--chunking_only', action='store_true',
+                        help='Only compare whole-document and streaming transcript chunking')
+    parser.add_argument('--pdf_backends', nargs='*', default=None, metavar='NAME',
+                        help='Only compare PDF extraction backends (no names: every installed backend)')
+    parser.add_argument('--pdf', action='append', default=None,
+                        help='Sample PDF for --pdf_backends (repeatable; default: pricing sheet, Polycam and transcript PDFs)')
+    parser.add_argument('--max_tokens', type=int, default=10000, help='Max transcript tokens per group')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of pipeline runs')
+    parser.add_argument('--output', default=None, help='Write JSON results here (default: stdout)')
+    parser.add_argument('--log', default=None, help='Pipeline log file (default: inside the work directory)')
+    parser.add_argument('--keep', action='store_true', help='Keep the work directory')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='pipeline_benchmark_')
+    log_path = args.log or (os.path.join(work_dir, 'pipeline.log') if args.keep else os.devnull)
+    if args.transcript_pages:
+        args.transcript = write_transcript_pdf(
+            os.path.join(work_dir, f'transcript_{args.transcript_pages}_pages.pdf'), args.transcript_pages
+        )
+
+    # Cache and replay settings are read at import time, so set them first
+    if args.cache == 'on':
+        os.environ.setdefault('ESTIMATOR_CACHE_DIR', os.path.join(SCRIPT_DIR, '.cache', 'benchmark'))
+    else:
+        os.environ['ESTIMATOR_CACHE_DIR'] = os.path.join(work_dir, 'cache')
+        os.environ['ESTIMATOR_LLM_CACHE'] = '0'
+    os.environ['ESTIMATOR_REPLAY_SPEED'] = str(args.replay_speed)
+    # GPT dedup would call the API outside the replay corpus; benchmark local dedup
+    os.environ.pop('OPENAI_API_KEY', None)
+    sys.path.insert(0, SCRIPT_DIR)
+    os.chdir(SCRIPT_DIR)  # sequential dispatch runs send_files_to_chatgpt_text.py by relative path
+
+    runs = []
+    try:
+        with open(log_path, 'a', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+            if not args.chunking_only and args.pdf_backends is None:
+                os.environ['ESTIMATOR_LLM_REPLAY'] = prepare_cassettes(args, work_dir)
+            for repeat in range(1, args.repeat + 1):
+                run_dir = os.path.join(work_dir, f'run_{repeat}')
+                os.makedirs(run_dir, exist_ok=True)
+                if args.pdf_backends is not None:
+                    runs.append({'run': repeat, 'stages': run_backend_comparison(args)})
+                    continue
+                if args.chunking_only:
+                    stages = run_chunking_comparison(args, run_dir, log_path)
+                    runs.append({'run': repeat, 'stages': stages})
+                    continue
+                stages = run_stages(args, run_dir)
+                runs.append({
+                    'run': repeat,
+                    'stages': stages,
+                    'total_wall_seconds': round(sum(s['wall_seconds'] for s in stages), 4),
+                    'total_cpu_seconds': round(sum(s['cpu_seconds'] + s['subprocess_cpu_seconds'] for s in stages), 4),
+                    'completed': stages[-1]['stage'] == 'create_excel_file' and not any('error' in s for s in stages),
+                })
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'benchmark': ('pdf_backends' if args.pdf_backends is not None
+                      else 'transcript_chunking' if args.chunking_only else 'estimation_pipeline'),
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mode': {
+            'dispatch': args.dispatch, 'concurrency': args.concurrency, 'stream': args.stream,
+            'cache': args.cache, 'replay_speed': args.replay_speed,
+            'chunk_tokens': args.chunk_tokens, 'max_tokens': args.max_tokens,
+        },
+        'fixtures': {
+            'transcript': (f"synthetic {args.transcript_pages}-page PDF" if args.transcript_pages
+                           else os.path.relpath(args.transcript, SCRIPT_DIR)),
+            'polycam': os.path.relpath(args.polycam, SCRIPT_DIR),
+            'master_pricing': os.path.relpath(args.master_pricing, SCRIPT_DIR),
+            'cassettes': args.cassettes or args.replay_runs,
+            'pdfs': [os.path.relpath(path, SCRIPT_DIR) for path in args.pdf or DEFAULT_SAMPLE_PDFS],
+        },
+        'runs': runs,
+    }
+    if args.keep:
+        report['work_dir'] = work_dir
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + "\n")
+        print(f"[SUCCESS] Benchmark results written to {args.output}")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
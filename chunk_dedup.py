@@ -0,0 +1,127 @@
+"""
+chunk_dedup.py
+
+Remove near-duplicate text from transcript chunks before they are grouped.
+
+Meeting transcripts repeat themselves (recaps, a summary preamble that
+restates the discussion), and every repeated passage is sent to the model
+again and its items removed again by cleanup. Each chunk is split into
+paragraphs (its non-empty lines: speaker turns or summary paragraphs); a
+paragraph whose word shingles are at least `threshold` contained in an
+earlier paragraph is dropped. Candidates are found with MinHash signatures
+and LSH banding, then confirmed on the exact shingle sets. A chunk left with
+too little text, or whose remaining shingles are already covered by the
+chunks kept before it, is dropped whole.
+
+Consecutive chunks overlap on purpose (process_transcript --overlap_tokens),
+so paragraphs are never matched against the chunk just before their own.
+Paragraphs shorter than MIN_PARAGRAPH_WORDS are always kept.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+
+SHINGLE_WORDS = 5
+NUM_PERM = 32
+BANDS = 8  # NUM_PERM / BANDS rows per band
+MIN_PARAGRAPH_WORDS = 15
+MIN_CHUNK_WORDS = 30
+DEFAULT_THRESHOLD = 0.8
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+def shingles(text):
+    """Return the set of hashed SHINGLE_WORDS-word shingles of text (lowercased words only)."""
+    words = _WORD.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {_hash(' '.join(words))} if words else set()
+    return {_hash(' '.join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+def _hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+
+def minhash(shingle_set):
+    """MinHash signature of a shingle set under NUM_PERM fixed permutations."""
+    return tuple(min((a * h + b) % _PRIME for h in shingle_set) for a, b in _PERMUTATIONS)
+
+def _bands(signature):
+    rows = NUM_PERM // BANDS
+    return [(band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+
+def containment(inner, outer):
+    """Fraction of inner's shingles that are also in outer."""
+    return len(inner & outer) / len(inner) if inner else 0.0
+
+def dedup_chunks(chunk_texts, threshold=DEFAULT_THRESHOLD):
+    """Drop near-duplicate paragraphs and chunks.
+
+    Returns (texts, report): texts[i] is chunk i's remaining text, or None if
+    the chunk was dropped; report lists each removal.
+    """
+    buckets = {}     # (band, rows) -> [paragraph id]
+    paragraphs = []  # (chunk index, shingle set) by paragraph id
+    earlier_shingles = set()  # chunks kept before the previous one
+    previous_shingles = set()
+    dropped = set()
+    texts = []
+    report = {'threshold': threshold, 'paragraphs_dropped': [], 'chunks_dropped': []}
+
+    for index, text in enumerate(chunk_texts):
+        kept_lines = []
+        chunk_matches = []
+        for line in text.split('\n'):
+            words = _WORD.findall(line.lower())
+            if len(words) < MIN_PARAGRAPH_WORDS:
+                kept_lines.append(line)
+                continue
+            line_shingles = shingles(line)
+            bands = _bands(minhash(line_shingles))
+            match = None
+            candidates = {pid for key in bands for pid in buckets.get(key, ())}
+            for pid in sorted(candidates):
+                other_chunk, other_shingles = paragraphs[pid]
+                if other_chunk == index - 1 or other_chunk in dropped:
+                    continue  # deliberate overlap with the previous chunk, or text not sent
+                if containment(line_shingles, other_shingles) >= threshold:
+                    match = other_chunk
+                    break
+            if match is not None:
+                chunk_matches.append(match)
+                report['paragraphs_dropped'].append({
+                    'chunk': index + 1, 'duplicate_of_chunk': match + 1,
+                    'chars': len(line), 'preview': line.strip()[:80],
+                })
+                continue
+            pid = len(paragraphs)
+            paragraphs.append((index, line_shingles))
+            for key in bands:
+                buckets.setdefault(key, []).append(pid)
+            kept_lines.append(line)
+
+        remaining = re.sub(r'\n{3,}', '\n\n', '\n'.join(kept_lines)).strip()
+        remaining_shingles = shingles(remaining)
+        reason = None
+        if len(_WORD.findall(remaining.lower())) < MIN_CHUNK_WORDS and chunk_matches:
+            reason = 'little text left after removing duplicate paragraphs'
+        elif containment(remaining_shingles, earlier_shingles) >= threshold:
+            reason = 'covered by earlier chunks'
+        earlier_shingles |= previous_shingles
+        previous_shingles = set()
+        if reason:
+            report['chunks_dropped'].append({'chunk': index + 1, 'reason': reason, 'chars': len(text)})
+            dropped.add(index)
+            texts.append(None)
+            continue
+        previous_shingles = remaining_shingles
+        texts.append(remaining if chunk_matches else text)
+    return texts, report
+
+def write_report(report, path, **summary):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, **report), f, indent=2)
+    return path
@@ -0,0 +1,130 @@
+"""
+chunk_store.py
+
+Transcript chunks stored as views over one source text file.
+
+write_chunk_store() streams the transcript text to transcript_text.txt while
+the chunker cuts it, and writes chunk_index.json with each chunk's byte
+offset, byte length and token count in that file (plus its character
+offsets). Chunks overlap, so the index is all that is stored per chunk; the
+per-chunk chunk_N.txt layout is only written when asked for (chunk_files=True).
+
+ChunkStore reads a chunk by slicing the source file: large sources are
+memory-mapped, small ones read once. load_chunks() also accepts a directory
+of chunk_N.txt files from older runs or from --transcript_dir.
+"""
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+
+from group_planner import get_encoding
+
+SOURCE_NAME = 'transcript_text.txt'
+INDEX_NAME = 'chunk_index.json'
+# Sources at least this large are memory-mapped instead of read into memory
+MMAP_MIN_BYTES = int(os.environ.get('ESTIMATOR_CHUNK_MMAP_BYTES', str(8 * 1024 * 1024)))
+
+def chunk_sort_key(path):
+    """Sort chunk_N.txt files numerically so chunk_10 follows chunk_9."""
+    match = re.search(r'(\d+)(?=\.txt$)', Path(path).name)
+    return (int(match.group(1)) if match else 0, Path(path).name)
+
+def write_chunk_store(output_dir, text_pieces, chunker, chunk_files=False):
+    """Write text_pieces to the source file and chunker(pieces)'s chunks to the index; returns the count.
+
+    chunker takes the stream of pieces and yields token_chunker chunk dicts
+    whose 'start'/'end' are character offsets into the concatenated pieces.
+    """
+    source_path = os.path.join(output_dir, SOURCE_NAME)
+    # Text from the last chunk start onwards, to turn character offsets into byte offsets
+    tail = ""
+    tail_char = 0
+    tail_byte = 0
+    index = []
+
+    with open(source_path, 'w', encoding='utf-8', newline='') as source:
+        def tee(pieces):
+            nonlocal tail
+            for piece in pieces:
+                source.write(piece)
+                tail += piece
+                yield piece
+
+        for number, chunk in enumerate(chunker(tee(text_pieces)), 1):
+            skipped = tail[:chunk['start'] - tail_char]
+            tail = tail[len(skipped):]
+            tail_char = chunk['start']
+            tail_byte += len(skipped.encode('utf-8'))
+            entry = {
+                'name': f'chunk_{number}', 'offset': tail_byte, 'length': len(chunk['text'].encode('utf-8')),
+                'tokens': chunk['tokens'], 'start': chunk['start'], 'end': chunk['end'],
+            }
+            if chunk_files:
+                entry['file'] = f'chunk_{number}.txt'
+                with open(os.path.join(output_dir, entry['file']), 'w', encoding='utf-8') as f:
+                    f.write(chunk['text'])
+            index.append(entry)
+
+    if not index:
+        os.remove(source_path)
+        return 0
+    with open(os.path.join(output_dir, INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'source': SOURCE_NAME, 'exact': get_encoding() is not None, 'chunks': index}, f, indent=2)
+    return len(index)
+
+class ChunkStore:
+    """Read access to a chunk store directory (see write_chunk_store)."""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, INDEX_NAME), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.directory = directory
+        self.chunks = index['chunks']
+        self.exact = index.get('exact', False)
+        self._file = open(os.path.join(directory, index['source']), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size >= MMAP_MIN_BYTES:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._data = self._file.read()
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def text(self, chunk):
+        """Return the text of an index entry."""
+        return self._data[chunk['offset']:chunk['offset'] + chunk['length']].decode('utf-8')
+
+    def texts(self):
+        return [self.text(chunk) for chunk in self.chunks]
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def is_chunk_store(directory):
+    return os.path.exists(os.path.join(directory, INDEX_NAME)) and os.path.exists(os.path.join(directory, SOURCE_NAME))
+
+def load_chunks(directory):
+    """Return (names, texts) for the chunks in directory, from the store or else its *.txt files."""
+    if is_chunk_store(directory):
+        with ChunkStore(directory) as store:
+            return [chunk['name'] for chunk in store.chunks], store.texts()
+    files = sorted((path for path in Path(directory).glob('*.txt') if path.name != SOURCE_NAME), key=chunk_sort_key)
+    return [path.stem for path in files], [path.read_text(encoding='utf-8') for path in files]
+
+def count_chunks(directory):
+    """Number of chunks in directory (0 if it holds none)."""
+    if os.path.exists(os.path.join(directory, INDEX_NAME)):
+        with open(os.path.join(directory, INDEX_NAME), 'r', encoding='utf-8') as f:
+            return len(json.load(f).get('chunks', []))
+    return len([name for name in os.listdir(directory) if name.endswith('.txt')]) if os.path.isdir(directory) else 0
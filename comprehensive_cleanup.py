@@ -29,30 +29,18 @@ def get_valid_sections():
 
 def validate_pricing_data():
     """Validate that items use actual pricing codes from master pricing sheet."""
-    valid_pricing_codes = set()
+    from pricing_catalog import get_catalog
     try:
-        with open('master_pricing_data.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                item_code = row.get('Item Code', '').strip()
-                if item_code:
-                    valid_pricing_codes.add(item_code)
+        return get_catalog().codes()
     except:
         print("[WARNING] Could not read master pricing data")
         return set()
-    return valid_pricing_codes
 
 def get_pricing_sheet_sections():
     """Get all sections from the master pricing sheet."""
-    pricing_sections = set()
+    from pricing_catalog import get_catalog
     try:
-        with open('master_pricing_data.csv', 'r', encoding='utf-8') as f:
-            import csv
-            reader = csv.DictReader(f)
-            for row in reader:
-                category = row.get('Category', '').strip()
-                if category:
-                    pricing_sections.add(category)
+        pricing_sections = get_catalog().categories()
     except:
         # If we can't read the pricing sheet, use a default set
         pricing_sections = {
@@ -636,6 +624,14 @@ def comprehensive_cleanup(items):
     cleaned_items = merge_cabinetry_categories(cleaned_items)
     print(f"[INFO] After merging cabinetry categories: {len(cleaned_items)} items")
     
+    # Bring trades priced from the sheet up to their minimum charge
+    try:
+        from pricing_engine import apply_trade_minimums
+        cleaned_items = apply_trade_minimums(cleaned_items)
+        print(f"[INFO] After applying trade minimums: {len(cleaned_items)} items")
+    except Exception as e:
+        print(f"[WARNING] Could not apply trade minimums: {e}")
+    
     print(f"[INFO] After comprehensive cleanup: {len(cleaned_items)} items")
     return cleaned_items
 
@@ -937,7 +933,7 @@ def write_final_csv(items, output_file):
     
     # Write CSV with sections
     with open(output_file, 'w', newline='', encoding='utf-8') as f:
-        fieldnames = ['Category', 'Room', 'ItemName', 'Description', 'Quantity', 'UnitCost', 'Markup', 'MarkupType', 'Total', 'Confidence']
+        fieldnames = ['Category', 'Room', 'ItemName', 'Description', 'Quantity', 'UnitCost', 'Markup', 'MarkupType', 'Total', 'Confidence', 'ItemCode', 'SuggestedCode']
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         
@@ -1431,8 +1427,13 @@ def remove_smaller_rooms_when_full_apartment_exists(items):
     print(f"[INFO] After removing smaller rooms: {len(items)} -> {len(cleaned)} items")
     return cleaned
 
-def aggregate_chunk_outputs(run_dir):
-    """Aggregate text outputs from chunk processing into CSV format."""
+def aggregate_chunk_outputs(run_dir, parsed_items=None):
+    """Aggregate text outputs from chunk processing into CSV format.
+
+    parsed_items optionally maps group number -> items already parsed while
+    the response streamed; those groups skip re-parsing their output file.
+    """
+    parsed_items = parsed_items or {}
     print(f"[INFO] Aggregating chunk outputs from: {run_dir}")
     
     # Find all estimate output files
@@ -1453,11 +1454,15 @@ def aggregate_chunk_outputs(run_dir):
     for file_path in output_files:
         print(f"[INFO] Processing: {os.path.basename(file_path)}")
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Parse the content to extract items
-            items = parse_estimation_output(content)
+            group = int(file_path.split('_chunk_')[1].split('.')[0])
+            if group in parsed_items:
+                items = parsed_items[group]
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    content = f.read()
+
+                # Parse the content to extract items
+                items = parse_estimation_output(content)
             if items:
                 all_items.extend(items)
                 print(f"[INFO] Found {len(items)} items in {os.path.basename(file_path)}")
@@ -1467,6 +1472,23 @@ def aggregate_chunk_outputs(run_dir):
         except Exception as e:
             print(f"[ERROR] Failed to process {file_path}: {e}")
     
+    # Link uncoded items to their pricing sheet row, then recompute the cost of every coded item
+    try:
+        from polycam_parser import load_floor_areas
+        from pricing_engine import price_estimate_rows
+        from pricing_matcher import link_item_codes
+        areas = load_floor_areas(os.path.join(run_dir, 'polycam_chunks'))
+        linked, suggested = link_item_codes(all_items, areas=areas)
+        if linked or suggested:
+            print(f"[INFO] Matched {linked} items without an item code to the pricing sheet by rate; "
+                  f"{suggested} more got a suggested code (model totals kept)")
+        stats = price_estimate_rows(all_items, areas=areas)
+        if stats['priced'] or stats['unpriced']:
+            print(f"[INFO] Priced {stats['priced']} items from their item code ({stats['changed']} model totals corrected, "
+                  f"{stats['rebanded']} size bands re-selected from Polycam areas); {stats['unpriced']} codes could not be priced")
+    except Exception as e:
+        print(f"[WARNING] Local pricing failed, keeping model totals: {e}")
+    
     if all_items:
         # Write aggregated CSV
         output_csv = os.path.join(run_dir, 'comprehensive_clean_estimate.csv')
@@ -1477,6 +1499,24 @@ def aggregate_chunk_outputs(run_dir):
         print("[ERROR] No items aggregated from any chunks")
         return None
 
+def convert_estimation_item(section_name, item):
+    """Convert one JSON sections[].items[] entry to the aggregation row format."""
+    return {
+        'Category': section_name,
+        'ItemName': item.get('scope_item', ''),
+        'Description': clean_description_text(item.get('description', '')),
+        'Room': item.get('room', ''),
+        'Quantity': item.get('quantity', ''),
+        # Preserve unit cost text for downstream numeric extraction
+        'UnitCost': item.get('unit_cost', ''),
+        # Map subtotal to Total so cleanup can calculate/roll-up
+        'Total': item.get('subtotal', ''),
+        'Markup': item.get('markup', ''),
+        'Confidence': item.get('confidence_score', ''),
+        # Pricing sheet row; pricing_engine recomputes the cost of coded items
+        'ItemCode': item.get('item_code', '') or ''
+    }
+
 def parse_estimation_output(content):
     """Parse estimation output text and extract structured items from JSON format."""
     items = []
@@ -1498,21 +1538,7 @@ def parse_estimation_output(content):
                     section_name = section.get('name', '')
                     if 'items' in section:
                         for item in section['items']:
-                            # Convert the new format to the expected format
-                            converted_item = {
-                                'Category': section_name,
-                                'ItemName': item.get('scope_item', ''),
-                                'Description': clean_description_text(item.get('description', '')),
-                                'Room': item.get('room', ''),
-                                'Quantity': item.get('quantity', ''),
-                                # Preserve unit cost text for downstream numeric extraction
-                                'UnitCost': item.get('unit_cost', ''),
-                                # Map subtotal to Total so cleanup can calculate/roll-up
-                                'Total': item.get('subtotal', ''),
-                                'Markup': item.get('markup', ''),
-                                'Confidence': item.get('confidence_score', '')
-                            }
-                            items.append(converted_item)
+                            items.append(convert_estimation_item(section_name, item))
             
             print(f"[INFO] Successfully parsed JSON with {len(items)} items")
             return items
@@ -0,0 +1,111 @@
+"""
+disk_cache.py
+
+Small on-disk key/value cache shared by the pipeline stages.
+
+Entries are JSON files named by key inside one directory. Reads refresh the
+file's mtime so eviction can drop the least recently used entries once the
+directory grows past ``max_bytes``; ``ttl_seconds`` optionally expires entries
+by creation time. Writes go through a temp file + os.replace so concurrent
+workers never observe a half-written entry.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'ESTIMATOR_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+def file_sha256(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class DiskCache:
+    """Size-bounded LRU cache of JSON-serialisable values stored as files."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, ttl_seconds=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expired entry."""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl_seconds is not None and time.time() - entry.get('created', 0) > self.ttl_seconds:
+            self.delete(key)
+            return None
+
+        try:
+            os.utime(path, None)  # mark as recently used
+        except OSError:
+            pass
+        return entry.get('value')
+
+    def set(self, key, value):
+        """Store value under key and evict old entries if over the size cap."""
+        entry = {'created': time.time(), 'value': value}
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove least recently used entries until the directory fits in max_bytes."""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()  # oldest access first
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
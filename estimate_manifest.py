@@ -0,0 +1,107 @@
+"""
+estimate_manifest.py
+
+Per-run manifest of group outputs, keyed by chunk content, so a re-run on an
+updated transcript only sends the groups that changed.
+
+Every run of run_chunked_estimation.py writes estimate_manifest.json: for
+each group, the SHA-256 of its chunk texts, a context key (model, completion
+parameters, static prompt and the group's pricing subset) and the output file
+holding its estimate, plus the run's job key (a hash of the shared prompt:
+instructions, pricing sheet, sample scope and Polycam summary). With
+--reuse, a later run looks for the earlier manifest of the same job sharing
+the most chunks (--reuse_from names one instead), keeps those earlier groups
+together when planning, and copies the output of every group whose chunks
+and context key both match instead of calling the model again. Runs are
+never matched across jobs, so one customer's estimate is not reused for
+another's on the shared service.
+
+The chunker cuts a transcript the same way up to where it was edited, so
+appending to a transcript leaves the earlier chunks (and their groups)
+unchanged.
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = 'estimate_manifest.json'
+MANIFEST_VERSION = 1
+
+def chunk_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def context_key(*parts):
+    """Hash everything besides the transcript that shapes a group's estimate."""
+    digest = hashlib.sha256(f"v{MANIFEST_VERSION}".encode())
+    for part in parts:
+        data = json.dumps(part, sort_keys=True) if not isinstance(part, str) else part
+        digest.update(b'\0' + data.encode('utf-8'))
+    return digest.hexdigest()
+
+def load_manifest(run_dir):
+    """Return a run's manifest, or None if it has none (or an unreadable one)."""
+    try:
+        with open(os.path.join(run_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+def job_key(system_guardrails, static_prefix):
+    """Hash of the prompt shared by all of a run's groups, identifying its job inputs."""
+    return context_key(system_guardrails, static_prefix)
+
+def find_previous_run(output_dir, chunk_hashes, job, exclude=None):
+    """Return (run_dir, manifest) of the run of job under output_dir sharing the most chunks (newest on ties), or None."""
+    wanted = set(chunk_hashes)
+    best = None
+    for path in glob.glob(os.path.join(output_dir, 'run_*', MANIFEST_NAME)):
+        run_dir = os.path.dirname(path)
+        if exclude and os.path.abspath(run_dir) == os.path.abspath(exclude):
+            continue
+        manifest = load_manifest(run_dir)
+        if manifest is None or manifest.get('job_key') != job:
+            continue
+        shared = len(wanted & {h for group in manifest['groups'] for h in group['chunk_hashes']})
+        rank = (shared, os.path.getmtime(path))
+        if shared and (best is None or rank > best[0]):
+            best = (rank, run_dir, manifest)
+    return (best[1], best[2]) if best else None
+
+def matching_groups(manifest, chunk_hashes):
+    """Return the chunk index lists of the earlier run's groups whose chunks are all present again."""
+    positions = {}
+    for idx, h in enumerate(chunk_hashes):
+        positions.setdefault(h, []).append(idx)
+    claimed = set()
+    groups = []
+    for group in manifest['groups']:
+        indices = []
+        for h in group['chunk_hashes']:
+            idx = next((i for i in positions.get(h, ()) if i not in claimed and i not in indices), None)
+            if idx is None:
+                break
+            indices.append(idx)
+        else:
+            claimed.update(indices)
+            groups.append(indices)
+    return groups
+
+def reusable_outputs(run_dir, manifest):
+    """Map (tuple of chunk hashes, context key) -> path of each earlier group output still on disk."""
+    outputs = {}
+    for group in manifest['groups']:
+        path = os.path.join(run_dir, group['output'])
+        if os.path.exists(path):
+            outputs[(tuple(group['chunk_hashes']), group['context_key'])] = path
+    return outputs
+
+def write_manifest(run_dir, groups, **summary):
+    """Write the manifest; groups are dicts with 'group', 'chunk_hashes', 'context_key' and 'output'."""
+    path = os.path.join(run_dir, MANIFEST_NAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, version=MANIFEST_VERSION, created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       groups=groups), f, indent=2)
+    return path
@@ -0,0 +1,180 @@
+"""
+group_planner.py
+
+Pack transcript chunks into as few estimation calls as possible.
+
+Sizes are measured on the fully assembled request - system guardrails,
+instructions, cheatsheet/sample tables, pricing sheet, Polycam summary and the
+group transcript (see prompt_builder.py) plus chat message overhead - and the
+completion tokens reserved for the reply. Chunks are packed
+first-fit-decreasing under both the model context budget and the per-group
+transcript budget; each group keeps its chunks in transcript order. With
+routed pricing (layout_for) every group is checked and predicted on the
+prefix and pricing it will actually be sent.
+"""
+import json
+
+from prompt_builder import build_chunk_suffix, build_messages
+
+try:
+    import tiktoken  # Optional; without it token counts are estimates
+    _HAS_TIKTOKEN = True
+except Exception:
+    tiktoken = None
+    _HAS_TIKTOKEN = False
+
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+
+# Chat format overhead (per OpenAI's counting guide for gpt-4o):
+# each message costs 3 tokens plus its role, and the reply is primed with 3.
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+GROUP_SEPARATOR = "\n\n"
+
+_encodings = {}
+
+def token_counting_is_exact():
+    return _HAS_TIKTOKEN
+
+def get_encoding(model="gpt-4o"):
+    """Return the tiktoken encoding for model (None without tiktoken)."""
+    if not _HAS_TIKTOKEN:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+def count_tokens(text, model="gpt-4o"):
+    """Count tokens in text using tiktoken."""
+    if _HAS_TIKTOKEN:
+        return len(get_encoding(model).encode(text))
+    # Fallback: rough estimate (1 token ≈ 4 characters)
+    return len(text) // 4
+
+def count_message_tokens(messages, model="gpt-4o"):
+    """Count the prompt tokens the API will bill for a chat message list."""
+    total = TOKENS_REPLY_PRIMING
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        total += count_tokens(message["role"], model) + count_tokens(message["content"], model)
+    return total
+
+def first_fit_decreasing(sizes, capacity):
+    """Bin-pack item sizes into bins of capacity; returns lists of item indices.
+
+    Items larger than capacity get a bin of their own. Indices within each bin
+    are returned in ascending order.
+    """
+    order = sorted(range(len(sizes)), key=lambda idx: sizes[idx], reverse=True)
+    bins = []
+    free = []
+    for idx in order:
+        for b, room in enumerate(free):
+            if sizes[idx] <= room:
+                bins[b].append(idx)
+                free[b] -= sizes[idx]
+                break
+        else:
+            bins.append([idx])
+            free.append(capacity - sizes[idx])
+    return [sorted(b) for b in bins]
+
+def group_messages(system_guardrails, static_prefix, texts, group_number, chunk_instruction="", layout_for=None):
+    """Build the exact messages sent for a group (the name matches transcript_groups/group_{i}.txt).
+
+    layout_for(text, group_number), when given, returns the group's
+    (static_prefix, pricing_section) in place of static_prefix.
+    """
+    text = GROUP_SEPARATOR.join(texts)
+    pricing_section = None
+    if layout_for:
+        static_prefix, pricing_section = layout_for(text, group_number)
+    chunk_suffix = build_chunk_suffix(text, f"group_{group_number}.txt", chunk_instruction, pricing_section)
+    return build_messages(system_guardrails, static_prefix, chunk_suffix)
+
+def plan_groups(chunk_texts, system_guardrails, static_prefix, max_group_tokens,
+                context_budget=None, completion_tokens=4000, reserve_instruction="",
+                instruction_for=None, model="gpt-4o", fixed_groups=(), layout_for=None):
+    """Pack chunk_texts into groups and predict each group's prompt size.
+
+    max_group_tokens caps the transcript tokens per group; context_budget
+    (default: the model's context window) caps prompt + completion_tokens.
+    reserve_instruction is the longest per-group instruction a call may carry
+    (e.g. the anti-refusal retry) and is always budgeted for; instruction_for
+    returns the instruction a group's first attempt uses, for the prediction.
+    fixed_groups are chunk index lists kept together as groups of their own
+    (e.g. groups whose earlier output is reused); the other chunks are packed
+    around them. layout_for routes pricing per group (see group_messages);
+    capacity is sized on static_prefix, which carries the full sheet, and
+    each group is then verified and predicted on its own layout.
+
+    Returns a list of dicts with 'group', 'chunks' (indices into chunk_texts,
+    in transcript order), 'transcript_tokens' and 'predicted_prompt_tokens'.
+    """
+    if context_budget is None:
+        context_budget = MODEL_CONTEXT_TOKENS.get(model, 128000)
+
+    empty_tokens = count_message_tokens(
+        group_messages(system_guardrails, static_prefix, [], 0, reserve_instruction), model
+    )
+    prompt_limit = context_budget - completion_tokens
+    capacity = min(max_group_tokens, prompt_limit - empty_tokens)
+    if capacity <= 0:
+        raise ValueError(
+            f"Static prompt ({empty_tokens} tokens) plus {completion_tokens} completion tokens "
+            f"leaves no room for transcript text within the {context_budget}-token context budget"
+        )
+
+    separator_tokens = count_tokens(GROUP_SEPARATOR, model)
+    sizes = [count_tokens(text, model) + separator_tokens for text in chunk_texts]
+    for idx, size in enumerate(sizes):
+        if size > capacity:
+            print(f"[WARNING] Chunk {idx + 1} ({size} tokens) exceeds the {capacity}-token group capacity; sending it alone")
+
+    # Joining chunks can merge tokens at the boundaries, so verify each packed
+    # group on its real messages and split off trailing chunks until it fits.
+    fixed = [sorted(chunks) for chunks in fixed_groups]
+    fixed_chunks = {idx for chunks in fixed for idx in chunks}
+    free = [idx for idx in range(len(chunk_texts)) if idx not in fixed_chunks]
+    packed_free = [[free[i] for i in b] for b in first_fit_decreasing([sizes[idx] for idx in free], capacity)]
+    pending = sorted(fixed + packed_free, key=lambda b: b[0])
+    packed = []
+    while pending:
+        chunks = pending.pop(0)
+        texts = [chunk_texts[idx] for idx in chunks]
+        # Final numbering is not known yet; the widest group number is the worst case
+        worst = count_message_tokens(
+            group_messages(system_guardrails, static_prefix, texts, len(chunk_texts), reserve_instruction, layout_for),
+            model
+        )
+        if worst > prompt_limit and len(chunks) > 1:
+            pending.insert(0, chunks[:-1])
+            pending.append(chunks[-1:])
+            continue
+        packed.append(chunks)
+
+    plan = []
+    for number, chunks in enumerate(sorted(packed, key=lambda b: b[0]), 1):
+        texts = [chunk_texts[idx] for idx in chunks]
+        instruction = instruction_for(GROUP_SEPARATOR.join(texts)) if instruction_for else ""
+        plan.append({
+            'group': number,
+            'chunks': chunks,
+            'transcript_tokens': sum(sizes[idx] for idx in chunks),
+            'predicted_prompt_tokens': count_message_tokens(
+                group_messages(system_guardrails, static_prefix, texts, number, instruction, layout_for), model
+            ),
+        })
+    return plan
+
+def write_plan(plan, path, **summary):
+    """Write the group plan and summary fields to a JSON file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(dict(summary, exact=token_counting_is_exact(), groups=plan), f, indent=2)
@@ -0,0 +1,65 @@
+"""
+llm_cache.py
+
+Content-addressed cache for chat completion responses.
+
+The key is a SHA-256 over the model, the full message list (system
+guardrails + prompt) and the sampling parameters, so re-running the same
+transcript/Polycam pair returns the stored response instead of paying for
+another call. Any change to the prompt, pricing sheet text or parameters
+produces a new key.
+
+Environment:
+  ESTIMATOR_LLM_CACHE=0               disable (same as --no-cache)
+  ESTIMATOR_LLM_CACHE_TTL_SECONDS     entry lifetime (default 7 days)
+  ESTIMATOR_LLM_CACHE_MAX_BYTES       size cap for .cache/llm_responses
+"""
+import hashlib
+import json
+import os
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskCache
+
+LLM_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'llm_responses')
+LLM_CACHE_TTL_SECONDS = int(os.environ.get('ESTIMATOR_LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('ESTIMATOR_LLM_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+_llm_cache = None
+
+def llm_cache_enabled():
+    """Return False when caching was turned off via --no-cache / ESTIMATOR_LLM_CACHE=0."""
+    return os.environ.get('ESTIMATOR_LLM_CACHE', '1').lower() not in ('0', 'false', 'no', 'off')
+
+def disable_llm_cache():
+    """Turn the cache off for this process and any subprocess it starts."""
+    os.environ['ESTIMATOR_LLM_CACHE'] = '0'
+
+def get_llm_cache():
+    """Return the process-wide response cache."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = DiskCache(LLM_CACHE_DIR, max_bytes=LLM_CACHE_MAX_BYTES, ttl_seconds=LLM_CACHE_TTL_SECONDS)
+    return _llm_cache
+
+def response_cache_key(model, messages, **params):
+    """Hash the model, messages and sampling parameters into a cache key."""
+    payload = json.dumps(
+        {'model': model, 'messages': messages, 'params': params},
+        sort_keys=True, ensure_ascii=False, separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_response(key):
+    """Return the cached response text for key, or None (also when disabled)."""
+    if not llm_cache_enabled():
+        return None
+    return get_llm_cache().get(key)
+
+def store_response(key, content):
+    """Store a non-empty response under key."""
+    if not llm_cache_enabled() or not content:
+        return
+    try:
+        get_llm_cache().set(key, content)
+    except OSError as e:
+        print(f"[WARNING] Could not write LLM response cache: {e}")
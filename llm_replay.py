@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+llm_replay.py
+
+Record/replay stand-in for the OpenAI chat completions API.
+
+Recording: with ESTIMATOR_LLM_RECORD=<dir> every real estimation/dedup call
+is saved as a cassette (<dir>/<request key>.json) holding the response text,
+token usage and timings. Existing runs can be imported:
+
+  python llm_replay.py import chunked_outputs/run_* --cassettes replay/
+
+Replay, either in-process or over HTTP:
+
+  ESTIMATOR_LLM_REPLAY=replay/ python run_chunked_estimation.py ... --no-cache
+  python llm_replay.py serve --cassettes replay/ --port 8765
+  OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python run_chunked_estimation.py ...
+
+A request is answered by the cassette with the same request key, else by one
+recorded for the same transcript text, else by a cassette picked
+deterministically from the request key, so replays are repeatable. Replies
+take first-token latency plus completion_tokens / tokens-per-second.
+
+Environment:
+  ESTIMATOR_REPLAY_FIRST_TOKEN_SECONDS  default 0.8 (recorded value wins)
+  ESTIMATOR_REPLAY_TOKENS_PER_SECOND    default 60
+  ESTIMATOR_REPLAY_SPEED                divide all delays by this (0 = no delay)
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from group_planner import count_message_tokens, count_tokens
+from llm_cache import response_cache_key
+
+TRANSCRIPT_MARKER = re.compile(r'\[TRANSCRIPT CHUNK\][^\n]*\n')
+RESPONSE_MARKER = "[RESPONSE]\n"
+RESPONSE_END = "\n[SUCCESS] Response saved"
+
+STREAM_PIECE_CHARS = 16
+
+def record_dir():
+    return os.environ.get('ESTIMATOR_LLM_RECORD') or None
+
+def replay_dir():
+    return os.environ.get('ESTIMATOR_LLM_REPLAY') or None
+
+def transcript_fingerprint(text):
+    """Hash the transcript text of a prompt (everything after the [TRANSCRIPT CHUNK] header)."""
+    match = TRANSCRIPT_MARKER.search(text)
+    if match:
+        text = text[match.end():]
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+def _write_cassette(directory, name, cassette):
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cassette, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, f"{name}.json"))
+
+def record_exchange(model, messages, params, content, usage=None, latency_seconds=None, first_token_seconds=None):
+    """Save a real request/response pair when ESTIMATOR_LLM_RECORD is set."""
+    directory = record_dir()
+    if not directory or not content:
+        return
+    key = response_cache_key(model, messages, **params)
+    _write_cassette(directory, key, {
+        'key': key,
+        'fingerprint': transcript_fingerprint(messages[-1]['content']),
+        'model': model,
+        'content': content,
+        'usage': usage or {},
+        'latency_seconds': latency_seconds,
+        'first_token_seconds': first_token_seconds,
+        'source': 'recorded',
+    })
+
+def extract_response_text(output):
+    """Return the model response from an estimate_output_chunk_*.txt file (None if it holds none)."""
+    if RESPONSE_MARKER in output:
+        # Sequential runs captured send_files_to_chatgpt_text.py stdout around the response
+        output = output.split(RESPONSE_MARKER, 1)[1].split(RESPONSE_END, 1)[0]
+    elif '```json' not in output:
+        return None
+    return output.strip() or None
+
+def import_run(run_dir, directory):
+    """Turn a run's estimate outputs (+ transcript chunks) into cassettes; returns the count."""
+    imported = 0
+    for output_path in sorted(glob.glob(os.path.join(run_dir, 'estimate_output_chunk_*.txt'))):
+        with open(output_path, 'r', encoding='utf-8') as f:
+            content = extract_response_text(f.read())
+        if content is None:
+            print(f"[WARNING] No model response in {output_path}; skipping")
+            continue
+
+        number = output_path.rsplit('_chunk_', 1)[1].split('.')[0]
+        fingerprint = None
+        for transcript_path in (os.path.join(run_dir, 'transcript_groups', f'group_{number}.txt'),
+                                os.path.join(run_dir, 'transcript_chunks', f'chunk_{number}.txt')):
+            if os.path.exists(transcript_path):
+                with open(transcript_path, 'r', encoding='utf-8') as f:
+                    fingerprint = transcript_fingerprint(f.read())
+                break
+
+        name = hashlib.sha256(f"{os.path.abspath(output_path)}\n{content}".encode('utf-8')).hexdigest()
+        _write_cassette(directory, name, {
+            'key': None,
+            'fingerprint': fingerprint,
+            'model': None,
+            'content': content,
+            'usage': {'completion_tokens': count_tokens(content)},
+            'latency_seconds': None,
+            'first_token_seconds': None,
+            'source': output_path,
+        })
+        imported += 1
+    return imported
+
+class CassetteLibrary:
+    """Cassettes loaded from a directory, indexed by request key and transcript fingerprint."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.cassettes = []
+        for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.cassettes.append(json.load(f))
+        if not self.cassettes:
+            raise ValueError(f"No replay cassettes found in {directory}")
+        self.by_key = {c['key']: c for c in self.cassettes if c.get('key')}
+        self.by_fingerprint = {}
+        for cassette in self.cassettes:
+            if cassette.get('fingerprint'):
+                self.by_fingerprint.setdefault(cassette['fingerprint'], cassette)
+
+    def lookup(self, model, messages, params):
+        key = response_cache_key(model, messages, **params)
+        if key in self.by_key:
+            return self.by_key[key], 'exact'
+        fingerprint = transcript_fingerprint(messages[-1]['content'])
+        if fingerprint in self.by_fingerprint:
+            return self.by_fingerprint[fingerprint], 'transcript'
+        return self.cassettes[int(key, 16) % len(self.cassettes)], 'fallback'
+
+def replay_timing(cassette, completion_tokens):
+    """Return (first_token_seconds, seconds_per_completion_token) for a replayed reply."""
+    speed = float(os.environ.get('ESTIMATOR_REPLAY_SPEED', '1'))
+    if speed <= 0:
+        return 0.0, 0.0
+    first_token = cassette.get('first_token_seconds')
+    if first_token is None:
+        first_token = float(os.environ.get('ESTIMATOR_REPLAY_FIRST_TOKEN_SECONDS', '0.8'))
+    tokens_per_second = float(os.environ.get('ESTIMATOR_REPLAY_TOKENS_PER_SECOND', '60'))
+    return first_token / speed, 1.0 / (tokens_per_second * speed)
+
+def build_completion(library, model, messages, params):
+    """Pick a cassette and return (content, usage dict, first-token delay, per-token delay)."""
+    cassette, match = library.lookup(model, messages, params)
+    content = cassette['content']
+    completion_tokens = cassette.get('usage', {}).get('completion_tokens') or count_tokens(content)
+    usage = {
+        'prompt_tokens': count_message_tokens(messages, model),
+        'completion_tokens': completion_tokens,
+        'total_tokens': count_message_tokens(messages, model) + completion_tokens,
+        'prompt_tokens_details': {'cached_tokens': cassette.get('usage', {}).get('cached_tokens') or 0},
+    }
+    first_token, per_token = replay_timing(cassette, completion_tokens)
+    print(f"[INFO] Replaying {match} cassette ({completion_tokens} completion tokens)")
+    return content, usage, first_token, per_token
+
+def completion_body(model, content, usage):
+    return {
+        'id': f"chatcmpl-replay-{uuid.uuid4().hex[:12]}",
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': usage,
+    }
+
+def stream_bodies(model, content, usage, first_token, per_token, include_usage):
+    """Yield chat.completion.chunk bodies, sleeping to mimic generation speed."""
+    completion_id = f"chatcmpl-replay-{uuid.uuid4().hex[:12]}"
+    base = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model}
+    time.sleep(first_token)
+    pieces = [content[i:i + STREAM_PIECE_CHARS] for i in range(0, len(content), STREAM_PIECE_CHARS)]
+    tokens_per_piece = usage['completion_tokens'] / max(1, len(pieces))
+    for piece in pieces:
+        yield dict(base, choices=[{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}])
+        time.sleep(tokens_per_piece * per_token)
+    yield dict(base, choices=[{'index': 0, 'delta': {'content': None}, 'finish_reason': 'stop'}])
+    if include_usage:
+        yield dict(base, choices=[], usage=usage)
+
+def _to_namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+class _ReplayCompletions:
+    def __init__(self, library):
+        self.library = library
+
+    def create(self, model, messages, stream=False, stream_options=None, **params):
+        content, usage, first_token, per_token = build_completion(self.library, model, messages, params)
+        if stream:
+            include_usage = bool((stream_options or {}).get('include_usage'))
+            return (_to_namespace(body) for body in
+                    stream_bodies(model, content, usage, first_token, per_token, include_usage))
+        time.sleep(first_token + usage['completion_tokens'] * per_token)
+        return _to_namespace(completion_body(model, content, usage))
+
+class ReplayClient:
+    """Drop-in for openai.OpenAI() that answers chat.completions.create from cassettes."""
+
+    def __init__(self, directory):
+        self.chat = SimpleNamespace(completions=_ReplayCompletions(CassetteLibrary(directory)))
+
+_replay_clients = {}
+_replay_clients_lock = threading.Lock()
+
+def create_client(api_key=None):
+    """Return a ReplayClient when ESTIMATOR_LLM_REPLAY is set, else an OpenAI client.
+
+    OpenAI clients are created without SDK retries; rate_limiter.py retries.
+    OPENAI_BASE_URL is honoured by the SDK, which is how the HTTP stand-in
+    is selected.
+    """
+    directory = replay_dir()
+    if directory:
+        with _replay_clients_lock:
+            if directory not in _replay_clients:
+                _replay_clients[directory] = ReplayClient(directory)
+                print(f"[INFO] Replaying LLM responses from {directory}")
+            return _replay_clients[directory]
+    import openai
+    return openai.OpenAI(api_key=api_key, max_retries=0)
+
+def make_handler(library):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self.send_error(404)
+                return
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            model = request.pop('model', 'gpt-4o')
+            messages = request.pop('messages')
+            stream = request.pop('stream', False)
+            stream_options = request.pop('stream_options', None) or {}
+            content, usage, first_token, per_token = build_completion(library, model, messages, request)
+
+            if not stream:
+                time.sleep(first_token + usage['completion_tokens'] * per_token)
+                payload = json.dumps(completion_body(model, content, usage)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            for body in stream_bodies(model, content, usage, first_token, per_token,
+                                      bool(stream_options.get('include_usage'))):
+                self.wfile.write(f"data: {json.dumps(body)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def log_message(self, format, *args):
+            pass
+
+    return ReplayHandler
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for the OpenAI chat completions API")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Create cassettes from existing run directories')
+    import_parser.add_argument('run_dirs', nargs='+', help='chunked_outputs/run_* directories')
+    import_parser.add_argument('--cassettes', required=True, help='Cassette directory to write')
+
+    serve_parser = subparsers.add_parser('serve', help='Serve cassettes at /v1/chat/completions')
+    serve_parser.add_argument('--cassettes', required=True, help='Cassette directory to replay')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        total = 0
+        for run_dir in args.run_dirs:
+            count = import_run(run_dir, args.cassettes)
+            print(f"[INFO] Imported {count} responses from {run_dir}")
+            total += count
+        print(f"[SUCCESS] {total} cassettes written to {args.cassettes}")
+        return
+
+    library = CassetteLibrary(args.cassettes)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(library))
+    print(f"[INFO] Replaying {len(library.cassettes)} cassettes at http://{args.host}:{args.port}/v1")
+    print(f"[INFO] Point the pipeline at it with OPENAI_BASE_URL=http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+llm_usage.py
+
+Per-call token usage reporting for chat completions.
+
+Each call's prompt/completion token counts, the provider's ``cached_tokens``
+(prompt tokens served from the prompt cache), its latency and, for streamed
+calls, the time to first token are printed and optionally appended as one
+JSON line to a run's ``llm_usage.jsonl`` so cache hit rates and latency can
+be compared across groups and runs.
+"""
+import json
+import threading
+
+_write_lock = threading.Lock()
+
+def usage_from_response(response):
+    """Return a usage dict from a chat completion response (empty if absent)."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return {}
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached_tokens = getattr(details, 'cached_tokens', None) if details is not None else None
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', None),
+        'completion_tokens': getattr(usage, 'completion_tokens', None),
+        'cached_tokens': cached_tokens or 0,
+    }
+
+def record_usage(record, usage_log=None):
+    """Print a usage record and append it to usage_log (JSON lines) if given."""
+    label = record.get('label') or 'request'
+    first_token = record.get('first_token_seconds')
+    print(
+        f"[USAGE] {label}: prompt_tokens={record.get('prompt_tokens')} "
+        f"cached_tokens={record.get('cached_tokens')} "
+        f"completion_tokens={record.get('completion_tokens')} "
+        f"latency={record.get('latency_seconds', 0):.2f}s"
+        + (f" first_token={first_token:.2f}s" if first_token is not None else "")
+    )
+    if usage_log:
+        with _write_lock:
+            with open(usage_log, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+
+def summarize_usage(usage_log):
+    """Aggregate a usage log into totals; returns None if the log is missing."""
+    try:
+        with open(usage_log, 'r', encoding='utf-8') as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return None
+
+    api_calls = [r for r in records if not r.get('from_cache')]
+    prompt_tokens = sum(r.get('prompt_tokens') or 0 for r in api_calls)
+    cached_tokens = sum(r.get('cached_tokens') or 0 for r in api_calls)
+    first_tokens = [r['first_token_seconds'] for r in api_calls if r.get('first_token_seconds') is not None]
+    return {
+        'calls': len(records),
+        'api_calls': len(api_calls),
+        'prompt_tokens': prompt_tokens,
+        'cached_tokens': cached_tokens,
+        'completion_tokens': sum(r.get('completion_tokens') or 0 for r in api_calls),
+        'cached_ratio': round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0,
+        'latency_seconds': round(sum(r.get('latency_seconds') or 0 for r in api_calls), 2),
+        'first_token_seconds_avg': round(sum(first_tokens) / len(first_tokens), 3) if first_tokens else None,
+    }
@@ -0,0 +1,238 @@
+"""
+pdf_extraction.py
+
+PDF text extraction shared by the estimation pipeline, with a persistent
+extraction cache keyed by file content hash.
+
+The master pricing sheet and the Polycam report are identical for every group
+of a run (and the pricing sheet across runs), so their text is parsed once and
+then served from ``.cache/pdf_text`` until the file content or the extractor
+version changes.
+
+Text comes from a backend in PDF_BACKENDS: pdfplumber (the default, and the
+reference the prompts were tuned on), or the faster pypdfium2, pymupdf and
+pypdf when installed. Each backend provides a page count and the text of a
+page range; benchmark_pipeline.py --pdf_backends compares their speed and
+output on the sample PDFs.
+
+Extraction is CPU-bound and single-threaded, so PDFs of PARALLEL_MIN_PAGES or
+more pages are split into page ranges extracted by a process pool; page text
+is reassembled in order and is identical to a serial extraction.
+
+Environment:
+  ESTIMATOR_PDF_BACKEND             extraction backend (default: pdfplumber)
+  ESTIMATOR_PDF_WORKERS             extraction processes (default: CPU count, max 8; 1 = serial)
+  ESTIMATOR_PDF_PARALLEL_MIN_PAGES  smallest PDF extracted in parallel (default 16)
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from disk_cache import DEFAULT_CACHE_DIR, DiskCache, file_sha256
+
+DEFAULT_PDF_BACKEND = "pdfplumber"
+
+PDF_CACHE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'pdf_text')
+PDF_CACHE_MAX_BYTES = int(os.environ.get('ESTIMATOR_PDF_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+PARALLEL_MIN_PAGES = int(os.environ.get('ESTIMATOR_PDF_PARALLEL_MIN_PAGES', '16'))
+# Each worker gets several smaller ranges so uneven pages balance out
+SHARDS_PER_WORKER = 4
+
+_pdf_cache = None
+# Small in-process LRU so concurrent groups of one run skip the disk read too.
+MEMO_MAX_ENTRIES = 8
+_memo = OrderedDict()
+_key_locks = {}
+_locks_guard = threading.Lock()
+
+def get_pdf_cache():
+    """Return the process-wide PDF text cache."""
+    global _pdf_cache
+    if _pdf_cache is None:
+        _pdf_cache = DiskCache(PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES)
+    return _pdf_cache
+
+# Backends: page_count(path) and page_texts(path, start, stop) yielding the
+# text (or None) of pages[start:stop], releasing each page once read.
+# Bump a backend's version whenever its output changes so stale cache entries are ignored.
+
+def _pdfplumber_page_count(pdf_path):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def _pdfplumber_page_texts(pdf_path, start=0, stop=None):
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            page_text = page.extract_text()
+            page.close()
+            yield page_text
+
+def _pdfium_page_count(pdf_path):
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+def _pdfium_page_texts(pdf_path, start=0, stop=None):
+    import pypdfium2
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        for index in range(start, len(pdf) if stop is None else min(stop, len(pdf))):
+            page = pdf[index]
+            textpage = page.get_textpage()
+            page_text = textpage.get_text_range()
+            textpage.close()
+            page.close()
+            yield page_text.replace('\r\n', '\n').strip()
+    finally:
+        pdf.close()
+
+def _pymupdf_page_count(pdf_path):
+    import fitz
+    with fitz.open(pdf_path) as pdf:
+        return pdf.page_count
+
+def _pymupdf_page_texts(pdf_path, start=0, stop=None):
+    import fitz
+    with fitz.open(pdf_path) as pdf:
+        for index in range(start, pdf.page_count if stop is None else min(stop, pdf.page_count)):
+            yield pdf.load_page(index).get_text().strip()
+
+def _pypdf_page_count(pdf_path):
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+def _pypdf_page_texts(pdf_path, start=0, stop=None):
+    from pypdf import PdfReader
+    for page in PdfReader(pdf_path).pages[start:stop]:
+        yield page.extract_text()
+
+PDF_BACKENDS = {
+    'pdfplumber': {'module': 'pdfplumber', 'version': 'pdfplumber-1',
+                   'page_count': _pdfplumber_page_count, 'page_texts': _pdfplumber_page_texts},
+    'pypdfium2': {'module': 'pypdfium2', 'version': 'pypdfium2-1',
+                  'page_count': _pdfium_page_count, 'page_texts': _pdfium_page_texts},
+    'pymupdf': {'module': 'fitz', 'version': 'pymupdf-1',
+                'page_count': _pymupdf_page_count, 'page_texts': _pymupdf_page_texts},
+    'pypdf': {'module': 'pypdf', 'version': 'pypdf-1',
+              'page_count': _pypdf_page_count, 'page_texts': _pypdf_page_texts},
+}
+
+def default_pdf_backend():
+    """Backend name from ESTIMATOR_PDF_BACKEND (read per call so CLI flags can set it)."""
+    return os.environ.get('ESTIMATOR_PDF_BACKEND') or DEFAULT_PDF_BACKEND
+
+def get_pdf_backend(name=None):
+    """Return the PDF_BACKENDS entry for name (default: default_pdf_backend())."""
+    name = name or default_pdf_backend()
+    if name not in PDF_BACKENDS:
+        raise ValueError(f"Unknown PDF backend '{name}' (choose from {', '.join(PDF_BACKENDS)})")
+    return PDF_BACKENDS[name]
+
+def available_pdf_backends():
+    """Names of the backends whose library is installed."""
+    import importlib.util
+    return [name for name, backend in PDF_BACKENDS.items() if importlib.util.find_spec(backend['module'])]
+
+def _extract_page_range(pdf_path, start, stop, backend_name=None):
+    """Return the text (or None) of pages[start:stop]; runs in a worker process."""
+    return list(get_pdf_backend(backend_name)['page_texts'](pdf_path, start, stop))
+
+def _iter_pages_serial(pdf_path, start=0, backend_name=None):
+    return get_pdf_backend(backend_name)['page_texts'](pdf_path, start)
+
+def _iter_shards_parallel(pdf_path, page_count, workers, backend_name=None):
+    shard = max(1, -(-page_count // (workers * SHARDS_PER_WORKER)))
+    starts = list(range(0, page_count, shard))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map returns shards in page order whatever order they finish in
+        yield from pool.map(_extract_page_range, [pdf_path] * len(starts), starts,
+                            [start + shard for start in starts], [backend_name] * len(starts))
+
+def default_pdf_workers():
+    """Worker count from ESTIMATOR_PDF_WORKERS (read per call so CLI flags can set it)."""
+    return int(os.environ.get('ESTIMATOR_PDF_WORKERS', '0')) or min(8, os.cpu_count() or 1)
+
+def pdf_page_count(pdf_path, backend=None):
+    return get_pdf_backend(backend)['page_count'](pdf_path)
+
+def iter_pdf_pages(pdf_path, workers=None, keep_empty=False, backend=None):
+    """Yield the text of each PDF page in order (pages without text are
+    skipped, or yielded as '' with keep_empty).
+
+    Each page's parsed layout is released as soon as its text is taken, so
+    memory stays at about one page however long the document is. With more
+    than one worker, PDFs of PARALLEL_MIN_PAGES or more pages are extracted
+    by a process pool in page ranges; smaller files are read serially, as
+    starting the pool would cost more than it saves. backend names a
+    PDF_BACKENDS entry (default: ESTIMATOR_PDF_BACKEND or pdfplumber).
+    """
+    backend = backend or default_pdf_backend()
+    get_pdf_backend(backend)  # unknown names fail here rather than in a worker
+    workers = default_pdf_workers() if workers is None else workers
+    done = 0
+    if workers > 1:
+        page_count = pdf_page_count(pdf_path, backend)
+        if page_count >= PARALLEL_MIN_PAGES:
+            try:
+                for texts in _iter_shards_parallel(pdf_path, page_count, min(workers, page_count), backend):
+                    for page_text in texts:
+                        if page_text or keep_empty:
+                            yield page_text or ''
+                    done += len(texts)
+                return
+            except (OSError, RuntimeError) as e:
+                # e.g. no process support in this environment, or a worker died
+                print(f"[WARNING] Parallel PDF extraction failed ({e}); extracting pages {done + 1}+ serially")
+    for page_text in _iter_pages_serial(pdf_path, done, backend):
+        if page_text or keep_empty:
+            yield page_text or ''
+
+def extract_pdf_text(pdf_path, workers=None, backend=None):
+    """Extract text from every page of a PDF with the given (or default) backend."""
+    return "".join(page_text + "\n" for page_text in iter_pdf_pages(pdf_path, workers, backend=backend)).strip()
+
+def extraction_cache_key(pdf_path, backend=None):
+    """Cache key for a PDF: hash of its content plus the backend's extractor version."""
+    content_hash = file_sha256(pdf_path)
+    version = get_pdf_backend(backend)['version']
+    return hashlib.sha256(f"{version}:{content_hash}".encode()).hexdigest()
+
+def _lock_for(key):
+    with _locks_guard:
+        return _key_locks.setdefault(key, threading.Lock())
+
+def extract_pdf_text_cached(pdf_path, use_cache=True, workers=None, backend=None):
+    """Extract PDF text, reusing an earlier extraction of identical content.
+
+    Concurrent callers asking for the same file wait for a single extraction
+    instead of all parsing it at once.
+    """
+    if not use_cache:
+        return extract_pdf_text(pdf_path, workers, backend)
+
+    key = extraction_cache_key(pdf_path, backend)
+    with _lock_for(key):
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+        cache = get_pdf_cache()
+        text = cache.get(key)
+        if text is None:
+            text = extract_pdf_text(pdf_path, workers, backend)
+            cache.set(key, text)
+            print(f"[INFO] Cached extracted text for {os.path.basename(pdf_path)}")
+        else:
+            print(f"[INFO] Using cached text for {os.path.basename(pdf_path)}")
+        _memo[key] = text
+        while len(_memo) > MEMO_MAX_ENTRIES:
+            _memo.popitem(last=False)
+        return text
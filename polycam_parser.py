@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+polycam_parser.py
+
+Parse a Polycam spatial report into a compact per-room geometry table.
+
+Runs once per job: the overview totals and each room's floor area, wall area,
+perimeter and ceiling height are written to ``polycam_rooms.json`` /
+``polycam_rooms.csv`` in the run directory, and a short ``polycam_summary.txt``
+is what the estimation prompt receives instead of the raw PDF text.
+
+Usage:
+  python polycam_parser.py polycam.pdf --output_dir chunked_outputs/run_x/polycam_chunks
+"""
+import argparse
+import csv
+import json
+import os
+import re
+
+from pdf_extraction import extract_pdf_text_cached
+
+NUMBER = r'(\d+(?:\.\d+)?)'
+
+OVERVIEW_PATTERNS = {
+    'bedrooms': re.compile(r'Number of bedrooms\s+(\d+)', re.IGNORECASE),
+    'bathrooms': re.compile(r'Number of bathrooms\s+(\d+)', re.IGNORECASE),
+    'exterior_floor_area_sf': re.compile(r'Total exterior floor area\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'livable_floor_area_sf': re.compile(r'Total livable floor area\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'wall_area_sf': re.compile(r'Total wall area\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'window_area_sf': re.compile(r'Total window area\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'volume_cf': re.compile(r'Total volume\s+' + NUMBER + r'\s*ft', re.IGNORECASE),
+}
+
+# Per-room detail pages start with the room name on the line before "Overview".
+ROOM_HEADING = re.compile(r'^[ \t]*(?P<room>[A-Za-z][A-Za-z0-9 /&\'-]*?)[ \t]*\n[ \t]*Overview[ \t]*$', re.MULTILINE)
+
+ROOM_PATTERNS = {
+    'floor_area_sf': re.compile(r'^[ \t]*Floor area\s+' + NUMBER + r'\s*sf', re.IGNORECASE | re.MULTILINE),
+    'wall_area_incl_openings_sf': re.compile(r'Wall area \(incl\. openings\)\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'wall_area_sf': re.compile(r'Wall area \(excl\. openings\)\s+' + NUMBER + r'\s*sf', re.IGNORECASE),
+    'perimeter_lf': re.compile(r'Perimeter\s+' + NUMBER + r'\s*ft', re.IGNORECASE),
+    'ceiling_height_ft': re.compile(r'Ceiling height\s+(\d+(?:\.\d+)?(?:\s*-\s*\d+(?:\.\d+)?)?)\s*ft', re.IGNORECASE),
+    'volume_cf': re.compile(r'Room volume\s+' + NUMBER + r'\s*ft', re.IGNORECASE),
+    'dimensions_ft': re.compile(r'Dimensions \(bounding box\)\s+' + NUMBER + r'\s*x\s*' + NUMBER + r'\s*ft', re.IGNORECASE),
+}
+
+# Summary table row: name, floor, wall, (B) w x l, (I) w x l, perimeter, ceiling height, volume.
+SUMMARY_ROW = re.compile(
+    r'^[ \t]*(?P<room>[A-Za-z][A-Za-z0-9 /&\'-]*?)\s+'
+    r'(?P<floor>\d+\.\d+)\s+(?P<wall>\d+\.\d+)\s+'
+    r'\(B\)\s*(?P<bw>\d+(?:\.\d+)?)\s*x\s*(?P<bl>\d+(?:\.\d+)?)\s+'
+    r'(?:\(I\)\s*\d+(?:\.\d+)?\s*x\s*\d+(?:\.\d+)?\s+)?'
+    r'(?P<perimeter>\d+(?:\.\d+)?)\s+'
+    r'(?P<ceiling>\d+(?:\.\d+)?(?:\s*-\s*\d+(?:\.\d+)?)?)\s+'
+    r'(?P<volume>\d+(?:\.\d+)?)',
+    re.MULTILINE
+)
+
+CSV_FIELDS = [
+    'room', 'floor_area_sf', 'wall_area_sf', 'wall_area_incl_openings_sf',
+    'ceiling_area_sf', 'perimeter_lf', 'ceiling_height_ft', 'volume_cf', 'dimensions_ft'
+]
+
+def _to_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+def parse_overview(text):
+    """Extract the whole-apartment totals from the report overview page."""
+    overview = {}
+    for field, pattern in OVERVIEW_PATTERNS.items():
+        match = pattern.search(text)
+        if match:
+            overview[field] = _to_number(match.group(1))
+    return overview
+
+def parse_room_details(text):
+    """Extract measurements from each room's detail page, keyed by room name."""
+    rooms = {}
+    headings = list(ROOM_HEADING.finditer(text))
+    for idx, heading in enumerate(headings):
+        room = heading.group('room').strip()
+        end = headings[idx + 1].start() if idx + 1 < len(headings) else len(text)
+        section = text[heading.end():end]
+        if not ROOM_PATTERNS['floor_area_sf'].search(section):
+            continue  # the report's own "Overview" page, not a room
+
+        data = {'room': room}
+        for field, pattern in ROOM_PATTERNS.items():
+            match = pattern.search(section)
+            if not match:
+                continue
+            if field == 'dimensions_ft':
+                data[field] = f"{match.group(1)} x {match.group(2)}"
+            elif field == 'ceiling_height_ft':
+                data[field] = _to_number(re.sub(r'\s+', '', match.group(1)))
+            else:
+                data[field] = _to_number(match.group(1))
+        rooms[room] = data
+    return rooms
+
+def parse_summary_table(text):
+    """Extract rooms from the 'Room / Floor area / Wall area / ...' summary table."""
+    rooms = {}
+    for match in SUMMARY_ROW.finditer(text):
+        room = match.group('room').strip()
+        rooms[room] = {
+            'room': room,
+            'floor_area_sf': float(match.group('floor')),
+            'wall_area_sf': float(match.group('wall')),
+            'perimeter_lf': float(match.group('perimeter')),
+            'ceiling_height_ft': _to_number(re.sub(r'\s+', '', match.group('ceiling'))),
+            'volume_cf': float(match.group('volume')),
+            'dimensions_ft': f"{match.group('bw')} x {match.group('bl')}",
+        }
+    return rooms
+
+def parse_polycam_text(text):
+    """Parse extracted Polycam report text into {'overview': {...}, 'rooms': [...]}."""
+    rooms = parse_summary_table(text)
+    for room, details in parse_room_details(text).items():
+        rooms.setdefault(room, {'room': room}).update(details)
+
+    for data in rooms.values():
+        # Polycam reports no ceiling area; a flat ceiling matches the floor area.
+        if 'floor_area_sf' in data:
+            data.setdefault('ceiling_area_sf', data['floor_area_sf'])
+
+    return {'overview': parse_overview(text), 'rooms': list(rooms.values())}
+
+def format_polycam_summary(geometry, source_name=''):
+    """Render parsed geometry as the compact text block sent to the LLM."""
+    lines = [f"POLYCAM MEASUREMENTS{f' ({source_name})' if source_name else ''}"]
+    overview = geometry.get('overview', {})
+    if overview:
+        labels = [
+            ('bedrooms', 'Bedrooms', ''), ('bathrooms', 'Bathrooms', ''),
+            ('livable_floor_area_sf', 'Livable floor area', ' SF'),
+            ('exterior_floor_area_sf', 'Exterior floor area', ' SF'),
+            ('wall_area_sf', 'Total wall area', ' SF'), ('window_area_sf', 'Window area', ' SF'),
+        ]
+        parts = [f"{label} {overview[key]:g}{unit}" for key, label, unit in labels if key in overview]
+        lines.append("Overview: " + ", ".join(parts))
+
+    lines.append("| Room | Floor SF | Wall SF (excl. openings) | Ceiling SF | Perimeter LF | Ceiling height FT | Dimensions FT |")
+    lines.append("| --- | --- | --- | --- | --- | --- | --- |")
+    for room in geometry.get('rooms', []):
+        lines.append("| " + " | ".join(str(room.get(field, '')) for field in [
+            'room', 'floor_area_sf', 'wall_area_sf', 'ceiling_area_sf',
+            'perimeter_lf', 'ceiling_height_ft', 'dimensions_ft'
+        ]) + " |")
+    return "\n".join(lines) + "\n"
+
+def process_polycam(pdf_path, output_dir):
+    """Parse the Polycam PDF once and write JSON, CSV and summary files to output_dir.
+
+    Returns the summary text path, or None when no rooms could be parsed so
+    the caller can fall back to the raw PDF.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    try:
+        text = extract_pdf_text_cached(pdf_path)
+    except Exception as e:
+        print(f"[WARNING] Could not extract Polycam text from {pdf_path}: {e}")
+        return None
+
+    geometry = parse_polycam_text(text)
+    if not geometry['rooms']:
+        print(f"[WARNING] No rooms found in Polycam report: {pdf_path}")
+        return None
+
+    with open(os.path.join(output_dir, 'polycam_rooms.json'), 'w', encoding='utf-8') as f:
+        json.dump(geometry, f, indent=2)
+
+    with open(os.path.join(output_dir, 'polycam_rooms.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(geometry['rooms'])
+
+    summary = format_polycam_summary(geometry, os.path.basename(pdf_path))
+    summary_path = os.path.join(output_dir, 'polycam_summary.txt')
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        f.write(summary)
+
+    print(f"[INFO] Parsed {len(geometry['rooms'])} Polycam rooms: {len(text)} -> {len(summary)} characters")
+    return summary_path
+
+def load_floor_areas(output_dir):
+    """Return {'total': SF or None, 'rooms': {room: floor SF}} from polycam_rooms.json in output_dir, or None."""
+    try:
+        with open(os.path.join(output_dir, 'polycam_rooms.json'), 'r', encoding='utf-8') as f:
+            geometry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    rooms = {room['room']: room['floor_area_sf'] for room in geometry.get('rooms', [])
+             if isinstance(room.get('floor_area_sf'), (int, float))}
+    total = geometry.get('overview', {}).get('livable_floor_area_sf')
+    if not isinstance(total, (int, float)):
+        total = sum(rooms.values()) if rooms else None
+    return {'total': total, 'rooms': rooms}
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse a Polycam report into a per-room geometry table")
+    parser.add_argument("polycam", help="Path to Polycam PDF")
+    parser.add_argument("--output_dir", required=True, help="Directory for polycam_rooms.json/.csv and polycam_summary.txt")
+    args = parser.parse_args()
+
+    summary_path = process_polycam(args.polycam, args.output_dir)
+    if summary_path:
+        print(f"[SUCCESS] Polycam summary written to: {summary_path}")
+    else:
+        print("[ERROR] Failed to parse Polycam report")
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+pricing_catalog.py
+
+master_pricing_data.csv loaded once per process into typed records with
+lookup indexes.
+
+read_pricing_rows() reads the sheet into dicts keyed by PRICING_COLUMNS,
+re-joining fields that an unquoted comma split in two.
+
+get_catalog() returns the shared PricingCatalog for a CSV path, reloading it
+only when the file changes. Records hold the sheet's columns under
+snake_case keys; labor, material, margin and minimum are Decimals (None for
+N/A, TBD, QUOTE and other non-prices) and unit_cost is labor + material (None
+when both are missing). The raw aligned rows stay available as
+catalog.rows for pricing_router.
+
+Rows banded by size ('Up to 600 sf', '600 - 1200 sf', '80 > 100+ sf',
+'20 FT +') get record['band'] = (low, high, unit). Rows sharing a
+description, category, subcategory and band unit form a band family;
+select_band() finds the family member covering a measured size by bisection
+over the bands' upper bounds.
+
+When a compiled snapshot of the CSV exists (pricing_snapshot.py build) and is
+not older than it, get_catalog() loads that instead; such catalogs carry the
+sheet's version and effective date.
+"""
+import bisect
+import csv
+import math
+import os
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+PRICING_CSV = "master_pricing_data.csv"
+PRICING_COLUMNS = ['Item Code', 'Description', 'Size/Type', 'Unit', 'Labor', 'Material',
+                   'Category', 'Subcategory', 'Notes', 'Margin', 'Minimum']
+
+_NUMERIC = re.compile(r'^\$?-?[\d,]*\.?\d+$')
+_PRICE_TOKENS = {'N/A', 'QUOTE', 'TBD', ''}
+
+def _plausible(row):
+    """Score a column alignment: price columns hold prices and Category is a name."""
+    score = sum(1 for key in ('Labor', 'Material') if row[key] in _PRICE_TOKENS or _NUMERIC.match(row[key]))
+    category = row['Category'].strip()
+    if category and category not in _PRICE_TOKENS and not _NUMERIC.match(category):
+        score += 2
+    return score
+
+def _align(fields):
+    """Map a CSV record to PRICING_COLUMNS, re-joining fields split by unquoted commas."""
+    extra = len(fields) - len(PRICING_COLUMNS)
+    if extra <= 0:
+        return dict(zip(PRICING_COLUMNS, fields + [''] * -extra))
+    # The stray comma is either in the description (shift right) or the notes (shift left)
+    in_description = [fields[0], ','.join(fields[1:2 + extra])] + fields[2 + extra:]
+    in_notes = fields[:8] + [','.join(fields[8:9 + extra])] + fields[9 + extra:]
+    candidates = [dict(zip(PRICING_COLUMNS, f)) for f in (in_notes, in_description)]
+    return max(candidates, key=_plausible)
+
+def read_pricing_rows(csv_path=PRICING_CSV):
+    """Read master_pricing_data.csv into dicts keyed by PRICING_COLUMNS."""
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        records = list(csv.reader(f))
+    return [_align(fields) for fields in records[1:] if any(field.strip() for field in fields)]
+
+# CSV column -> record key; prices are parsed to Decimal
+FIELDS = {
+    'Item Code': 'item_code', 'Description': 'description', 'Size/Type': 'size', 'Unit': 'unit',
+    'Labor': 'labor', 'Material': 'material', 'Category': 'category', 'Subcategory': 'subcategory',
+    'Notes': 'notes', 'Margin': 'margin', 'Minimum': 'minimum',
+}
+PRICE_FIELDS = ('labor', 'material', 'margin', 'minimum')
+
+_BAND_UNIT = r'(?P<unit>sf|ft)'
+_BAND_PATTERNS = [
+    re.compile(r'^up to\s*(?P<high>\d[\d,]*)\s*' + _BAND_UNIT + r'$'),                                  # Up to 600 sf
+    re.compile(r'^(?P<low>\d[\d,]*)\s*[->]\s*(?P<high>\d[\d,]*)\s*(?P<open>\+)?\s*' + _BAND_UNIT + r'$'),  # 600 - 1200 sf, 80 > 100+ sf
+    re.compile(r'^(?P<low>\d[\d,]*)\s*' + _BAND_UNIT + r'\s*(?P<open>\+)$'),                           # 2500 sf +, 10 ft+
+]
+
+_catalogs = {}  # absolute CSV path -> ((snapshot mtime, CSV mtime), PricingCatalog)
+_lock = threading.Lock()
+
+def parse_price(value):
+    """Return value ('$1,375.00', '0.75') as a Decimal, or None if it is not a price."""
+    text = str(value).strip().replace('$', '').replace(',', '')
+    if not text:
+        return None
+    try:
+        price = Decimal(text)
+    except InvalidOperation:
+        return None
+    return price if price.is_finite() else None
+
+def parse_size_band(text):
+    """Return (low, high, 'SF' or 'FT') for a Size/Type band such as '600 - 1200 sf'; high is inf when open-ended."""
+    text = re.sub(r'\s+', ' ', str(text).strip().lower())
+    for pattern in _BAND_PATTERNS:
+        m = pattern.match(text)
+        if m:
+            groups = m.groupdict()
+            low = float((groups.get('low') or '0').replace(',', ''))
+            high = math.inf if groups.get('open') or not groups.get('high') else float(groups['high'].replace(',', ''))
+            return low, high, m.group('unit').upper()
+    return None
+
+def make_record(row):
+    record = {key: row.get(column, '').strip() for column, key in FIELDS.items()}
+    for key in PRICE_FIELDS:
+        record[key] = parse_price(record[key])
+    record['unit'] = record['unit'].upper()
+    if record['labor'] is None and record['material'] is None:
+        record['unit_cost'] = None
+    else:
+        record['unit_cost'] = (record['labor'] or Decimal(0)) + (record['material'] or Decimal(0))
+    record['band'] = parse_size_band(record['size'])
+    return record
+
+class PricingCatalog:
+    """Typed pricing records indexed by item code, category, subcategory and unit."""
+
+    def __init__(self, rows, path=None, version=None, effective_date=None):
+        self.path = path
+        self.version = version
+        self.effective_date = effective_date
+        self.rows = rows
+        self.records = [make_record(row) for row in rows]
+        self.by_code = {}
+        self.by_category = {}
+        self.by_subcategory = {}
+        self.by_unit = {}
+        self.band_families = {}  # (description, category, subcategory, band unit) -> records sorted by upper bound
+        for record in self.records:
+            if record['item_code']:
+                self.by_code.setdefault(record['item_code'].upper(), record)
+            for index, key in ((self.by_category, 'category'), (self.by_subcategory, 'subcategory'),
+                               (self.by_unit, 'unit')):
+                if record[key]:
+                    index.setdefault(record[key].lower(), []).append(record)
+            if record['band'] and record['unit_cost'] is not None:
+                self.band_families.setdefault(self.band_key(record), []).append(record)
+        for key, family in list(self.band_families.items()):
+            if len(family) < 2:
+                del self.band_families[key]
+                continue
+            family.sort(key=lambda record: (record['band'][1], record['band'][0]))
+        self._band_highs = {key: [record['band'][1] for record in family] for key, family in self.band_families.items()}
+
+    @classmethod
+    def load(cls, csv_path=PRICING_CSV):
+        return cls(read_pricing_rows(csv_path), csv_path)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __contains__(self, code):
+        return str(code).strip().upper() in self.by_code
+
+    def get(self, code):
+        """Return the record for an item code (case-insensitive), or None."""
+        return self.by_code.get(str(code).strip().upper())
+
+    def in_category(self, category):
+        return self.by_category.get(category.strip().lower(), [])
+
+    def in_subcategory(self, subcategory):
+        return self.by_subcategory.get(subcategory.strip().lower(), [])
+
+    def with_unit(self, unit):
+        return self.by_unit.get(unit.strip().lower(), [])
+
+    @staticmethod
+    def band_key(record):
+        return (record['description'].lower(), record['category'].lower(), record['subcategory'].lower(),
+                record['band'][2] if record['band'] else None)
+
+    def band_family(self, code):
+        """Return the sorted band family of an item code, or None if it is not banded."""
+        record = self.get(code)
+        if record is None or not record['band']:
+            return None
+        return self.band_families.get(self.band_key(record))
+
+    def select_band(self, code, size):
+        """Return the record of code's band family whose band covers size (the largest band above them all)."""
+        family = self.band_family(code)
+        if family is None:
+            return None
+        highs = self._band_highs[self.band_key(family[0])]
+        return family[min(bisect.bisect_left(highs, size), len(family) - 1)]
+
+    def codes(self):
+        return set(record['item_code'] for record in self.records if record['item_code'])
+
+    def categories(self):
+        return set(record['category'] for record in self.records if record['category'])
+
+    def priced(self):
+        """Records with a numeric labor or material price."""
+        return [record for record in self.records if record['unit_cost'] is not None]
+
+def _snapshot_for(path):
+    """The compiled snapshot standing in for a CSV path (the default pricing CSV only), or None."""
+    from pricing_snapshot import PRICING_SNAPSHOT
+
+    return os.path.abspath(PRICING_SNAPSHOT) if path == os.path.abspath(PRICING_CSV) else None
+
+def _mtime(path):
+    return os.path.getmtime(path) if path and os.path.exists(path) else None
+
+def _load(path, snapshot):
+    """Load the catalog for a CSV path, from its snapshot when that exists and is not older than the CSV."""
+    from pricing_snapshot import load_snapshot_catalog
+
+    if _mtime(snapshot) is not None:
+        name = os.path.basename(snapshot)
+        if (_mtime(path) or 0) > _mtime(snapshot):
+            print(f"[WARNING] {name} is older than {os.path.basename(path)}; loading the CSV (rebuild the snapshot)")
+        else:
+            try:
+                catalog = load_snapshot_catalog(snapshot)
+                print(f"[INFO] Pricing {catalog.version} (effective {catalog.effective_date}) loaded from {name}")
+                return catalog
+            except (OSError, ValueError) as e:
+                print(f"[WARNING] Could not load {name} ({e}); loading {os.path.basename(path)}")
+    return PricingCatalog.load(path)
+
+def get_catalog(csv_path=PRICING_CSV):
+    """Return the process-wide catalog for csv_path, loading it on first use or when its files changed."""
+    path = os.path.abspath(csv_path)
+    snapshot = _snapshot_for(path)
+    stamp = (_mtime(snapshot), os.path.getmtime(path) if snapshot is None else _mtime(path))
+    with _lock:
+        cached = _catalogs.get(path)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, _load(path, snapshot))
+            _catalogs[path] = cached
+        return cached[1]
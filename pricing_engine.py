@@ -0,0 +1,257 @@
+"""
+pricing_engine.py
+
+Deterministic pricing of estimate items from their pricing sheet item code.
+
+The model names the master pricing row it used (item_code) and a quantity;
+labor, material, margin and subtotal are then computed here from the
+PricingCatalog instead of trusting the model's arithmetic. price_lines()
+prices a whole batch as columns of integers: quantities in 1/10,000 units,
+rates in cents and margins in basis points. With numpy the columns are int64
+arrays; products that could overflow them (and installs without numpy) use
+Python integers. Either way totals are exact to the cent and round half up,
+as the sheet does; a float array would not be.
+
+Rows banded by size (CLEN-01..05, DEMO-07..11, the bathroom 0 > 60 / 60 > 80 /
+80 > 100 sf bands...) are re-selected from the Polycam floor areas by
+select_bands(): bands of a room subcategory (Bathroom, Kitchen) use the
+item's room, the others the whole apartment.
+
+Trade minimums (the sheet's Minimum column, shared by a trade) are applied
+to the finished estimate by apply_trade_minimums(): a trade whose priced
+items total less than its minimum gets one adjustment row making up the
+difference.
+"""
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+try:
+    import numpy as np  # Optional; prices the batch as int64 columns
+except ImportError:
+    np = None
+
+from pricing_catalog import get_catalog
+from pricing_router import ROOM_KEYWORDS
+
+CENT = Decimal('0.01')
+QUANTITY_SCALE = 10_000  # quantities are priced to 0.0001 of a unit
+MARGIN_SCALE = 10_000    # margins in basis points
+_INT64_LIMIT = 2 ** 62
+DEFAULT_MARGIN = Decimal('0.75')
+MINIMUM_ITEM = 'Trade minimum adjustment'
+
+# Quantity unit spellings -> pricing sheet unit
+_UNIT_ALIASES = {
+    'SF': 'SF', 'SQFT': 'SF', 'SQ FT': 'SF', 'SQ. FT.': 'SF', 'SQUARE FEET': 'SF',
+    'LF': 'LF', 'LIN FT': 'LF', 'LINEAR FEET': 'LF',
+    'EA': 'EA', 'EACH': 'EA', 'UNIT': 'UNIT', 'UNITS': 'UNIT', 'PCS': 'EA',
+    'LS': 'LS', 'LUMP SUM': 'LS',
+}
+# Units that count items and may stand in for each other
+_COUNT_UNITS = {'EA', 'UNIT', 'LS', ''}
+_QUANTITY = re.compile(r'^\s*\$?(?P<number>-?\d[\d,]*(?:\.\d+)?|-?\.\d+)\s*(?P<unit>[A-Za-z][A-Za-z. ]*)?')
+
+def parse_quantity(text):
+    """Return (Decimal quantity, sheet unit or '') for '120 SF', '6', '6 units'; None if no number."""
+    if isinstance(text, (int, float, Decimal)):
+        return Decimal(str(text)), ''
+    m = _QUANTITY.match(str(text or ''))
+    if not m:
+        return None
+    unit = (m.group('unit') or '').strip().upper().rstrip('.')
+    return Decimal(m.group('number').replace(',', '')), _UNIT_ALIASES.get(unit, unit)
+
+def units_compatible(quantity_unit, sheet_unit):
+    """True if a quantity in quantity_unit ('' for a bare number) can be priced on a sheet_unit row.
+
+    A bare number is a count: it fits EA / UNIT / LS rows, never SF or LF,
+    where '6' would silently be priced as 6 SF.
+    """
+    if sheet_unit not in {'SF', 'LF', 'EA', 'UNIT', 'LS'}:
+        return True  # the sheet prices per slab, per job, ...
+    if quantity_unit == sheet_unit:
+        return True
+    return quantity_unit in _COUNT_UNITS and sheet_unit in _COUNT_UNITS
+
+def money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+def _scaled(value, scale):
+    return int((Decimal(value) * scale).to_integral_value(rounding=ROUND_HALF_UP))
+
+def _divide_half_up(values, divisor):
+    """values / divisor rounded half away from zero (Decimal ROUND_HALF_UP) for an int64 array or int list."""
+    if np is not None and isinstance(values, np.ndarray):
+        return np.sign(values) * ((np.abs(values) + divisor // 2) // divisor)
+    return [(1 if value >= 0 else -1) * ((abs(value) + divisor // 2) // divisor) for value in values]
+
+def _price_columns(quantities, labor, material, margins):
+    """Labor, material and subtotal cents for integer columns (quantity, rate cents, margin basis points)."""
+    largest = max(map(abs, quantities)) * max(l + m for l, m in zip(labor, material)) * max(MARGIN_SCALE + m for m in margins)
+    if np is not None and largest < _INT64_LIMIT:
+        quantities, labor, material, margins = (np.array(column, dtype=np.int64)
+                                                for column in (quantities, labor, material, margins))
+        base = quantities * (labor + material)
+        subtotal = base * (MARGIN_SCALE + margins)
+        labor, material = quantities * labor, quantities * material
+    else:
+        base = [q * (l + m) for q, l, m in zip(quantities, labor, material)]
+        subtotal = [b * (MARGIN_SCALE + m) for b, m in zip(base, margins)]
+        labor = [q * l for q, l in zip(quantities, labor)]
+        material = [q * m for q, m in zip(quantities, material)]
+    return (_divide_half_up(labor, QUANTITY_SCALE), _divide_half_up(material, QUANTITY_SCALE),
+            _divide_half_up(subtotal, QUANTITY_SCALE * MARGIN_SCALE))
+
+def _cents(value):
+    return Decimal(int(value)).scaleb(-2)
+
+def price_lines(codes, quantities, catalog=None):
+    """Price parallel lists of item codes and quantity texts.
+
+    Returns one dict per line (code, quantity, unit, labor, material,
+    unit_cost, margin, subtotal, minimum, category; Decimals), or None where
+    the code is unknown or unpriced, the quantity unreadable, or its unit
+    does not fit the sheet row.
+    """
+    catalog = catalog or get_catalog()
+    records = {code: catalog.get(code) for code in set(codes) if code}
+    parsed = [parse_quantity(quantity) for quantity in quantities]
+
+    rows = []  # (position, record, amount, unit, margin) of every priceable line
+    for position, (code, quantity) in enumerate(zip(codes, parsed)):
+        record = records.get(code)
+        if record is None or record['unit_cost'] is None or quantity is None:
+            continue
+        amount, unit = quantity
+        if units_compatible(unit, record['unit']):
+            rows.append((position, record, amount, unit, DEFAULT_MARGIN if record['margin'] is None else record['margin']))
+
+    results = [None] * len(codes)
+    if not rows:
+        return results
+    labor, material, subtotal = _price_columns(
+        [_scaled(amount, QUANTITY_SCALE) for _, _, amount, _, _ in rows],
+        [_scaled(record['labor'] or 0, 100) for _, record, _, _, _ in rows],
+        [_scaled(record['material'] or 0, 100) for _, record, _, _, _ in rows],
+        [_scaled(margin, MARGIN_SCALE) for _, _, _, _, margin in rows],
+    )
+    for (position, record, amount, unit, margin), labor_cents, material_cents, subtotal_cents in zip(
+            rows, labor, material, subtotal):
+        results[position] = {
+            'code': record['item_code'], 'quantity': amount,
+            'unit': record['unit'] if record['unit'] in {'SF', 'LF', 'EA', 'UNIT', 'LS'} else (unit or 'UNIT'),
+            'labor': _cents(labor_cents), 'material': _cents(material_cents), 'unit_cost': record['unit_cost'],
+            'margin': margin, 'subtotal': _cents(subtotal_cents),
+            'minimum': record['minimum'], 'category': record['category'],
+        }
+    return results
+
+def _room_key(name):
+    return re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).strip()
+
+def room_floor_area(room, rooms):
+    """Floor area of the Polycam room named like room (or the only one of its kind), else None."""
+    wanted = _room_key(room)
+    if not wanted:
+        return None
+    areas = {_room_key(name): area for name, area in rooms.items()}
+    if wanted in areas:
+        return areas[wanted]
+    kind = next((keyword for keyword in ROOM_KEYWORDS if wanted.startswith(keyword)), None)
+    matches = [area for name, area in areas.items() if kind and name.startswith(kind)]
+    return matches[0] if len(matches) == 1 else None
+
+def measured_size(record, room, areas):
+    """The Polycam area deciding record's size band, or None."""
+    if not areas or not record['band'] or record['band'][2] != 'SF':
+        return None
+    if record['subcategory'].lower() in ROOM_KEYWORDS:
+        return room_floor_area(room, areas.get('rooms', {}))
+    return areas.get('total')
+
+def select_bands(items, areas, catalog=None):
+    """Swap the ItemCode of banded items for the band covering their measured area; returns the number swapped."""
+    if not areas:
+        return 0
+    catalog = catalog or get_catalog()
+    swapped = 0
+    for item in items:
+        record = catalog.get(item.get('ItemCode', '') or '')
+        if record is None or catalog.band_family(record['item_code']) is None:
+            continue
+        size = measured_size(record, item.get('Room', ''), areas)
+        if size is None:
+            continue
+        band = catalog.select_band(record['item_code'], size)
+        if band is not record:
+            print(f"[INFO] {item.get('ItemName', '')} ({item.get('Room', '')}): {record['item_code']} '{record['size']}' -> "
+                  f"{band['item_code']} '{band['size']}' for {size:g} SF")
+            item['ItemCode'] = band['item_code']
+            swapped += 1
+    return swapped
+
+def _number(value):
+    try:
+        return Decimal(str(value).replace('$', '').replace(',', '').strip())
+    except ArithmeticError:
+        return None
+
+def price_estimate_rows(items, catalog=None, areas=None):
+    """Reprice aggregation rows that carry an ItemCode; returns {'priced', 'changed', 'unpriced', 'rebanded'}.
+
+    UnitCost, Markup and Total are overwritten with the sheet's figures;
+    rows without a code (or with one that cannot be priced) keep the model's.
+    areas (polycam_parser.load_floor_areas) re-selects size-banded codes first.
+    """
+    coded = [item for item in items if str(item.get('ItemCode', '') or '').strip()]
+    stats = {'priced': 0, 'changed': 0, 'unpriced': 0, 'rebanded': 0}
+    if not coded:
+        return stats
+    stats['rebanded'] = select_bands(coded, areas, catalog)
+    lines = price_lines([item['ItemCode'].strip() for item in coded], [item.get('Quantity', '') for item in coded],
+                        catalog)
+    for item, line in zip(coded, lines):
+        if line is None:
+            stats['unpriced'] += 1
+            continue
+        previous = _number(item.get('Total', ''))
+        if previous is None or abs(previous - line['subtotal']) >= 1:
+            stats['changed'] += 1
+        item['ItemCode'] = line['code']
+        item['UnitCost'] = f"${line['unit_cost']:.2f} per {line['unit']}"
+        item['Markup'] = f"{line['margin'].normalize():f}"
+        item['Total'] = f"{line['subtotal']:.2f}"
+        stats['priced'] += 1
+    return stats
+
+def apply_trade_minimums(items, catalog=None):
+    """Append an adjustment row for each trade whose coded items total less than its minimum.
+
+    Trades are the pricing sheet categories of the items' codes; earlier
+    adjustment rows are replaced. Returns the new item list.
+    """
+    catalog = catalog or get_catalog()
+    items = [item for item in items if item.get('ItemName') != MINIMUM_ITEM]
+    trades = {}
+    for item in items:
+        record = catalog.get(item.get('ItemCode', '') or '')
+        total = _number(item.get('Total', ''))
+        if record is None or record['minimum'] is None or total is None:
+            continue
+        trade = trades.setdefault(record['category'], {'minimum': Decimal(0), 'total': Decimal(0), 'section': item['Category']})
+        trade['minimum'] = max(trade['minimum'], record['minimum'])
+        trade['total'] += total
+
+    for name, trade in trades.items():
+        shortfall = money(trade['minimum'] - trade['total'])
+        if shortfall <= 0:
+            continue
+        print(f"[INFO] {name}: items total ${trade['total']:.2f}, below the ${trade['minimum']:.2f} trade minimum; "
+              f"adding ${shortfall:.2f}")
+        items.append({
+            'Category': trade['section'], 'Room': 'General', 'ItemName': MINIMUM_ITEM,
+            'Description': f"{name} minimum charge ${trade['minimum']:.2f}",
+            'Quantity': '1 LS', 'UnitCost': f"${shortfall:.2f} per LS", 'Markup': '0', 'MarkupType': '%',
+            'Total': f"{shortfall:.2f}", 'Confidence': '100', 'ItemCode': '',
+        })
+    return items
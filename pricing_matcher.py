@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+pricing_matcher.py
+
+Link free-text estimate items to master pricing sheet Item Codes.
+
+Every priced catalog row (description, size/type, category, subcategory) is
+turned once into a TF-IDF vector of character trigrams taken within words, so
+spelling variants and plurals ('Recessed Lights' / 'Recessed lighting') still
+overlap. Items are vectorised the same way and scored against all rows in one
+matrix product (cosine similarity); match() returns the top-k codes with
+scores for each item.
+
+link_item_codes() gives uncoded estimate rows a code, so pricing_engine can
+reprice them from internal rates, only when the link is exact: the
+best-scoring candidate whose unit fits and whose sheet rate equals the rate
+the model quoted. Rows quoting no rate only get a SuggestedCode for a
+clearly matching candidate and keep the model's total. A quoted rate found
+on no candidate means the model priced something else (a lump sum, a trade
+minimum), and the row is left alone. Size-banded rows (CLEN-01..05, ...)
+are only candidates in the band a measured Polycam area selects.
+
+numpy is used when installed; without it the same scores are computed with
+sparse dicts (slower, identical results).
+
+Usage:
+  python pricing_matcher.py "Recessed lighting" "Kitchen countertop fabrication" --top 3
+"""
+import argparse
+import math
+import re
+import threading
+from collections import Counter
+
+try:
+    import numpy as np  # Optional; scores the whole batch in one matrix product
+except ImportError:
+    np = None
+
+from pricing_catalog import PRICING_CSV, get_catalog
+
+NGRAM = 3
+TOP_K = 10
+MIN_SCORE = 0.6         # text match accepted for a row quoting no rate
+MIN_PRICED_SCORE = 0.2  # text match accepted when its sheet rate equals the quoted rate
+
+_WORD = re.compile(r'[a-z0-9]+')
+_RATE = re.compile(r'\$\s*(?P<rate>\d[\d,]*(?:\.\d+)?)\s*(?:per\s+(?P<unit>[a-z]+))?', re.IGNORECASE)
+
+_matchers = {}  # id(catalog) -> (catalog, CodeMatcher)
+_lock = threading.Lock()
+
+def char_ngrams(text):
+    """Character trigrams of each word padded with spaces (' re', 'rec', ..., 'ed ')."""
+    grams = []
+    for word in _WORD.findall(str(text).lower()):
+        padded = f" {word} "
+        grams.extend(padded[i:i + NGRAM] for i in range(max(1, len(padded) - NGRAM + 1)))
+    return grams
+
+def record_text(record):
+    size = record['size'] if record['size'].upper() not in ('N/A', 'STANDARD') else ''
+    return f"{record['description']} {size} {record['subcategory']} {record['category']}"
+
+class CodeMatcher:
+    """Character n-gram TF-IDF index over the priced rows of a PricingCatalog."""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.records = catalog.priced()
+        counts = [Counter(char_ngrams(record_text(record))) for record in self.records]
+        document_frequency = Counter(gram for count in counts for gram in count)
+        self.vocabulary = {gram: index for index, gram in enumerate(sorted(document_frequency))}
+        total = len(self.records)
+        self.idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+        rows = [self._weights(count) for count in counts]
+        if np is not None:
+            self.matrix = self._dense(rows)
+        else:
+            self.rows = rows
+
+    def _weights(self, count):
+        """L2-normalised sublinear tf-idf weights of known n-grams."""
+        weights = {gram: (1 + math.log(n)) * self.idf[gram] for gram, n in count.items() if gram in self.idf}
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        return {gram: w / norm for gram, w in weights.items()} if norm else {}
+
+    def _dense(self, rows):
+        matrix = np.zeros((len(rows), len(self.vocabulary)), dtype=np.float32)
+        for i, weights in enumerate(rows):
+            if weights:
+                columns = [self.vocabulary[gram] for gram in weights]
+                matrix[i, columns] = list(weights.values())
+        return matrix
+
+    def scores(self, texts):
+        """Cosine similarity of each text to each catalog row (a len(texts) x rows array or list of lists)."""
+        queries = [self._weights(Counter(char_ngrams(text))) for text in texts]
+        if np is not None:
+            return self._dense(queries) @ self.matrix.T
+        return [[sum(w * row.get(gram, 0.0) for gram, w in query.items()) for row in self.rows] for query in queries]
+
+    def match(self, texts, k=TOP_K):
+        """Return, for each text, up to k (record, score) pairs, best first."""
+        if not texts or not self.records:
+            return [[] for _ in texts]
+        scores = self.scores(texts)
+        k = min(k, len(self.records))
+        results = []
+        if np is not None:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for row, candidates in zip(scores, top):
+                ranked = sorted(candidates, key=lambda i: -row[i])
+                results.append([(self.records[i], float(row[i])) for i in ranked if row[i] > 0])
+        else:
+            for row in scores:
+                ranked = sorted(range(len(row)), key=lambda i: -row[i])[:k]
+                results.append([(self.records[i], row[i]) for i in ranked if row[i] > 0])
+        return results
+
+def get_matcher(csv_path=PRICING_CSV):
+    """Return the matcher for the process-wide catalog, rebuilding it when the catalog is reloaded."""
+    catalog = get_catalog(csv_path)
+    with _lock:
+        cached = _matchers.get(id(catalog))
+        if cached is None or cached[0] is not catalog:
+            _matchers.clear()
+            cached = (catalog, CodeMatcher(catalog))
+            _matchers[id(catalog)] = cached
+        return cached[1]
+
+def quoted_rate(unit_cost):
+    """Return (rate, unit or '') from a model unit cost like '$3,300 per UNIT', or None."""
+    m = _RATE.search(str(unit_cost or ''))
+    if not m:
+        return None
+    return float(m.group('rate').replace(',', '')), (m.group('unit') or '').upper()
+
+def _resolve_band(record, room, catalog, areas):
+    """The record itself, the band of its family a measured area selects, or None when no area decides the band."""
+    from pricing_engine import measured_size
+
+    if catalog.band_family(record['item_code']) is None:
+        return record
+    size = measured_size(record, room, areas)
+    return catalog.select_band(record['item_code'], size) if size is not None else None
+
+def link_item_codes(items, matcher=None, k=TOP_K, areas=None):
+    """Link rows that have no ItemCode to catalog rows; returns (linked, suggested).
+
+    Candidates must fit the row's quantity unit; banded candidates are
+    replaced by the band areas (polycam_parser.load_floor_areas) select, or
+    dropped without one. If the row quotes a rate, the best candidate scoring
+    at least MIN_PRICED_SCORE whose labor or labor + material equals it
+    becomes its ItemCode. Otherwise a best candidate scoring MIN_SCORE is only
+    recorded as SuggestedCode; the model's total stands.
+    """
+    from pricing_engine import MINIMUM_ITEM, parse_quantity, units_compatible
+
+    uncoded = [item for item in items
+               if not str(item.get('ItemCode', '') or '').strip() and item.get('ItemName') and item.get('ItemName') != MINIMUM_ITEM]
+    if not uncoded:
+        return 0, 0
+    matcher = matcher or get_matcher()
+    matches = matcher.match([f"{item['ItemName']} {item.get('Description', '')[:120]}" for item in uncoded], k)
+    linked = suggested = 0
+    for item, candidates in zip(uncoded, matches):
+        quantity = parse_quantity(item.get('Quantity', ''))
+        unit = quantity[1] if quantity else ''
+        resolved = []
+        for record, score in candidates:
+            record = _resolve_band(record, item.get('Room', ''), matcher.catalog, areas)
+            if record is not None and units_compatible(unit, record['unit']):
+                resolved.append((record, score))
+        rate = quoted_rate(item.get('UnitCost', ''))
+        if rate:
+            chosen = next((record for record, score in resolved if score >= MIN_PRICED_SCORE and any(
+                value is not None and abs(float(value) - rate[0]) < 0.01
+                for value in (record['labor'], record['unit_cost']))), None)
+            if chosen:
+                item['ItemCode'] = chosen['item_code']
+                linked += 1
+        elif resolved and resolved[0][1] >= MIN_SCORE:
+            item['SuggestedCode'] = resolved[0][0]['item_code']
+            suggested += 1
+    return linked, suggested
+
+def main():
+    parser = argparse.ArgumentParser(description="Match scope text to master pricing sheet Item Codes")
+    parser.add_argument("texts", nargs='+', help="Scope item text to match")
+    parser.add_argument("--top", type=int, default=3, help="Codes to show per text")
+    parser.add_argument("--pricing_csv", default=PRICING_CSV, help="Master pricing CSV")
+    args = parser.parse_args()
+
+    matcher = get_matcher(args.pricing_csv)
+    print(f"[INFO] {len(matcher.records)} priced rows, {len(matcher.vocabulary)} n-grams "
+          f"({'numpy' if np is not None else 'pure Python'} scoring)")
+    for text, candidates in zip(args.texts, matcher.match(args.texts, args.top)):
+        print(f"{text}:")
+        for record, score in candidates:
+            print(f"  {record['item_code']:<10} {score:.3f}  {record['description']} [{record['size']}] "
+                  f"${record['unit_cost']} per {record['unit']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+pricing_router.py
+
+Route each chunk group to the part of the master pricing sheet it needs.
+
+A group's transcript text is tagged with rooms (the section keywords used by
+chunk_pdf_by_section) and trades; the tags select pricing rows from
+master_pricing_data.csv by Category or Subcategory, plus a small core that
+every estimate may need (general conditions, permits, cleanup, disposal...).
+The selected rows replace the full pricing sheet in that group's prompt.
+
+If a group matches no trade, or the CSV cannot be read, the full sheet is
+sent (run_chunked_estimation.py --full_pricing forces this for every group).
+"""
+import re
+
+from pricing_catalog import PRICING_COLUMNS
+
+# Room headings (as in chunk_pdf_by_section.extract_text_by_section)
+ROOM_KEYWORDS = [
+    'kitchen', 'bathroom', 'bedroom', 'living room', 'dining room', 'foyer', 'hallway', 'closet',
+    'laundry', 'office', 'study', 'entry', 'balcony', 'terrace', 'garage', 'basement', 'attic',
+    'powder room', 'pantry', 'utility', 'mechanical', 'storage', 'stairs', 'corridor', 'den', 'family room',
+    'primary', 'secondary', 'guest', 'suite', 'media room', 'mudroom', 'playroom', 'sunroom', 'studio',
+    'library', 'wine cellar', 'gym', 'sauna', 'spa', 'porch', 'deck', 'patio', 'roof', 'mezzanine', 'lobby'
+]
+
+# Pricing labels (Category or Subcategory values) selected by each room
+ROOM_LABELS = {
+    'kitchen': ['Kitchen'],
+    'pantry': ['Kitchen'],
+    'bathroom': ['Bathroom'],
+    'powder room': ['Bathroom'],
+    'closet': ['Closets'],
+    'laundry': ['Appliances'],
+    'mechanical': ['Mechanical', 'HVAC'],
+    'stairs': ['Stairs'],
+}
+
+# Transcript keywords for each pricing label; matched at word starts, case-insensitively
+LABEL_KEYWORDS = {
+    'Demolition': ['demo', 'demolish', 'tear out', 'tear-out', 'rip out', 'gut', 'remove', 'removal'],
+    'Plumbing': ['plumb', 'sink', 'toilet', 'faucet', 'shower', 'tub', 'drain', 'pipe', 'piping', 'water heater',
+                 'valve', 'washer', 'dryer', 'radiator', 'boiler'],
+    'Electrical': ['electric', 'outlet', 'gfi', 'switch', 'dimmer', 'light', 'fixture', 'recessed', 'pendant',
+                   'chandelier', 'sconce', 'panel', 'wiring', 'rewir', 'dedicated line', 'circuit', 'heated floor',
+                   'underfloor', 'radiant'],
+    'Tile': ['tile', 'tiling', 'grout', 'mosaic', 'backsplash'],
+    'Stone': ['stone', 'marble', 'granite', 'quartz', 'slab', 'countertop', 'saddle', 'sill', 'niche', 'bench'],
+    'Waterproofing': ['waterproof', 'membrane', 'shower pan'],
+    'Carpentry': ['carpent', 'framing', 'frame', 'drywall', 'sheetrock', 'door', 'trim', 'molding', 'moulding',
+                  'crown', 'baseboard', 'casing', 'window'],
+    'Finishes': ['floor', 'hardwood', 'herringbone', 'chevron', 'lvt', 'plank', 'paint', 'skim', 'plaster',
+                 'refinish', 'stain'],
+    'Kitchen': ['kitchen', 'cabinet', 'island', 'countertop', 'backsplash', 'pantry'],
+    'Kitchen Cabinets': ['cabinet'],
+    'Appliances': ['appliance', 'fridge', 'refrigerator', 'range', 'oven', 'stove', 'cooktop', 'dishwasher',
+                   'microwave', 'hood', 'washer', 'dryer', 'steam'],
+    'Insulation': ['insulat', 'soundproof', 'sound proof', 'acoustic', 'spray foam'],
+    'Metal Framing': ['metal stud', 'metal framing', 'steel stud', 'soffit', 'dropped ceiling', 'drop ceiling'],
+    'Bathroom': ['bath', 'shower', 'toilet', 'vanity', 'powder room', 'tub'],
+    'Closets': ['closet', 'wardrobe', 'shelves', 'shelving'],
+    'Stairs': ['stair', 'tread', 'handrail', 'banister'],
+    'Millwork': ['millwork', 'built-in', 'built in', 'bookcase', 'radiator cover'],
+    'HVAC': ['hvac', 'air condition', 'a/c', 'ptac', 'split unit', 'mini split', 'mini-split', 'compressor',
+             'duct', 'radiator', 'crane', 'rigging'],
+    'Mechanical': ['sprinkler'],
+    'Glazing': ['glass', 'glazing', 'enclosure', 'shower door'],
+    'Accessories': ['accessor', 'towel bar', 'grab bar', 'robe hook', 'toilet paper holder', 'mirror'],
+    'Ceiling': ['ceiling'],
+    'Windows': ['window'],
+    'Doors': ['door'],
+}
+
+# Always included: pricing every estimate may need whatever the transcript covers
+CORE_CATEGORIES = {'General Conditions', 'Living in arrangement', 'Cleaning'}
+CORE_ROWS = {('Demolition', 'General'), ('Miscellaneous', 'Administrative'),
+             ('Miscellaneous', 'Cleanup'), ('Miscellaneous', 'Disposal')}
+
+def _keyword_pattern(keywords, whole_word=False):
+    body = '|'.join(re.escape(k) for k in keywords)
+    # Rooms are whole words ('den' is not 'dense'); trade keywords are stems ('plumb' -> 'plumbing')
+    return re.compile(rf'\b(?:{body})s?\b' if whole_word else rf'\b(?:{body})', re.IGNORECASE)
+
+_ROOM_PATTERNS = {room: _keyword_pattern([room], whole_word=True) for room in ROOM_KEYWORDS}
+_LABEL_PATTERNS = {label: _keyword_pattern(words) for label, words in LABEL_KEYWORDS.items()}
+
+def tag_text(text):
+    """Return (rooms, labels) mentioned in text."""
+    rooms = sorted(room for room, pattern in _ROOM_PATTERNS.items() if pattern.search(text))
+    labels = {label for label, pattern in _LABEL_PATTERNS.items() if pattern.search(text)}
+    for room in rooms:
+        labels.update(ROOM_LABELS.get(room, ()))
+    return rooms, sorted(labels)
+
+def is_core_row(row):
+    return row['Category'] in CORE_CATEGORIES or (row['Category'], row['Subcategory']) in CORE_ROWS
+
+def select_rows(rows, labels):
+    """Rows whose Category, or specific (non-General) Subcategory, is one of labels, plus the core."""
+    labels = set(labels)
+    return [
+        row for row in rows
+        if is_core_row(row) or row['Category'] in labels
+        or (row['Subcategory'] != 'General' and row['Subcategory'] in labels)
+    ]
+
+def format_pricing_rows(rows, labels):
+    """Render selected rows as the pricing sheet text for a prompt."""
+    lines = [
+        f"Master pricing sheet rows for: {', '.join(labels)} (plus general items). "
+        f"Use only these items and prices.",
+        '| ' + ' | '.join(PRICING_COLUMNS) + ' |',
+        '| ' + ' | '.join(['---'] * len(PRICING_COLUMNS)) + ' |',
+    ]
+    for row in rows:
+        lines.append('| ' + ' | '.join(row[column].strip() for column in PRICING_COLUMNS) + ' |')
+    return "\n".join(lines) + "\n"
+
+def route_pricing(text, rows):
+    """Return the routing decision for a group's transcript text.
+
+    A dict with 'rooms', 'labels', 'rows' (the selected rows) and 'full'
+    (True when nothing trade-specific matched and the full sheet should go).
+    """
+    rooms, labels = tag_text(text)
+    selected = select_rows(rows, labels)
+    full = not labels or len(selected) == len(rows)
+    return {'rooms': rooms, 'labels': labels, 'rows': selected, 'full': full}
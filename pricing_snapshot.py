@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+pricing_snapshot.py
+
+Compiled, versioned pricing catalog for fast startup.
+
+`build` validates a catalog CSV in master_pricing_data.csv layout and writes
+it as one binary snapshot. The build stops on validation errors: missing or
+duplicate codes, negative prices, impossible margins and overlapping size
+bands. Rows repeating a description, size and category at another price and
+$0 / QUOTE placeholder rows are reported for the sheet's owner to fix.
+
+The CSV stays the hand-maintained source: converting a quarter's pricing PDF
+is not automated, since parsing the sheet's extracted text did not reproduce
+the current catalog.
+
+Snapshot layout (little-endian):
+  header   magic, format, column count, row count, string count, blob size,
+           sheet version ('Q1-2025'), effective date, build time, SHA-256 of
+           everything after the header
+  offsets  string count + 1 uint32 offsets into the blob
+  cells    row count x column count uint32 string ids (ids 0.. are the
+           column names)
+  blob     UTF-8 strings, each stored once
+
+The file is read through mmap, so the OS page cache holds one copy for all
+gunicorn/uvicorn workers, and loading is a header check plus decoding a few
+hundred short strings. pricing_catalog.get_catalog() loads PRICING_SNAPSHOT
+in place of the CSV when it is present and not older than the CSV.
+
+Usage:
+  PRICING_VERSION=Q1-2025 python pricing_snapshot.py build --source master_pricing_data.csv
+  python pricing_snapshot.py info
+"""
+import argparse
+import hashlib
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from datetime import date, datetime
+
+from pricing_catalog import PRICING_COLUMNS, PRICING_CSV, PricingCatalog, parse_price, read_pricing_rows
+
+PRICING_SNAPSHOT = os.environ.get('ESTIMATOR_PRICING_SNAPSHOT', 'pricing_snapshot.bin')
+MAGIC = b'PRCSNAP\x00'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8sHHIII16s10s20s32sxx')
+UNVERSIONED = 'unversioned'
+
+# Non-numeric price cells the sheet uses on purpose
+PRICE_WORDS = {'N/A', 'TBD', 'QUOTE', ''}
+KNOWN_UNITS = {'SF', 'LF', 'EA', 'UNIT', 'LS', 'QUOTE', 'N/A'}
+
+_QUARTER = re.compile(r'Q\s*(?P<quarter>[1-4])\s*-\s*(?P<year>\d{4})')
+
+def is_placeholder(row):
+    """A $0 or QUOTE row with nothing priced and no size or unit: a sheet note, not an item ('ADD CAT 6 $0')."""
+    prices = [parse_price(row[column]) for column in ('Labor', 'Material')]
+    if any(price for price in prices if price is not None):
+        return False
+    placeholder = any(price == 0 for price in prices if price is not None) or \
+        'QUOTE' in (row['Labor'].strip().upper(), row['Material'].strip().upper())
+    return placeholder and row['Size/Type'].strip().upper() == 'N/A' and row['Unit'].strip().upper() in ('N/A', 'QUOTE')
+
+def validate_catalog(rows):
+    """Return (errors, warnings) for catalog rows; errors stop a snapshot build."""
+    errors, warnings = [], []
+    seen = set()
+    prices = {}
+    for number, row in enumerate(rows, 1):
+        code = row['Item Code'].strip()
+        where = code or f"row {number}"
+        if not code:
+            errors.append(f"row {number}: missing Item Code")
+        elif code.upper() in seen:
+            errors.append(f"{code}: duplicate Item Code")
+        seen.add(code.upper())
+        if not row['Description'].strip():
+            errors.append(f"{where}: missing Description")
+        if not row['Category'].strip():
+            warnings.append(f"{where}: missing Category")
+        if row['Unit'].strip().upper() not in KNOWN_UNITS:
+            warnings.append(f"{where}: unknown Unit '{row['Unit']}'")
+        for column in ('Labor', 'Material', 'Minimum'):
+            value = row[column].strip()
+            price = parse_price(value)
+            if price is None and value.upper() not in PRICE_WORDS:
+                warnings.append(f"{where}: {column} '{value}' is not a price (treated as unpriced)")
+            elif price is not None and price < 0:
+                errors.append(f"{where}: negative {column} {value}")
+        if is_placeholder(row):
+            warnings.append(f"{where}: '{row['Description']}' is a $0 / QUOTE placeholder without a size or unit")
+        key = tuple(row[column].strip().lower() for column in ('Description', 'Size/Type', 'Category'))
+        price = tuple(row[column].strip() for column in ('Unit', 'Labor', 'Material'))
+        if key in prices and prices[key][1] != price:
+            warnings.append(f"{where} repeats {prices[key][0]} ('{row['Description']}', {row['Size/Type']}, "
+                            f"{row['Category']}) at another price")
+        prices.setdefault(key, (where, price))
+        margin = parse_price(row['Margin'])
+        if margin is None:
+            warnings.append(f"{where}: no Margin (the default applies)")
+        elif not 0 <= margin < 1:
+            errors.append(f"{where}: Margin {row['Margin']} is not a fraction below 1")
+
+    catalog = PricingCatalog(rows)
+    for family in catalog.band_families.values():
+        for lower, upper in zip(family, family[1:]):
+            if upper['band'][0] < lower['band'][1]:
+                errors.append(f"{lower['item_code']} '{lower['size']}' overlaps {upper['item_code']} '{upper['size']}'")
+            elif upper['band'][0] > lower['band'][1] + 1:
+                warnings.append(f"{lower['item_code']} '{lower['size']}' and {upper['item_code']} '{upper['size']}' "
+                                f"leave a gap")
+
+    return errors, warnings
+
+def sheet_version(path):
+    """('Q1-2025', '2025-01-01') from a file name or version string, or (None, None)."""
+    m = _QUARTER.search(os.path.basename(path))
+    if not m:
+        return None, None
+    quarter, year = int(m.group('quarter')), int(m.group('year'))
+    return f"Q{quarter}-{year}", date(year, 3 * quarter - 2, 1).isoformat()
+
+def write_snapshot(rows, path, version, effective_date, built_at=None):
+    """Write rows as a snapshot file (atomically: readers never see a partial file)."""
+    strings, ids = [], {}
+    def intern(text):
+        if text not in ids:
+            ids[text] = len(strings)
+            strings.append(text)
+        return ids[text]
+
+    for column in PRICING_COLUMNS:
+        intern(column)
+    cells = [intern(row[column]) for row in rows for column in PRICING_COLUMNS]
+    encoded = [text.encode('utf-8') for text in strings]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    body = (struct.pack(f'<{len(offsets)}I', *offsets) + struct.pack(f'<{len(cells)}I', *cells) + b''.join(encoded))
+    built_at = built_at or datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(PRICING_COLUMNS), len(rows), len(strings), offsets[-1],
+                         version.encode('utf-8')[:16], effective_date.encode('ascii')[:10],
+                         built_at.encode('ascii')[:20], hashlib.sha256(body).digest())
+    temp_path = f"{path}.tmp{os.getpid()}"
+    with open(temp_path, 'wb') as f:
+        f.write(header + body)
+    os.replace(temp_path, path)
+    return HEADER.size + len(body)
+
+class PricingSnapshot:
+    """Read-only, memory-mapped view of a snapshot file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{self.path} is not a pricing snapshot (too short)")
+        (magic, file_format, columns, self.row_count, string_count, blob_size,
+         version, effective, built, self.digest) = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a pricing snapshot")
+        if file_format != FORMAT_VERSION:
+            raise ValueError(f"{self.path} has snapshot format {file_format}, expected {FORMAT_VERSION}")
+        self.version = version.rstrip(b'\0').decode('utf-8')
+        self.effective_date = effective.rstrip(b'\0').decode('ascii')
+        self.built_at = built.rstrip(b'\0').decode('ascii')
+        self.column_count = columns
+        cells_at = HEADER.size + 4 * (string_count + 1)
+        self._blob_at = cells_at + 4 * self.row_count * columns
+        if len(self._map) != self._blob_at + blob_size:
+            raise ValueError(f"{self.path} is truncated or padded ({len(self._map)} bytes)")
+        self._offsets = struct.unpack_from(f'<{string_count + 1}I', self._map, HEADER.size)
+        self._cells = struct.unpack_from(f'<{self.row_count * columns}I', self._map, cells_at)
+        self._strings = {}
+        self.columns = [self.string(index) for index in range(columns)]
+        if self.columns != PRICING_COLUMNS:
+            raise ValueError(f"{self.path} has columns {self.columns}, expected {PRICING_COLUMNS}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.row_count
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def verify(self):
+        """True if the body matches the header checksum."""
+        return hashlib.sha256(self._map[HEADER.size:]).digest() == self.digest
+
+    def string(self, index):
+        text = self._strings.get(index)
+        if text is None:
+            start = self._blob_at + self._offsets[index]
+            text = self._map[start:self._blob_at + self._offsets[index + 1]].decode('utf-8')
+            self._strings[index] = text
+        return text
+
+    def row(self, index):
+        start = index * self.column_count
+        return {column: self.string(self._cells[start + position]) for position, column in enumerate(self.columns)}
+
+    def rows(self):
+        """All rows as PRICING_COLUMNS dicts (every string decoded once)."""
+        blob = self._map[self._blob_at:self._blob_at + self._offsets[-1]]
+        strings = [blob[start:end].decode('utf-8') for start, end in zip(self._offsets, self._offsets[1:])]
+        columns, width = self.columns, self.column_count
+        return [dict(zip(columns, [strings[cell] for cell in self._cells[start:start + width]]))
+                for start in range(0, self.row_count * width, width)]
+
+def load_snapshot_catalog(path=PRICING_SNAPSHOT, verify=True):
+    """Load a snapshot file into a PricingCatalog carrying its version and effective date."""
+    with PricingSnapshot(path) as snapshot:
+        if verify and not snapshot.verify():
+            raise ValueError(f"{path} failed its checksum")
+        return PricingCatalog(snapshot.rows(), path, version=snapshot.version,
+                              effective_date=snapshot.effective_date)
+
+def previous_version(path):
+    """Version in the header of an existing snapshot at path, or None."""
+    try:
+        with PricingSnapshot(path) as snapshot:
+            return snapshot.version or None
+    except (OSError, ValueError, struct.error):
+        return None
+
+def build(args):
+    source = args.source
+    if not source.lower().endswith('.csv'):
+        print(f"[ERROR] {source} is not a catalog CSV; convert the pricing sheet into master_pricing_data.csv first")
+        return 1
+    rows = read_pricing_rows(source)
+
+    detected = sheet_version(source)[0]
+    if args.version and detected and args.version != detected:
+        print(f"[WARNING] {source} reads as {detected}; building it as {args.version}")
+    version = args.version or detected or previous_version(args.output)
+    if not version:
+        version = UNVERSIONED
+        print(f"[WARNING] Could not tell which quarter {source} is; building it as '{version}' "
+              f"(pass --version or set PRICING_VERSION, e.g. Q1-2025)")
+    elif not args.version and not detected:
+        print(f"[WARNING] No --version or PRICING_VERSION; keeping {args.output}'s version {version}")
+    effective = args.effective or sheet_version(version)[1] or date.today().isoformat()
+
+    errors, warnings = validate_catalog(rows)
+    for warning in warnings:
+        print(f"[WARNING] {warning}")
+    for error in errors:
+        print(f"[ERROR] {error}")
+    if errors and not args.force:
+        print(f"[ERROR] {len(errors)} validation errors; snapshot not written (--force to write anyway)")
+        return 1
+
+    size = write_snapshot(rows, args.output, version, effective)
+    start = time.perf_counter()
+    catalog = load_snapshot_catalog(args.output)
+    elapsed = (time.perf_counter() - start) * 1000
+    if catalog.rows != rows:
+        print(f"[ERROR] {args.output} does not read back the rows it was built from")
+        return 1
+    print(f"[SUCCESS] {args.output}: {version} effective {effective}, {len(rows)} rows, {size:,} bytes "
+          f"(loads in {elapsed:.1f} ms)")
+    return 0
+
+def info(args):
+    start = time.perf_counter()
+    with PricingSnapshot(args.snapshot) as snapshot:
+        intact = snapshot.verify()
+        rows = snapshot.rows()
+        print(f"[INFO] {args.snapshot}: {snapshot.version} effective {snapshot.effective_date}, "
+              f"built {snapshot.built_at}, {len(rows)} rows, checksum {'ok' if intact else 'MISMATCH'}")
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"[INFO] Read in {elapsed:.1f} ms")
+    return 0 if intact else 1
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and inspect compiled master pricing snapshots")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Validate a catalog CSV and write its snapshot')
+    build_parser.add_argument('--source', default=PRICING_CSV, help='Catalog CSV in master_pricing_data.csv layout')
+    build_parser.add_argument('--output', default=PRICING_SNAPSHOT, help='Snapshot file to write')
+    build_parser.add_argument('--version', default=os.environ.get('PRICING_VERSION') or None,
+                              help="Sheet version, e.g. Q1-2025 (default: PRICING_VERSION, else from the file name, else the version of "
+                                   "the snapshot being replaced)")
+    build_parser.add_argument('--effective', help='Effective date YYYY-MM-DD (default: first day of the quarter)')
+    build_parser.add_argument('--force', action='store_true', help='Write the snapshot despite validation errors')
+
+    info_parser = subparsers.add_parser('info', help='Show a snapshot header and check its checksum')
+    info_parser.add_argument('snapshot', nargs='?', default=PRICING_SNAPSHOT)
+    args = parser.parse_args()
+
+    sys.exit(build(args) if args.command == 'build' else info(args))
+
+if __name__ == "__main__":
+    main()
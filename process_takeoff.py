@@ -3,77 +3,51 @@
 Process takeoff content and create chunks for estimation pipeline
 """
 import os
+import json
 import argparse
-import tiktoken
 
-def count_tokens(text, model="gpt-4o"):
-    """Count tokens using tiktoken"""
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except:
-        # Fallback: rough estimate (1 token ≈ 4 characters)
-        return len(text) // 4
+from chunk_store import write_chunk_store
+from group_planner import count_tokens
+from takeoff_parser import TAKEOFF_ESTIMATE_NAME, parse_structured_takeoff, read_takeoff
+from token_chunker import chunk_by_tokens
 
 def split_by_tokens(text, max_tokens=1500, overlap_tokens=150):
-    """Split text into chunks with overlap for better context"""
-    chunks = []
-    current_pos = 0
-    
-    while current_pos < len(text):
-        # Find the end position for this chunk
-        end_pos = min(current_pos + max_tokens * 4, len(text))  # Rough estimate
-        
-        # Try to find a good break point (sentence end, line break, etc.)
-        if end_pos < len(text):
-            # Look for sentence endings
-            for i in range(end_pos, max(current_pos, end_pos - 200), -1):
-                if text[i] in '.!?':
-                    end_pos = i + 1
-                    break
-            
-            # If no sentence ending, look for line breaks
-            if end_pos == min(current_pos + max_tokens * 4, len(text)):
-                for i in range(end_pos, max(current_pos, end_pos - 100), -1):
-                    if text[i] == '\n':
-                        end_pos = i + 1
-                        break
-        
-        # Extract the chunk
-        chunk = text[current_pos:end_pos].strip()
-        if chunk:
-            chunks.append(chunk)
-        
-        # Move to next position with overlap
-        if current_pos <= end_pos - (overlap_tokens * 4):
-            current_pos = end_pos
-        else:
-            current_pos = end_pos
-    
-    return chunks
+    """Split text into chunks of at most max_tokens tokens with overlap for better context"""
+    return chunk_by_tokens(text, max_tokens, overlap_tokens)
+
+def process_takeoff_file(input_file, output_dir, max_tokens, overlap_tokens=150, chunk_files=False, mode="structured"):
+    """Process takeoff file and create chunks
 
-def process_takeoff_file(input_file, output_dir, max_tokens):
-    """Process takeoff file and create chunks"""
+    In structured mode, lines stating a quantity that match one pricing row
+    are priced locally into takeoff_estimate.json; only the other lines are
+    chunked for the LLM.
+    """
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
     
-    # Read the takeoff file
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+    if mode == "structured":
+        estimate, unmatched, stats = parse_structured_takeoff(input_file)
+        with open(os.path.join(output_dir, TAKEOFF_ESTIMATE_NAME), 'w', encoding='utf-8') as f:
+            json.dump(dict(estimate, stats=stats), f, indent=2)
+        print(f"[INFO] Read {stats['lines']} takeoff lines ({stats['rows']} with a quantity) from {input_file}")
+        print(f"[INFO] Priced {stats['priced']} lines locally; {stats['unmatched']} lines left for the LLM")
+        content = '\n'.join(unmatched)
+    elif input_file.lower().endswith(('.csv', '.xlsx', '.xlsm')):
+        content = '\n'.join(line for _, line, _ in read_takeoff(input_file))
+    else:
+        # Read the takeoff file
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = f.read()
     
-    print(f"[INFO] Read {len(content)} characters from {input_file}")
+    if mode != "structured":
+        print(f"[INFO] Read {len(content)} characters from {input_file}")
     print(f"[INFO] Token count: {count_tokens(content)}")
     
-    # Split into chunks
-    chunks = split_by_tokens(content, max_tokens)
-    
-    # Save chunks
-    for i, chunk in enumerate(chunks):
-        chunk_file = os.path.join(output_dir, f'chunk_{i+1}.txt')
-        with open(chunk_file, 'w', encoding='utf-8') as f:
-            f.write(chunk)
+    # Split into chunks and index them
+    count = write_chunk_store(output_dir, [content],
+                              lambda pieces: split_by_tokens(''.join(pieces), max_tokens, overlap_tokens), chunk_files)
     
-    print(f"[INFO] Created {len(chunks)} chunks in {output_dir}")
+    print(f"[INFO] Created {count} chunks in {output_dir}")
     return True
 
 def main():
@@ -81,9 +55,13 @@ def main():
     parser.add_argument("input_file", help="Path to takeoff file")
     parser.add_argument("--output_dir", required=True, help="Output directory for chunks")
     parser.add_argument("--max_tokens", type=int, default=1500, help="Max tokens per chunk")
+    parser.add_argument("--overlap_tokens", type=int, default=150, help="Tokens each chunk repeats from the end of the previous one")
+    parser.add_argument("--chunk_files", action="store_true", help="Also write each chunk to chunk_N.txt (the index and transcript_text.txt are always written)")
+    parser.add_argument("--mode", choices=["structured", "text"], default="structured", help="structured: price lines with explicit quantities locally and chunk only the rest; text: chunk the whole takeoff for the LLM")
     args = parser.parse_args()
     
-    success = process_takeoff_file(args.input_file, args.output_dir, args.max_tokens)
+    success = process_takeoff_file(args.input_file, args.output_dir, args.max_tokens, args.overlap_tokens, args.chunk_files,
+                                   args.mode)
     
     if success:
         print(f"[SUCCESS] Takeoff processed successfully. Output in: {args.output_dir}")
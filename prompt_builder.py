@@ -0,0 +1,98 @@
+"""
+prompt_builder.py
+
+Prefix-stable layout for estimation prompts.
+
+OpenAI caches the longest previously seen prompt prefix (in 128-token steps
+past the first 1024 tokens), so everything that is identical across the
+groups of a run goes first, in order of how widely it is shared:
+
+  system guardrails -> estimation instructions -> markup cheatsheet / sample
+  scope tables -> master pricing sheet -> Polycam summary
+
+and only the chunk-specific part (per-group instruction + transcript text)
+is appended at the end.
+
+When a group's pricing is routed (pricing_router.py) its rows differ from
+other groups', so they leave the shared prefix and open the chunk-specific
+tail instead:
+
+  ... sample scope tables -> Polycam summary | routed pricing -> transcript
+
+Groups with no narrower match keep the full sheet in the prefix. Routed
+groups share a shorter cached prefix and pay full price for their pricing
+rows, while the full sheet is cached after the first group that sends it.
+run_chunked_estimation.py --full_pricing sends the sheet in the prefix to
+every group.
+"""
+import csv
+import os
+from pathlib import Path
+
+CHEATSHEET_CSV = "section_minimums_margins.csv"
+
+def csv_to_markdown_table(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        reader = list(csv.reader(f))
+        if not reader:
+            return ''
+        header = reader[0]
+        rows = reader[1:]
+        md = '| ' + ' | '.join(header) + ' |\n'
+        md += '| ' + ' | '.join(['---'] * len(header)) + ' |\n'
+        for row in rows:
+            md += '| ' + ' | '.join(row) + ' |\n'
+        return md
+
+def build_static_prefix(prompt, reference_sections, sample_scope=()):
+    """Build the shared part of the user message.
+
+    reference_sections is a list of (name, content) pairs such as the pricing
+    sheet and Polycam summary; they are emitted in the order given.
+    """
+    prefix = prompt
+
+    # Append section_minimums_margins.csv as markdown table to the prompt
+    if os.path.exists(CHEATSHEET_CSV):
+        md_table = csv_to_markdown_table(CHEATSHEET_CSV)
+        prefix += f"\n\nSection Markup and Minimums Cheatsheet ({CHEATSHEET_CSV}):\n" + md_table
+
+    # Append all sample scope CSVs as markdown tables to the prompt
+    for i, csv_path in enumerate(sample_scope, 1):
+        if not os.path.exists(csv_path):
+            raise FileNotFoundError(f"Sample scope file not found: {csv_path}")
+        md_table = csv_to_markdown_table(csv_path)
+        prefix += f"\n\nSample Scope Table {i} ({Path(csv_path).name}):\n" + md_table
+
+    prefix += "\n\n"
+    for name, content in reference_sections:
+        prefix += f"=== {name} ===\n{content}\n\n"
+    return prefix
+
+def build_chunk_suffix(chunk_text, chunk_name="", chunk_instruction="", pricing_section=None):
+    """Build the chunk-specific tail of the user message.
+
+    pricing_section is an optional (name, content) pair with the group's
+    routed pricing rows, placed ahead of the transcript.
+    """
+    header = f"[TRANSCRIPT CHUNK]{f' ({chunk_name})' if chunk_name else ''}"
+    suffix = f"{header}\n{chunk_text}\n"
+    if pricing_section:
+        name, content = pricing_section
+        suffix = f"=== {name} ===\n{content}\n\n" + suffix
+    if chunk_instruction:
+        suffix += f"\n{chunk_instruction.strip()}\n"
+    return suffix
+
+def build_messages(system_guardrails, static_prefix, chunk_suffix):
+    """Assemble chat messages with the static prefix ahead of the chunk text."""
+    return [
+        {
+            "role": "system",
+            "content": system_guardrails
+        },
+        {
+            "role": "user",
+            "content": static_prefix + chunk_suffix
+        }
+    ]
@@ -0,0 +1,202 @@
+"""
+rate_limiter.py
+
+Process-wide scheduler for OpenAI calls (estimation groups and GPT dedup).
+
+Before a call starts it waits for three things:
+  - a concurrency slot; the limit adapts AIMD-style: +1 per limit successes,
+    halved on every 429, between 1 and max_concurrency
+  - a request from the requests-per-minute token bucket
+  - its estimated tokens (prompt + max_tokens, as OpenAI counts them) from the
+    tokens-per-minute bucket
+
+429s are retried after the server's Retry-After (or jittered exponential
+backoff), and the whole scheduler pauses for that time so other workers do
+not pile onto the limit. Connection errors, timeouts and 5xx are retried with
+backoff without shrinking concurrency. Quota exhaustion is not retried.
+
+Environment:
+  ESTIMATOR_RPM           requests per minute (default 500)
+  ESTIMATOR_TPM           tokens per minute (default 450000)
+  ESTIMATOR_MAX_RETRIES   retries per call (default 6)
+"""
+import os
+import random
+import threading
+import time
+
+try:
+    import openai  # Optional; used to recognise connection errors
+except Exception:
+    openai = None
+
+DEFAULT_RPM = int(os.environ.get('ESTIMATOR_RPM', '500'))
+DEFAULT_TPM = int(os.environ.get('ESTIMATOR_TPM', '450000'))
+DEFAULT_MAX_RETRIES = int(os.environ.get('ESTIMATOR_MAX_RETRIES', '6'))
+
+class TokenBucket:
+    """Bucket holding up to per_minute units, refilled continuously."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (0 if it is available now)."""
+        self._refill(now)
+        # A request larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+class RateLimitScheduler:
+    """Gate, pace and retry API calls under RPM/TPM limits with adaptive concurrency."""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_concurrency=4, max_retries=DEFAULT_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = float(self.max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {'calls': 0, 'rate_limited': 0, 'retries': 0, 'failed': 0, 'wait_seconds': 0.0}
+
+    def set_max_concurrency(self, max_concurrency):
+        with self._cond:
+            self.max_concurrency = max(1, max_concurrency)
+            if self._stats['rate_limited']:
+                self.limit = min(self.limit, float(self.max_concurrency))
+            else:
+                self.limit = float(self.max_concurrency)
+            self._cond.notify_all()
+
+    def _acquire(self, estimated_tokens):
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                wait = max(
+                    self.paused_until - now,
+                    self.requests.wait_time(1, now),
+                    self.tokens.wait_time(estimated_tokens, now),
+                )
+                if self.in_flight < int(self.limit) and wait <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(estimated_tokens)
+                    self.in_flight += 1
+                    self._stats['wait_seconds'] += now - started
+                    return
+                self._cond.wait(timeout=wait if wait > 0 else None)
+
+    def _release(self, rate_limited=False, pause=0.0):
+        with self._cond:
+            self.in_flight -= 1
+            if rate_limited:
+                self.limit = max(1.0, self.limit / 2)
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def _backoff(self, attempt):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(delay / 2, delay)  # jitter spreads out retries from parallel workers
+
+    def call(self, fn, estimated_tokens=0, label=None):
+        """Run fn() under the limits, retrying rate limits and transient errors."""
+        label = label or 'request'
+        for attempt in range(self.max_retries + 1):
+            self._acquire(estimated_tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None or attempt == self.max_retries:
+                    self._release()
+                    with self._cond:
+                        self._stats['failed'] += 1
+                    raise
+                if kind == 'rate_limit':
+                    delay = retry_after_seconds(e) or self._backoff(attempt)
+                    self._release(rate_limited=True, pause=delay)
+                    with self._cond:
+                        self._stats['rate_limited'] += 1
+                        self._stats['retries'] += 1
+                    print(f"[WARNING] Rate limited on {label}; retrying in {delay:.1f}s "
+                          f"(attempt {attempt + 2}/{self.max_retries + 1}, concurrency {int(self.limit)})")
+                else:
+                    delay = self._backoff(attempt)
+                    self._release()
+                    with self._cond:
+                        self._stats['retries'] += 1
+                    print(f"[WARNING] {type(e).__name__} on {label}; retrying in {delay:.1f}s "
+                          f"(attempt {attempt + 2}/{self.max_retries + 1})")
+                time.sleep(delay)
+                continue
+            self._release()
+            with self._cond:
+                self._stats['calls'] += 1
+            return result
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats, concurrency=int(self.limit))
+        stats['wait_seconds'] = round(stats['wait_seconds'], 2)
+        return stats
+
+def classify_error(e):
+    """Return 'rate_limit', 'transient' or None (not retryable) for an API exception."""
+    status = getattr(e, 'status_code', None)
+    if status == 429:
+        # An exhausted quota will not recover by waiting
+        if getattr(e, 'code', None) == 'insufficient_quota':
+            return None
+        return 'rate_limit'
+    if status is not None and status >= 500:
+        return 'transient'
+    if openai is not None and isinstance(e, (openai.APIConnectionError, openai.APITimeoutError)):
+        return 'transient'
+    return None
+
+def retry_after_seconds(e):
+    """Return the Retry-After delay from an API error's response headers, if any."""
+    response = getattr(e, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(max_concurrency=None):
+    """Return the process-wide scheduler, updating its concurrency ceiling if given."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler(max_concurrency=max_concurrency or 4)
+        elif max_concurrency is not None:
+            _scheduler.set_max_concurrency(max_concurrency)
+        return _scheduler
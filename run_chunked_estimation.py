@@ -1,15 +1,15 @@
 import argparse
+import json
 import os
 import subprocess
 import shlex
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-try:
-    import tiktoken  # Optional; used for more accurate token counting
-    _HAS_TIKTOKEN = True
-except Exception:
-    tiktoken = None
-    _HAS_TIKTOKEN = False
+from chunk_store import load_chunks
+from pdf_extraction import PDF_BACKENDS
+from group_planner import GROUP_SEPARATOR, count_tokens, plan_groups, token_counting_is_exact, write_plan
 
 def run_cmd_capture(cmd, env=None):
     """Run command and capture output."""
@@ -27,61 +27,472 @@ def unique_dir(transcript, polycam, base_dir):
     hash_suffix = hashlib.md5(combined.encode()).hexdigest()[:8]
     return os.path.join(base_dir, f'run_{ts}_{hash_suffix}')
 
-def count_tokens(text, model="gpt-4o"):
-    """Count tokens in text using tiktoken."""
-    if _HAS_TIKTOKEN:
+# Define process/legal/insurance keywords
+PROCESS_KEYWORDS = [
+    'permit', 'insurance', 'approval', 'board', 'legal', 'liability', 'contract', 'agreement',
+    'license', 'licenses', 'documentation', 'preconstruction', 'postconstruction', 'dob', 'city',
+    'compliance', 'consult', 'consultant', 'architect', 'engineer', 'approval', 'risk', 'deposit',
+    'professional', 'lawyer', 'attorney', 'financial', 'scope of work', 'operation agreement',
+    'building rules', 'hoa', 'co-op', 'condo', 'resident', 'tenant', 'submit', 'review', 'insurance',
+    'liabilities', 'legal advice', 'financial advice', 'approval process', 'board approval', 'insurance certificate'
+]
+
+REFUSAL_PHRASES = [
+    "unable to fulfill this request",
+    "cannot fulfill this request",
+    "not able to fulfill this request",
+    "unable to provide",
+    "cannot provide",
+    "not able to provide",
+    "consulting the transcript",
+    "consult a professional",
+    "liabilities",
+    "legal advice",
+    "financial advice",
+    "I am an AI language model",
+    "I cannot",
+    "I'm unable",
+    "I'm not able",
+    "I do not have the ability",
+    "I am not able"
+]
+
+PROCESS_INSTRUCTION = "\n**NOTE: This chunk is mostly about process, insurance, or legal topics. IGNORE those topics completely. Focus only on any physical renovation work, scope items, or plausible tasks you can infer, even if only hinted at. NEVER refuse.**\n"
+FORCEFUL_INSTRUCTION = "\n**MANDATORY: You must NOT refuse, disclaim, or say you cannot provide an estimate. If the chunk is ambiguous, speculative, or process-focused, MAKE UP plausible scope items and proceed.**\n"
+
+def is_process_chunk(text):
+    text_l = text.lower()
+    count = sum(1 for k in PROCESS_KEYWORDS if k in text_l)
+    return count >= 3 or (count > 0 and len(text_l.split()) < 200)  # flag if many keywords or short and process-heavy
+
+def is_refusal(text):
+    return any(phrase in text.lower() for phrase in REFUSAL_PHRASES)
+
+def make_subprocess_estimator(args, polycam_input, prompt_instructions, usage_log):
+    """Return a callable that runs send_files_to_chatgpt_text.py as a subprocess for one group."""
+    # Set API key as environment variable to avoid command line truncation
+    env = os.environ.copy()
+    env['OPENAI_API_KEY'] = args.api_key
+
+    def estimate(group_file, chunk_instruction, label, retry=False, on_delta=None, pricing_file=None, transcript_text=None):
+        # Subprocess calls are not streamed and read group_file; on_delta and transcript_text keep the signature uniform
+        # Properly quote all file arguments and prompt for shell
+        cmd = [
+            "python3", "send_files_to_chatgpt_text.py",
+            "--file1", shlex.quote(str(args.master_pricing)),
+            "--file2", shlex.quote(str(polycam_input)),  # Parsed Polycam summary (or raw PDF)
+            "--file3", shlex.quote(group_file),  # Group transcript text goes last
+            "--prompt", shlex.quote(prompt_instructions),
+            "--usage_log", shlex.quote(usage_log),
+            "--label", shlex.quote(label)
+        ]
+        if chunk_instruction:
+            cmd.extend(["--chunk_instruction", shlex.quote(chunk_instruction)])
+        if pricing_file:
+            cmd.extend(["--pricing_subset", shlex.quote(str(pricing_file))])
+        if retry:
+            cmd.extend(["--api_key", shlex.quote(args.api_key)])
+        if args.sample_scope:
+            cmd.extend(["--sample_scope", shlex.quote(args.sample_scope)])
+        cmd_str = ' '.join(cmd)
+        print(f"[INFO] {'Retrying' if retry else 'Running'} estimation command for {label}")
+        return run_cmd_capture(cmd_str, env=env)
+
+    return estimate
+
+def make_inprocess_estimator(args, polycam_input, prompt_instructions, usage_log, client):
+    """Return a callable that sends one group through a shared in-process OpenAI client."""
+    from send_files_to_chatgpt_text import send_files_to_chatgpt
+
+    sample_scope = [args.sample_scope] if args.sample_scope else []
+
+    def estimate(group_file, chunk_instruction, label, retry=False, on_delta=None, pricing_file=None, transcript_text=None):
         try:
-            encoding = tiktoken.encoding_for_model(model)
-            return len(encoding.encode(text))
-        except Exception:
-            pass
-    # Fallback: rough estimate (1 token ≈ 4 characters)
-    return len(text) // 4
-
-def concatenate_chunks_to_tokens(chunk_files, max_tokens, prompt_instructions):
-    """Concatenate chunks until max_tokens is reached, then create a new group."""
+            content = send_files_to_chatgpt(
+                str(args.master_pricing), str(polycam_input), group_file, prompt_instructions,
+                sample_scope=sample_scope, client=client,
+                chunk_instruction=chunk_instruction, usage_log=usage_log, label=label, on_delta=on_delta,
+                file3_text=transcript_text,
+                pricing_subset=str(pricing_file) if pricing_file else None
+            )
+        except (FileNotFoundError, ValueError):
+            raise
+        except Exception as e:
+            # Retries are exhausted; fail the group rather than saving the error as its estimate
+            raise RuntimeError(f"API call failed: {e}") from e
+        return content if content is not None else "[ERROR] No response received"
+
+    return estimate
+
+def write_group_file(i, chunk_group, run_dir):
+    """Concatenate a group's chunk texts into transcript_groups/group_{i}.txt and return (path, text)."""
+    transcript_text = GROUP_SEPARATOR.join(chunk_group)
+    groups_dir = os.path.join(run_dir, 'transcript_groups')
+    os.makedirs(groups_dir, exist_ok=True)
+    group_file = os.path.join(groups_dir, f'group_{i}.txt')
+    with open(group_file, 'w', encoding='utf-8') as f:
+        f.write(transcript_text)
+    return group_file, transcript_text
+
+def process_group(i, chunk_group, total_groups, run_dir, estimate, partial=None, pricing_file=None):
+    """Run the estimate (with one anti-refusal retry) for a group and write estimate_output_chunk_{i}.txt.
+
+    With partial (a stream_parser.PartialResults) the response is streamed and
+    its items are handed to aggregation while the completion is generated.
+    pricing_file replaces the master pricing sheet and is sent after the
+    shared prompt prefix (see route_group_pricing).
+    """
+    out_txt = os.path.join(run_dir, f'estimate_output_chunk_{i}.txt')
+    print(f"[INFO] Processing optimized group {i}/{total_groups} with {len(chunk_group)} chunks")
+
+    group_file, transcript_text = write_group_file(i, chunk_group, run_dir)
+
+    # Preprocess chunk for process/legal/insurance content
+    if is_process_chunk(transcript_text):
+        print(f"[INFO] Group {i} flagged as process/legal heavy. Adding special instruction to prompt.")
+        extra_instruction = PROCESS_INSTRUCTION
+    else:
+        extra_instruction = ""
+
+    # Per-group instructions follow the transcript so the shared prompt prefix stays identical
+    parser = partial.parser_for(i) if partial else None
+    output = estimate(group_file, extra_instruction, f"group_{i}", on_delta=parser.feed if parser else None,
+                      pricing_file=pricing_file, transcript_text=transcript_text)
+
+    # Check for refusal and retry if needed
+    if is_refusal(output):
+        print(f"[WARNING] Refusal detected in group {i}. Retrying with even stronger anti-refusal prompt.")
+        parser = partial.parser_for(i) if partial else None
+        output2 = estimate(group_file, f"{FORCEFUL_INSTRUCTION}{extra_instruction}", f"group_{i}_retry", retry=True,
+                           on_delta=parser.feed if parser else None, pricing_file=pricing_file,
+                           transcript_text=transcript_text)
+        if is_refusal(output2):
+            print(f"[FAIL] Group {i} refused again after retry. Saving refusal output.")
+        else:
+            print(f"[SUCCESS] Group {i} succeeded on retry.")
+        output = output2
+
+    with open(out_txt, 'w', encoding='utf-8') as f:
+        f.write(output)
+    if partial:
+        partial.finish(i, parser)
+    print(f"[SUCCESS] Output for group {i} written to {out_txt}")
+    return out_txt
+
+def schedule_longest_first(chunk_groups):
+    """Return (group_number, group) pairs ordered by total transcript size, largest first.
+
+    Submitting the longest calls first keeps the slowest request from starting
+    last, which minimises the makespan of a bounded worker pool.
+    """
+    sizes = {
+        i: sum(len(chunk_text) for chunk_text in group)
+        for i, group in enumerate(chunk_groups, 1)
+    }
+    return sorted(enumerate(chunk_groups, 1), key=lambda pair: sizes[pair[0]], reverse=True)
+
+def dispatch_groups(chunk_groups, run_dir, prompt_instructions, args, polycam_input, partial=None, pricing_files=None,
+                    skip=()):
+    """Run every group either sequentially via subprocess or concurrently in-process.
+
+    partial enables streaming in concurrent mode (see process_group);
+    pricing_files maps group numbers to their routed pricing subset; groups
+    numbered in skip already have their output (see reuse_group_outputs).
+    """
+    pricing_files = pricing_files or {}
+    success_count = 0
+    fail_count = 0
+    total_groups = len(chunk_groups)
+    usage_log = os.path.join(run_dir, 'llm_usage.jsonl')
+
+    if args.dispatch == 'sequential':
+        estimate = make_subprocess_estimator(args, polycam_input, prompt_instructions, usage_log)
+        for i, chunk_group in enumerate(chunk_groups, 1):
+            if i in skip:
+                continue
+            try:
+                process_group(i, chunk_group, total_groups, run_dir, estimate, pricing_file=pricing_files.get(i))
+                success_count += 1
+            except Exception as e:
+                print(f"[FAIL] Error processing group {i}: {e}")
+                fail_count += 1
+        return success_count, fail_count
+
+    from llm_replay import create_client
+    from rate_limiter import get_scheduler
+    # The shared scheduler owns retries (Retry-After, backoff) and adapts concurrency on 429s
+    client = create_client(args.api_key)
+    concurrency = max(1, min(args.concurrency, (total_groups - len(skip)) or 1))
+    get_scheduler(concurrency)
+    print(f"[INFO] Dispatching {total_groups - len(skip)} groups in-process with concurrency {concurrency} (longest first)")
+
+    estimate = make_inprocess_estimator(args, polycam_input, prompt_instructions, usage_log, client)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {}
+        for i, chunk_group in schedule_longest_first(chunk_groups):
+            if i in skip:
+                continue
+            future = executor.submit(process_group, i, chunk_group, total_groups, run_dir, estimate, partial,
+                                     pricing_files.get(i))
+            futures[future] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                future.result()
+                success_count += 1
+            except Exception as e:
+                print(f"[FAIL] Error processing group {i}: {e}")
+                fail_count += 1
+
+    return success_count, fail_count
+
+def dedup_transcript_chunks(chunk_names, chunk_texts, threshold):
+    """Drop near-duplicate paragraphs and chunks; return the (names, texts) to plan with and the report.
+
+    Trimmed texts only live in memory; the chunk store is left untouched.
+    """
+    from chunk_dedup import dedup_chunks
+
+    deduped, report = dedup_chunks(chunk_texts, threshold)
+    names, texts = [], []
+    for name, text in zip(chunk_names, deduped):
+        if text is None:
+            continue
+        names.append(name)
+        texts.append(text)
+    for entry in report['chunks_dropped']:
+        print(f"[INFO] Dropped chunk {entry['chunk']}: {entry['reason']}")
+    if report['paragraphs_dropped']:
+        trimmed = sorted({entry['chunk'] for entry in report['paragraphs_dropped']})
+        print(f"[INFO] Dropped {len(report['paragraphs_dropped'])} near-duplicate paragraphs from chunks "
+              f"{', '.join(map(str, trimmed))}")
+    return names, texts, report
+
+def find_reusable_run(args, run_dir, chunk_hashes, job):
+    """Return ((run_dir, manifest), fixed_groups) for the earlier run to reuse, or (None, []).
+
+    Off unless --reuse (the latest run of the same job under --output_dir) or
+    --reuse_from (a named run) is given.
+    """
+    from estimate_manifest import find_previous_run, load_manifest, matching_groups
+
+    if args.reuse_from:
+        manifest = load_manifest(args.reuse_from)
+        if manifest is None:
+            print(f"[WARNING] No estimate manifest in {args.reuse_from}; estimating every group")
+            return None, []
+        previous = (args.reuse_from, manifest)
+    elif args.reuse:
+        previous = find_previous_run(args.output_dir, chunk_hashes, job, exclude=run_dir)
+        if previous is None:
+            print(f"[INFO] No earlier run of this job under {args.output_dir} shares its chunks")
+            return None, []
+    else:
+        return None, []
+    fixed_groups = matching_groups(previous[1], chunk_hashes)
+    print(f"[INFO] {sum(len(group) for group in fixed_groups)} of {len(chunk_hashes)} chunks are unchanged "
+          f"since {previous[0]}")
+    return previous, fixed_groups
+
+def reuse_group_outputs(plan, chunk_groups, run_dir, previous_run):
+    """Copy the earlier output of every group whose chunks and context are unchanged; returns their numbers."""
+    from estimate_manifest import reusable_outputs
+
+    if previous_run is None:
+        return set()
+    outputs = reusable_outputs(*previous_run)
+    reused = set()
+    for group in plan:
+        source = outputs.get((tuple(group['chunk_hashes']), group['context_key']))
+        if source is None:
+            continue
+        number = group['group']
+        write_group_file(number, chunk_groups[number - 1], run_dir)
+        shutil.copyfile(source, os.path.join(run_dir, f'estimate_output_chunk_{number}.txt'))
+        group['reused_from'] = source
+        reused.add(number)
+        print(f"[INFO] Group {number}: unchanged since {previous_run[0]}; reusing its estimate")
+    if reused:
+        print(f"[INFO] Reusing {len(reused)} of {len(plan)} group estimates; dispatching {len(plan) - len(reused)}")
+    return reused
+
+def write_run_manifest(plan, run_dir, args, job):
+    """Record every group with a usable estimate so a later run can reuse it."""
+    from estimate_manifest import write_manifest
+    from llm_replay import extract_response_text
+
     groups = []
-    current_group = []
-    current_tokens = 0
-    
-    # Estimate tokens for prompt (will be added to each group)
-    prompt_tokens = count_tokens(f"{prompt_instructions}")
-    
-    for chunk_file in chunk_files:
-        chunk_text = Path(chunk_file).read_text(encoding='utf-8')
-        chunk_tokens = count_tokens(chunk_text)
-        
-        # Check if adding this chunk would exceed max_tokens
-        if current_tokens + chunk_tokens + prompt_tokens > max_tokens and current_group:
-            # Start a new group
-            groups.append(current_group)
-            current_group = [chunk_file]
-            current_tokens = chunk_tokens
+    for group in plan:
+        output_name = f"estimate_output_chunk_{group['group']}.txt"
+        try:
+            output = Path(run_dir, output_name).read_text(encoding='utf-8')
+        except OSError:
+            continue
+        if extract_response_text(output) is None or is_refusal(output):
+            continue
+        groups.append({
+            'group': group['group'], 'chunk_hashes': group['chunk_hashes'],
+            'context_key': group['context_key'], 'output': output_name,
+        })
+    write_manifest(run_dir, groups, transcript=args.transcript or args.transcript_dir, job_key=job)
+
+def pricing_subset_name(number):
+    return f'group_{number}_pricing.txt'
+
+def make_pricing_layout(args, polycam_input, prompt_instructions, sample_scope, static_prefix):
+    """Return layout(text, number) -> (static prefix, pricing section or None, route) for a group, or None.
+
+    A group whose routed pricing rows take fewer tokens than the full sheet
+    gets the prefix without the sheet and its rows as a pricing section ahead
+    of the transcript (see prompt_builder.py); any other group keeps
+    static_prefix, with the full sheet inside the cached prefix. None when
+    the pricing CSV cannot be read (every group gets the full sheet).
+    """
+    import csv
+    from pricing_catalog import PRICING_CSV, get_catalog
+    from pricing_router import format_pricing_rows, route_pricing
+    from send_files_to_chatgpt_text import build_static_prompt, load_file_contents
+
+    try:
+        rows = get_catalog(PRICING_CSV).rows
+    except (OSError, csv.Error) as e:
+        print(f"[WARNING] Could not read {PRICING_CSV} ({e}); sending the full pricing sheet to every group")
+        return None
+    full_tokens = count_tokens(load_file_contents([str(args.master_pricing)])[0][0])
+    _, routed_prefix = build_static_prompt(
+        str(args.master_pricing), str(polycam_input), prompt_instructions, sample_scope, routed_pricing=True
+    )
+
+    def layout(text, number):
+        route = dict(route_pricing(text, rows), total_rows=len(rows), full_tokens=full_tokens)
+        subset = None if route['full'] else format_pricing_rows(route['rows'], route['labels'])
+        if subset and count_tokens(subset) < full_tokens:
+            return routed_prefix, (f"File 1 ({pricing_subset_name(number)})", subset), route
+        return static_prefix, None, route
+
+    return layout
+
+def route_group_pricing(plan, chunk_texts, run_dir, layout):
+    """Write the pricing rows of each routed group to pricing_subsets/ and return {group: path}.
+
+    The plan was sized with the same layout, so its predicted prompt tokens
+    already include each group's pricing. Each plan entry gets the routing
+    tags and the pricing tokens sent versus the full sheet.
+    """
+    subsets_dir = os.path.join(run_dir, 'pricing_subsets')
+    os.makedirs(subsets_dir, exist_ok=True)
+    pricing_files = {}
+    total_sent = total_full = 0
+    for group in plan:
+        number = group['group']
+        _, section, route = layout(GROUP_SEPARATOR.join(chunk_texts[idx] for idx in group['chunks']), number)
+        full_tokens = route['full_tokens']
+        if section:
+            tokens = count_tokens(section[1])
+            pricing_file = os.path.join(subsets_dir, pricing_subset_name(number))
+            with open(pricing_file, 'w', encoding='utf-8') as f:
+                f.write(section[1])
+            pricing_files[number] = pricing_file
+            print(f"[INFO] Group {number}: pricing {len(route['rows'])}/{route['total_rows']} rows for "
+                  f"{', '.join(route['labels'])}; {full_tokens} -> {tokens} tokens ({1 - tokens / full_tokens:.0%} fewer)")
         else:
-            # Add to current group
-            current_group.append(chunk_file)
-            current_tokens += chunk_tokens
-    
-    # Add the last group if it has content
-    if current_group:
-        groups.append(current_group)
+            tokens = full_tokens
+            print(f"[INFO] Group {number}: no narrower pricing match; the full pricing sheet stays in the shared prefix")
+        group.update(
+            rooms=route['rooms'], pricing_labels=route['labels'],
+            pricing_rows=len(route['rows']) if section else None,
+            pricing_tokens=tokens, pricing_tokens_full=full_tokens,
+        )
+        total_sent += tokens
+        total_full += full_tokens
+
+    if total_full:
+        print(f"[INFO] Pricing routing: {total_sent} of {total_full} pricing tokens sent across {len(plan)} groups "
+              f"({1 - total_sent / total_full:.0%} fewer)")
+    return pricing_files
+
+def find_polycam_file(polycam_dir, raw=False):
+    """Pick the Polycam input from a polycam_chunks directory of an earlier run.
+
+    The parsed polycam_summary.txt is preferred (unless raw), then the copied
+    polycam.pdf, then the directory's only PDF; None if none of these exist.
+    """
+    names = ['polycam.pdf'] if raw else ['polycam_summary.txt', 'polycam.pdf']
+    for name in names:
+        path = os.path.join(polycam_dir, name)
+        if os.path.isfile(path):
+            return path
+    pdfs = sorted(name for name in os.listdir(polycam_dir) if name.lower().endswith('.pdf'))
+    return os.path.join(polycam_dir, pdfs[0]) if len(pdfs) == 1 else None
+
+def write_takeoff_estimate(transcript_chunks_dir, run_dir):
+    """Write the items process_takeoff.py priced locally as estimate_output_chunk_0.txt; returns the item count."""
+    from takeoff_parser import TAKEOFF_ESTIMATE_NAME
+
+    path = os.path.join(transcript_chunks_dir, TAKEOFF_ESTIMATE_NAME)
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        estimate = json.load(f)
+    count = sum(len(section['items']) for section in estimate.get('sections', []))
+    if count:
+        with open(os.path.join(run_dir, 'estimate_output_chunk_0.txt'), 'w', encoding='utf-8') as f:
+            f.write("```json\n" + json.dumps({'sections': estimate['sections']}, indent=2) + "\n```\n")
+        print(f"[INFO] {count} takeoff items priced without the LLM (estimate_output_chunk_0.txt)")
+    return count
+
+def aggregate_run(run_dir, partial=None):
+    # Step 4: Aggregate the outputs
+    print(f"[INFO] Step 4: Aggregating chunk outputs...")
+    try:
+        from comprehensive_cleanup import aggregate_chunk_outputs
+        aggregated_items = aggregate_chunk_outputs(run_dir, parsed_items=partial.verified_items() if partial else None)
+        if aggregated_items:
+            print(f"[SUCCESS] Aggregated {len(aggregated_items)} items from all chunks")
+        else:
+            print(f"[WARNING] No items aggregated from chunks")
+    except Exception as e:
+        print(f"[ERROR] Aggregation failed: {e}")
     
-    return groups
+    print(f"[INFO] Next step: Run comprehensive cleanup to generate final Excel file")
 
 def main():
     parser = argparse.ArgumentParser(description="Fully automatic renovation estimation pipeline.")
-    parser.add_argument('--transcript', help='Path to transcript PDF')
+    parser.add_argument('--transcript', help='Path to transcript PDF/JSON, or a takeoff (.txt/.csv/.xlsx)')
     parser.add_argument('--polycam', help='Path to polycam PDF')
-    parser.add_argument('--transcript_dir', help='Directory with transcript text chunks')
+    parser.add_argument('--transcript_dir', help='Directory with transcript chunks (a chunk store or chunk_N.txt files)')
     parser.add_argument('--polycam_dir', help='Directory with polycam text chunks')
     parser.add_argument('--output_dir', default='chunked_outputs', help='Base directory for outputs')
-    parser.add_argument('--max_tokens', type=int, default=10000, help='Max tokens per chunk (optimized for GPT-4o 128k context window)')
+    parser.add_argument('--max_tokens', type=int, default=10000, help='Max transcript tokens per group (optimized for GPT-4o 128k context window)')
+    parser.add_argument('--context_budget', type=int, default=None, help='Max prompt + completion tokens per call (default: model context window)')
     parser.add_argument('--master_pricing', default='Master Pricing Sheet - Q1 - 2025 (2).pdf', help='Master pricing PDF')
     parser.add_argument('--prompt_file', default='estimation_prompt.txt', help='Prompt file')
     parser.add_argument('--sample_scope', default=None, help='Optional sample scope file (DOCX or CSV)')
     parser.add_argument('--api_key', required=True, help='OpenAI API key')
+    parser.add_argument('--dispatch', choices=['concurrent', 'sequential'], default='concurrent', help='Send group requests concurrently in-process or one subprocess at a time')
+    parser.add_argument('--stream', action='store_true', help='Stream completions and parse items as they are generated (concurrent dispatch only)')
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='Bypass the LLM response cache for estimation calls')
+    parser.add_argument('--raw_polycam', action='store_true', help='Send raw Polycam PDF text instead of the parsed per-room geometry table')
+    parser.add_argument('--concurrency', type=int, default=int(os.environ.get('ESTIMATOR_CONCURRENCY', '4')), help='Max in-flight group requests in concurrent dispatch mode')
+    parser.add_argument('--pdf_workers', type=int, default=None, help='PDF extraction processes for long PDFs (default: ESTIMATOR_PDF_WORKERS or CPU count; 1 = serial)')
+    parser.add_argument('--pdf_backend', choices=sorted(PDF_BACKENDS), default=None, help='PDF text extraction backend (default: ESTIMATOR_PDF_BACKEND or pdfplumber)')
+    parser.add_argument('--full_pricing', action='store_true', help='Send the full master pricing sheet to every group instead of the rows relevant to it')
+    parser.add_argument('--no_dedup', action='store_true', help='Send every transcript chunk as-is instead of removing near-duplicate paragraphs and chunks')
+    parser.add_argument('--reuse', action='store_true', help='Reuse unchanged group estimates from the earlier run of the same job (same prompt, pricing, sample scope and Polycam) under --output_dir sharing the most chunks')
+    parser.add_argument('--reuse_from', default=None, help='Earlier run directory whose unchanged group estimates are reused')
+    parser.add_argument('--chunk_files', action='store_true', help='Also write each transcript chunk to transcript_chunks/chunk_N.txt')
+    parser.add_argument('--takeoff_mode', choices=['structured', 'text'], default='structured', help='structured: price takeoff lines with explicit quantities locally and send only the rest to the LLM; text: send the whole takeoff')
+    parser.add_argument('--dedup_threshold', type=float, default=0.8, help='Share of a paragraph\'s word shingles already seen for it to count as a duplicate')
     args = parser.parse_args()
 
+    if args.no_cache:
+        from llm_cache import disable_llm_cache
+        disable_llm_cache()  # also inherited by subprocesses and cleanup
+    if args.pdf_workers is not None:
+        os.environ['ESTIMATOR_PDF_WORKERS'] = str(args.pdf_workers)  # read by in-process and subprocess extraction
+    if args.pdf_backend:
+        os.environ['ESTIMATOR_PDF_BACKEND'] = args.pdf_backend
+
     if args.transcript and args.polycam:
         run_dir = unique_dir(args.transcript, args.polycam, args.output_dir)
     else:
@@ -90,8 +501,15 @@ def main():
     os.makedirs(run_dir, exist_ok=True)
 
     if args.transcript_dir and args.polycam_dir:
-        transcript_chunks = args.transcript_dir
+        transcript_chunks_dir = args.transcript_dir
         polycam_chunks = args.polycam_dir
+        if not args.polycam:
+            if not os.path.isdir(polycam_chunks):
+                raise ValueError(f"--polycam_dir {polycam_chunks} is not a directory")
+            args.polycam = find_polycam_file(polycam_chunks, raw=args.raw_polycam)
+            if not args.polycam:
+                raise ValueError(f"No Polycam file found in {polycam_chunks}; pass --polycam explicitly")
+            print(f"[INFO] Using Polycam file {args.polycam}")
     else:
         if not args.transcript or not args.polycam:
             raise ValueError("Either --transcript_dir and --polycam_dir or --transcript and --polycam must be provided.")
@@ -112,10 +530,15 @@ def main():
         
         # Get the directory where this script is located
         script_dir = os.path.dirname(os.path.abspath(__file__))
-        # Use process_takeoff.py for takeoff files
-        process_script = 'process_takeoff.py' if 'takeoff' in args.transcript.lower() else 'process_transcript.py'
+        # Use process_takeoff.py for takeoff files (and takeoff spreadsheets)
+        is_takeoff = 'takeoff' in transcript_lower or transcript_lower.endswith(('.csv', '.xlsx', '.xlsm'))
+        process_script = 'process_takeoff.py' if is_takeoff else 'process_transcript.py'
         process_transcript_path = os.path.join(script_dir, process_script)
         cmd = f'python3 "{process_transcript_path}" "{transcript_to_process}" --output_dir "{transcript_chunks_dir}" --max_tokens 1500'
+        if is_takeoff:
+            cmd += f' --mode {args.takeoff_mode}'
+        if args.chunk_files:
+            cmd += ' --chunk_files'
         
         try:
             result = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
@@ -131,185 +554,169 @@ def main():
         # Check if this is a temp file from the API (already processed)
         if '/tmp/' in str(args.polycam) or 'var/folders' in str(args.polycam):
             print(f"[INFO] Detected API temp file - copying as-is")
-        else:
-            print(f"[INFO] Using Polycam PDF directly (no text extraction)")
         
         # Copy the Polycam PDF to the polycam_chunks directory for reference
-        import shutil
         polycam_pdf_path = os.path.join(polycam_chunks, 'polycam.pdf')
         shutil.copy2(args.polycam, polycam_pdf_path)
-        
-        # Get transcript chunk files
-        transcript_files = sorted(Path(transcript_chunks_dir).glob('*.txt'))
 
-    polycam_text = ""  # Empty since we're passing PDF directly
+    # Parse the Polycam report once per job into a compact room table for the prompt
+    polycam_input = args.polycam
+    if args.raw_polycam:
+        print(f"[INFO] Using Polycam PDF directly (no room table)")
+    elif args.polycam and str(args.polycam).lower().endswith('.pdf'):
+        from polycam_parser import process_polycam
+        summary_path = process_polycam(args.polycam, os.path.join(run_dir, 'polycam_chunks'))
+        if summary_path:
+            polycam_input = summary_path
+        else:
+            print(f"[WARNING] Falling back to raw Polycam PDF text")
     prompt_instructions = Path(args.prompt_file).read_text(encoding='utf-8')
 
-    # Concatenate chunks into groups based on max_tokens
-    print(f"[INFO] Concatenating {len(transcript_files)} transcript chunks into optimized groups...")
-    
-    # Log chunk details for verification
+    # Read each chunk once from the chunk store; planning, verification and the prompts share the texts
+    chunk_names, chunk_texts = load_chunks(transcript_chunks_dir)
+    write_takeoff_estimate(transcript_chunks_dir, run_dir)
+    if not chunk_texts:
+        print(f"[INFO] No transcript text left for the LLM; skipping group planning and dispatch")
+        aggregate_run(run_dir)
+        return
+
+    # Pack chunks into groups sized on the fully assembled prompt
+    print(f"[INFO] Planning groups for {len(chunk_texts)} transcript chunks...")
     total_chunk_chars = 0
-    for i, chunk_file in enumerate(transcript_files, 1):
-        chunk_content = Path(chunk_file).read_text(encoding='utf-8')
+    for i, chunk_content in enumerate(chunk_texts, 1):
         total_chunk_chars += len(chunk_content)
         print(f"[INFO] Chunk {i}: {len(chunk_content)} characters")
-    
+
     print(f"[INFO] Total characters in all chunks: {total_chunk_chars}")
-    
-    chunk_groups = concatenate_chunks_to_tokens(transcript_files, args.max_tokens, prompt_instructions)
-    print(f"[INFO] Created {len(chunk_groups)} optimized groups from {len(transcript_files)} chunks")
-    
-    # Verify all chunks are included
+
+    from send_files_to_chatgpt_text import COMPLETION_PARAMS, ESTIMATION_MODEL, build_static_prompt
+    sample_scope = [args.sample_scope] if args.sample_scope else []
+    system_guardrails, static_prefix = build_static_prompt(
+        str(args.master_pricing), str(polycam_input), prompt_instructions, sample_scope
+    )
+    if not token_counting_is_exact():
+        print(f"[WARNING] tiktoken not installed; token counts are estimates (1 token ≈ 4 characters)")
+    if args.full_pricing:
+        print(f"[INFO] Sending the full master pricing sheet to every group (--full_pricing)")
+        layout = None
+    else:
+        layout = make_pricing_layout(args, polycam_input, prompt_instructions, sample_scope, static_prefix)
+    def plan_for(texts, fixed_groups=()):
+        # Groups are sized with the pricing they will be sent (see make_pricing_layout)
+        return plan_groups(
+            texts, system_guardrails, static_prefix, args.max_tokens,
+            context_budget=args.context_budget,
+            completion_tokens=COMPLETION_PARAMS['max_tokens'],
+            reserve_instruction=FORCEFUL_INSTRUCTION + PROCESS_INSTRUCTION,
+            instruction_for=lambda text: PROCESS_INSTRUCTION if is_process_chunk(text) else "",
+            model=ESTIMATION_MODEL, fixed_groups=fixed_groups,
+            layout_for=(lambda text, number: layout(text, number)[:2]) if layout else None,
+        )
+
+    dedup_summary = None
+    if not args.no_dedup:
+        original_texts = chunk_texts
+        chunk_names, chunk_texts, dedup_report = dedup_transcript_chunks(
+            chunk_names, chunk_texts, args.dedup_threshold)
+        if chunk_texts != original_texts:
+            tokens_before = sum(count_tokens(text, ESTIMATION_MODEL) for text in original_texts)
+            tokens_after = sum(count_tokens(text, ESTIMATION_MODEL) for text in chunk_texts)
+            calls_before = len(plan_for(original_texts))
+            total_chunk_chars = sum(len(text) for text in chunk_texts)
+        else:
+            tokens_before = tokens_after = calls_before = None
+
+    # Keep an earlier run's groups together when their chunks are unchanged, so their outputs can be reused
+    from estimate_manifest import chunk_hash, job_key
+    chunk_hashes = [chunk_hash(text) for text in chunk_texts]
+    job = job_key(system_guardrails, static_prefix)
+    previous_run, fixed_groups = find_reusable_run(args, run_dir, chunk_hashes, job)
+    plan = plan_for(chunk_texts, fixed_groups)
+
+    if not args.no_dedup:
+        if calls_before is not None:
+            print(f"[INFO] Deduplication saved {tokens_before - tokens_after} transcript tokens "
+                  f"({tokens_before} -> {tokens_after}) and {calls_before - len(plan)} calls ({calls_before} -> {len(plan)})")
+        else:
+            print(f"[INFO] Deduplication found no near-duplicate transcript text")
+        dedup_summary = {
+            'chunks_before': len(original_texts), 'chunks_after': len(chunk_texts),
+            'transcript_tokens_before': tokens_before, 'transcript_tokens_after': tokens_after,
+            'calls_before': calls_before, 'calls_after': len(plan),
+        }
+        from chunk_dedup import write_report
+        write_report(dedup_report, os.path.join(run_dir, 'dedup_report.json'), **dedup_summary)
+    chunk_groups = [[chunk_texts[idx] for idx in group['chunks']] for group in plan]
+    print(f"[INFO] Created {len(chunk_groups)} optimized groups from {len(chunk_texts)} chunks")
+
+    # Verify all chunks are included and report the predicted size of every call
     total_groups_chars = 0
-    for i, group in enumerate(chunk_groups, 1):
-        group_chars = sum(len(Path(chunk).read_text(encoding='utf-8')) for chunk in group)
+    for group in plan:
+        group_chars = sum(len(chunk_texts[idx]) for idx in group['chunks'])
         total_groups_chars += group_chars
-        print(f"[INFO] Group {i}: {len(group)} chunks, {group_chars} characters")
-    
+        chunk_numbers = ', '.join(str(idx + 1) for idx in group['chunks'])
+        print(f"[INFO] Group {group['group']}: chunks [{chunk_numbers}], {group_chars} characters, "
+              f"{group['transcript_tokens']} transcript tokens, {group['predicted_prompt_tokens']} predicted prompt tokens")
+
     print(f"[INFO] Total characters in all groups: {total_groups_chars}")
     if total_chunk_chars != total_groups_chars:
         print(f"[WARNING] Character count mismatch! Chunks: {total_chunk_chars}, Groups: {total_groups_chars}")
     else:
         print(f"[INFO] Character count verification passed - all content preserved")
+    pricing_files = route_group_pricing(plan, chunk_texts, run_dir, layout) if layout else {}
 
-    # Define process/legal/insurance keywords
-    process_keywords = [
-        'permit', 'insurance', 'approval', 'board', 'legal', 'liability', 'contract', 'agreement',
-        'license', 'licenses', 'documentation', 'preconstruction', 'postconstruction', 'dob', 'city',
-        'compliance', 'consult', 'consultant', 'architect', 'engineer', 'approval', 'risk', 'deposit',
-        'professional', 'lawyer', 'attorney', 'financial', 'scope of work', 'operation agreement',
-        'building rules', 'hoa', 'co-op', 'condo', 'resident', 'tenant', 'submit', 'review', 'insurance',
-        'liabilities', 'legal advice', 'financial advice', 'approval process', 'board approval', 'insurance certificate'
-    ]
-    def is_process_chunk(text):
-        text_l = text.lower()
-        count = sum(1 for k in process_keywords if k in text_l)
-        return count >= 3 or (count > 0 and len(text_l.split()) < 200)  # flag if many keywords or short and process-heavy
-
-    refusal_phrases = [
-        "unable to fulfill this request",
-        "cannot fulfill this request",
-        "not able to fulfill this request",
-        "unable to provide",
-        "cannot provide",
-        "not able to provide",
-        "consulting the transcript",
-        "consult a professional",
-        "liabilities",
-        "legal advice",
-        "financial advice",
-        "I am an AI language model",
-        "I cannot",
-        "I'm unable",
-        "I'm not able",
-        "I do not have the ability",
-        "I am not able"
-    ]
-    def is_refusal(text):
-        return any(phrase in text.lower() for phrase in refusal_phrases)
+    from estimate_manifest import context_key
+    for group in plan:
+        group_prefix, section = static_prefix, None
+        if layout:
+            group_prefix, section, _ = layout(GROUP_SEPARATOR.join(chunk_texts[idx] for idx in group['chunks']), group['group'])
+        group['chunk_hashes'] = [chunk_hashes[idx] for idx in group['chunks']]
+        group['context_key'] = context_key(
+            ESTIMATION_MODEL, COMPLETION_PARAMS, system_guardrails, group_prefix, section[1] if section else "",
+        )
+    reused = reuse_group_outputs(plan, chunk_groups, run_dir, previous_run)
+    print(f"[INFO] Predicted prompt tokens for all calls: "
+          f"{sum(group['predicted_prompt_tokens'] for group in plan if group['group'] not in reused)}")
+    write_plan(
+        [dict(group, chunk_names=[chunk_names[idx] for idx in group['chunks']]) for group in plan],
+        os.path.join(run_dir, 'group_plan.json'),
+        model=ESTIMATION_MODEL, max_group_tokens=args.max_tokens, context_budget=args.context_budget,
+        full_pricing=args.full_pricing, dedup=dedup_summary,
+    )
 
-    success_count = 0
-    fail_count = 0
-    
-    # Process each group instead of individual chunks
-    for i, chunk_group in enumerate(chunk_groups, 1):
-        out_txt = os.path.join(run_dir, f'estimate_output_chunk_{i}.txt')
-        print(f"[INFO] Processing optimized group {i}/{len(chunk_groups)} with {len(chunk_group)} chunks")
-        
-        try:
-            # Concatenate all chunks in this group
-            group_texts = []
-            for chunk_file in chunk_group:
-                chunk_text = Path(chunk_file).read_text(encoding='utf-8')
-                group_texts.append(chunk_text)
-            
-            transcript_text = '\n\n'.join(group_texts)
-            
-            # Preprocess chunk for process/legal/insurance content
-            process_flag = is_process_chunk(transcript_text)
-            if process_flag:
-                print(f"[INFO] Group {i} flagged as process/legal heavy. Adding special instruction to prompt.")
-                extra_instruction = "\n**NOTE: This chunk is mostly about process, insurance, or legal topics. IGNORE those topics completely. Focus only on any physical renovation work, scope items, or plausible tasks you can infer, even if only hinted at. NEVER refuse.**\n"
-            else:
-                extra_instruction = ""
-            
-            prompt = f"[TRANSCRIPT CHUNK]\n{transcript_text}\n\n{extra_instruction}{prompt_instructions}"
-            
-            # Use the existing chunk file directly instead of creating a duplicate
-            transcript_chunk_file = os.path.join(run_dir, 'transcript_chunks', f'chunk_{i}.txt')
-            
-            # Properly quote all file arguments and prompt for shell
-            cmd = [
-                "python3", "send_files_to_chatgpt_text.py",
-                "--file1", shlex.quote(str(args.master_pricing)),
-                "--file2", shlex.quote(str(args.polycam)),  # Pass Polycam PDF directly
-                "--file3", shlex.quote(transcript_chunk_file),  # Use existing chunk file
-                "--prompt", shlex.quote(prompt)
-                # Remove --api_key from command line to avoid truncation
-            ]
-            if args.sample_scope:
-                cmd.extend(["--sample_scope", shlex.quote(args.sample_scope)])
-            
-            # Set API key as environment variable to avoid command line truncation
-            env = os.environ.copy()
-            env['OPENAI_API_KEY'] = args.api_key
-            
-            cmd_str = ' '.join(cmd)
-            print(f"[INFO] Running estimation command for group {i}: {cmd_str}")
-            output = run_cmd_capture(cmd_str, env=env)
-            
-            # Check for refusal and retry if needed
-            if is_refusal(output):
-                print(f"[WARNING] Refusal detected in group {i}. Retrying with even stronger anti-refusal prompt.")
-                forceful_extra = "\n**MANDATORY: You must NOT refuse, disclaim, or say you cannot provide an estimate. If the chunk is ambiguous, speculative, or process-focused, MAKE UP plausible scope items and proceed.**\n"
-                prompt2 = f"[TRANSCRIPT CHUNK]\n{transcript_text}\n\n{forceful_extra}{extra_instruction}{prompt_instructions}"
-                cmd2 = [
-                    "python3", "send_files_to_chatgpt_text.py",
-                    "--file1", shlex.quote(str(args.master_pricing)),
-                    "--file2", shlex.quote(str(args.polycam)),  # Pass Polycam PDF directly
-                    "--file3", shlex.quote(transcript_chunk_file),  # Add the missing file3
-                    "--prompt", shlex.quote(prompt2),
-                    "--api_key", shlex.quote(args.api_key)
-                ]
-                if args.sample_scope:
-                    cmd2.extend(["--sample_scope", shlex.quote(args.sample_scope)])
-                cmd2_str = ' '.join(cmd2)
-                print(f"[INFO] Retrying estimation command for group {i}: {cmd2_str}")
-                output2 = run_cmd_capture(cmd2_str, env=env)
-                if is_refusal(output2):
-                    print(f"[FAIL] Group {i} refused again after retry. Saving refusal output.")
-                    output = output2  # Save the refusal output for review
-                else:
-                    print(f"[SUCCESS] Group {i} succeeded on retry.")
-                    output = output2
-            
-            with open(out_txt, 'w', encoding='utf-8') as f:
-                f.write(output)
-            print(f"[SUCCESS] Output for group {i} written to {out_txt}")
-            success_count += 1
-        except Exception as e:
-            print(f"[FAIL] Error processing group {i}: {e}")
-            fail_count += 1
+    partial = None
+    if args.stream and args.dispatch == 'sequential':
+        print(f"[WARNING] --stream requires concurrent dispatch; sequential groups are not streamed")
+    elif args.stream:
+        from comprehensive_cleanup import convert_estimation_item
+        from stream_parser import PartialResults
+        partial = PartialResults(os.path.join(run_dir, 'partial_items.jsonl'), convert_estimation_item)
+        print(f"[INFO] Streaming completions; partial items are appended to {partial.partial_path}")
+
+    success_count, fail_count = dispatch_groups(chunk_groups, run_dir, prompt_instructions, args, polycam_input, partial,
+                                                pricing_files, skip=reused)
 
-    print(f"[SUMMARY] {success_count} groups succeeded, {fail_count} failed.")
+    print(f"[SUMMARY] {success_count} groups succeeded, {fail_count} failed"
+          f"{f', {len(reused)} reused from {previous_run[0]}' if reused else ''}.")
+    write_run_manifest(plan, run_dir, args, job)
+
+    from rate_limiter import get_scheduler
+    scheduler_stats = get_scheduler().stats()
+    if scheduler_stats['retries'] or scheduler_stats['wait_seconds'] >= 1:
+        print(f"[SUMMARY] Rate limiting: {scheduler_stats['rate_limited']} 429s, {scheduler_stats['retries']} retries, "
+              f"{scheduler_stats['wait_seconds']}s waiting for capacity, final concurrency {scheduler_stats['concurrency']}")
+
+    from llm_usage import summarize_usage
+    usage = summarize_usage(os.path.join(run_dir, 'llm_usage.jsonl'))
+    if usage:
+        print(f"[SUMMARY] LLM usage: {usage['api_calls']}/{usage['calls']} API calls, "
+              f"{usage['prompt_tokens']} prompt tokens ({usage['cached_tokens']} cached, {usage['cached_ratio']:.0%}), "
+              f"{usage['completion_tokens']} completion tokens")
 
     print(f"[INFO] Estimation pipeline complete. Results in {run_dir}")
     print(f"All outputs for this run are in: {run_dir}")
     
-    # Step 4: Aggregate the outputs
-    print(f"[INFO] Step 4: Aggregating chunk outputs...")
-    try:
-        from comprehensive_cleanup import aggregate_chunk_outputs
-        aggregated_items = aggregate_chunk_outputs(run_dir)
-        if aggregated_items:
-            print(f"[SUCCESS] Aggregated {len(aggregated_items)} items from all chunks")
-        else:
-            print(f"[WARNING] No items aggregated from chunks")
-    except Exception as e:
-        print(f"[ERROR] Aggregation failed: {e}")
-    
-    print(f"[INFO] Next step: Run comprehensive cleanup to generate final Excel file")
+    aggregate_run(run_dir, partial)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
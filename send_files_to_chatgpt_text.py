@@ -4,6 +4,12 @@ send_files_to_chatgpt_text.py
 Send three main project files and a prompt to OpenAI's Chat Completions API (gpt-4o), 
 by extracting text content from PDFs and sending as text.
 
+The prompt is laid out prefix-stable (see prompt_builder.py): the prompt,
+file1 (pricing sheet) and file2 (Polycam) form the shared prefix and file3
+(the transcript chunk) plus --chunk_instruction come last. With
+--pricing_subset the group's routed pricing rows replace file1 and go right
+before file3, after the shared prefix.
+
 Usage:
   python send_files_to_chatgpt_text.py --file1 file1.pdf --file2 file2.pdf --file3 file3.txt --prompt "Summarize the key points." [--sample_scope sample1.csv --sample_scope sample2.csv ...] [--api_key YOUR_API_KEY]
 
@@ -11,154 +17,266 @@ Supported file types: PDF, DOCX, TXT for uploads; CSVs are appended as markdown
 """
 import argparse
 import os
-import openai
+import time
 from pathlib import Path
-import csv
+from pdf_extraction import PDF_BACKENDS, extract_pdf_text_cached
+from llm_cache import disable_llm_cache, get_cached_response, response_cache_key, store_response
+from llm_usage import record_usage, usage_from_response
+from prompt_builder import build_chunk_suffix, build_messages, build_static_prefix
+from group_planner import count_message_tokens
+from rate_limiter import get_scheduler
+from llm_replay import create_client, record_exchange, replay_dir
 
 def extract_text_from_pdf(pdf_path):
-    """Extract text from PDF file."""
+    """Extract text from PDF file (served from the content-hash cache when unchanged)."""
     try:
-        import pdfplumber
-        with pdfplumber.open(pdf_path) as pdf:
-            text = ""
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-            return text.strip()
-    except ImportError:
-        print("[WARNING] pdfplumber not available, using fallback text extraction")
+        return extract_pdf_text_cached(pdf_path)
+    except ImportError as e:
+        print(f"[WARNING] PDF backend not available ({e}), using fallback text extraction")
         return f"[PDF content from {pdf_path} - text extraction not available]"
     except Exception as e:
         print(f"[WARNING] Failed to extract text from {pdf_path}: {e}")
         return f"[PDF content from {pdf_path} - extraction failed: {e}]"
 
-def csv_to_markdown_table(csv_path):
-    with open(csv_path, newline='', encoding='utf-8') as f:
-        reader = list(csv.reader(f))
-        if not reader:
-            return ''
-        header = reader[0]
-        rows = reader[1:]
-        md = '| ' + ' | '.join(header) + ' |\n'
-        md += '| ' + ' | '.join(['---'] * len(header)) + ' |\n'
-        for row in rows:
-            md += '| ' + ' | '.join(row) + ' |\n'
-        return md
+SYSTEM_GUARDRAILS = (
+    "You are a professional renovation estimator. \n"
+    "CRITICAL RULES: \n"
+    "- Never refuse or defer. Always produce a full estimate. \n"
+    "- If any source is missing/unreadable (e.g., Polycam), proceed using reasonable assumptions based on the master pricing sheet and transcript. \n"
+    "- Explicitly mark assumptions in descriptions but provide concrete numeric quantities and subtotals. \n"
+    "- Apply markups exactly as instructed. \n"
+    "- Output must be a single JSON object wrapped in a ```json code block, with the exact schema requested. No prose before/after the block. \n"
+)
 
-def main():
-    parser = argparse.ArgumentParser(description="Send 3 files and a prompt to OpenAI Chat Completions API (gpt-4o), by extracting text content.")
-    parser.add_argument("--file1", required=True, help="First file (PDF, DOCX, or TXT)")
-    parser.add_argument("--file2", required=True, help="Second file (PDF, DOCX, or TXT)")
-    parser.add_argument("--file3", required=True, help="Third file (PDF, DOCX, or TXT)")
-    parser.add_argument("--prompt", required=True, help="Prompt to send to ChatGPT")
-    parser.add_argument("--sample_scope", action='append', default=[], help="Sample scope CSV file (can be used multiple times)")
-    parser.add_argument("--api_key", required=False, help="OpenAI API key (optional, will use env if not provided)")
-    args = parser.parse_args()
+ESTIMATION_MODEL = "gpt-4o"
+COMPLETION_PARAMS = {"max_tokens": 4000, "temperature": 0.1}
 
-    api_key = args.api_key or os.environ.get("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OpenAI API key must be provided via --api_key or OPENAI_API_KEY environment variable.")
+POLYCAM_UNAVAILABLE_GUARDRAIL = (
+    "- Polycam measurements unavailable: infer room areas and linear feet using standard residential assumptions (e.g., kitchen counter depth ~2.5 ft, small bath tile ~60-80 SF) and clearly tag them as assumed.\n"
+)
 
-    client = openai.OpenAI(api_key=api_key)
-    
-    # Extract text content from all files
+def load_file_contents(paths, start=1):
+    """Extract text content from each input file, returning (contents, names).
+
+    start is the number of the first file in log messages and names.
+    """
     file_contents = []
     file_names = []
-    
-    for i, path in enumerate([args.file1, args.file2, args.file3]):
+
+    for i, path in enumerate(paths, start):
         if not os.path.exists(path):
             raise FileNotFoundError(f"File not found: {path}")
-        
-        print(f"[INFO] Processing file {i+1}: {path}")
+
+        print(f"[INFO] Processing file {i}: {path}")
         ext = Path(path).suffix.lower()
-        
+
         if ext == '.pdf':
             # Extract text from PDF
             text_content = extract_text_from_pdf(path)
             file_contents.append(text_content)
-            file_names.append(f"File {i+1} ({Path(path).name})")
+            file_names.append(f"File {i} ({Path(path).name})")
             print(f"[SUCCESS] Extracted {len(text_content)} characters from {path}")
         elif ext == '.txt':
             # Read text file directly
             with open(path, 'r', encoding='utf-8') as f:
                 text_content = f.read()
             file_contents.append(text_content)
-            file_names.append(f"File {i+1} ({Path(path).name})")
+            file_names.append(f"File {i} ({Path(path).name})")
             print(f"[SUCCESS] Read {len(text_content)} characters from {path}")
         else:
             print(f"[WARNING] Unsupported file type: {path}, skipping")
             file_contents.append(f"[Unsupported file: {path}]")
-            file_names.append(f"File {i+1} ({Path(path).name})")
-
-    prompt = args.prompt
-    # Append section_minimums_margins.csv as markdown table to the prompt
-    cheatsheet_csv = "section_minimums_margins.csv"
-    if os.path.exists(cheatsheet_csv):
-        md_table = csv_to_markdown_table(cheatsheet_csv)
-        prompt += f"\n\nSection Markup and Minimums Cheatsheet ({cheatsheet_csv}):\n" + md_table
-
-    # Append all sample scope CSVs as markdown tables to the prompt
-    for i, csv_path in enumerate(args.sample_scope, 1):
-        if not os.path.exists(csv_path):
-            raise FileNotFoundError(f"Sample scope file not found: {csv_path}")
-        md_table = csv_to_markdown_table(csv_path)
-        prompt += f"\n\nSample Scope Table {i} ({Path(csv_path).name}):\n" + md_table
-
-    # Build the complete prompt with file contents
-    complete_prompt = prompt + "\n\n"
-    for i, (content, name) in enumerate(zip(file_contents, file_names)):
-        complete_prompt += f"=== {name} ===\n{content}\n\n"
-
-    # Add strict guardrails so the model never refuses and always returns results
+            file_names.append(f"File {i} ({Path(path).name})")
+
+    return file_contents, file_names
+
+def build_system_guardrails(polycam_text):
+    """Return the system message, adding the Polycam fallback rule when measurements are missing."""
     # Detect if Polycam text is likely missing/failed
-    polycam_text = file_contents[1] if len(file_contents) >= 2 else ""
     polycam_unavailable = (
         isinstance(polycam_text, str)
         and ("extraction failed" in polycam_text.lower() or "text extraction not available" in polycam_text.lower())
     ) or (isinstance(polycam_text, str) and len(polycam_text.strip()) < 50)
 
-    system_guardrails = (
-        "You are a professional renovation estimator. \n"
-        "CRITICAL RULES: \n"
-        "- Never refuse or defer. Always produce a full estimate. \n"
-        "- If any source is missing/unreadable (e.g., Polycam), proceed using reasonable assumptions based on the master pricing sheet and transcript. \n"
-        "- Explicitly mark assumptions in descriptions but provide concrete numeric quantities and subtotals. \n"
-        "- Apply markups exactly as instructed. \n"
-        "- Output must be a single JSON object wrapped in a ```json code block, with the exact schema requested. No prose before/after the block. \n"
+    if polycam_unavailable:
+        return SYSTEM_GUARDRAILS + POLYCAM_UNAVAILABLE_GUARDRAIL
+    return SYSTEM_GUARDRAILS
+
+def build_static_prompt(file1, file2, prompt, sample_scope=(), routed_pricing=False):
+    """Return (system_guardrails, static_prefix): the part of the request shared by every group.
+
+    With routed_pricing the pricing sheet (file1) is left out; each group's
+    pricing rows then go in its chunk suffix (see prompt_builder.py).
+    """
+    if routed_pricing:
+        file_contents, file_names = load_file_contents([file2], start=2)
+    else:
+        file_contents, file_names = load_file_contents([file1, file2])
+    static_prefix = build_static_prefix(prompt, list(zip(file_names, file_contents)), sample_scope)
+    return build_system_guardrails(file_contents[-1]), static_prefix
+
+def stream_completion(client, model, messages, params, on_delta):
+    """Stream a chat completion, passing each text delta to on_delta.
+
+    Returns (content or None, usage dict, seconds to first token).
+    """
+    started = time.time()
+    first_token_seconds = None
+    parts = []
+    usage = {}
+    stream = client.chat.completions.create(
+        model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params
     )
+    try:
+        for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                usage = usage_from_response(chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_token_seconds is None:
+                    first_token_seconds = round(time.time() - started, 3)
+                parts.append(delta)
+                on_delta(delta)
+    except Exception as e:
+        if not parts:
+            raise
+        # Text already reached on_delta, so this must not be retried as a fresh call
+        raise RuntimeError(f"Stream interrupted after {sum(len(p) for p in parts)} characters: {e}") from e
+    return ("".join(parts) if parts else None), usage, first_token_seconds
 
-    if polycam_unavailable:
-        system_guardrails += (
-            "- Polycam measurements unavailable: infer room areas and linear feet using standard residential assumptions (e.g., kitchen counter depth ~2.5 ft, small bath tile ~60-80 SF) and clearly tag them as assumed.\n"
+def request_estimate(client, messages, model=ESTIMATION_MODEL, usage_log=None, label=None, on_delta=None):
+    """Send one estimation request and return the response text (None if empty).
+
+    Identical requests are answered from the LLM response cache; API calls
+    report token usage, including provider prompt-cache hits. API calls go
+    through the shared rate-limit scheduler (rate_limiter.py). With on_delta
+    the completion is streamed and on_delta receives the text as it arrives
+    (a cached response is delivered in one piece).
+    """
+    params = dict(COMPLETION_PARAMS)
+
+    cache_key = response_cache_key(model, messages, **params)
+    cached = get_cached_response(cache_key)
+    if cached is not None:
+        print("[INFO] Using cached LLM response")
+        record_usage({'label': label, 'from_cache': True, 'latency_seconds': 0.0}, usage_log)
+        if on_delta is not None:
+            on_delta(cached)
+        return cached
+
+    scheduler = get_scheduler()
+    estimated_tokens = count_message_tokens(messages, model) + params["max_tokens"]
+    started = time.time()
+    if on_delta is not None:
+        content, usage, first_token_seconds = scheduler.call(
+            lambda: stream_completion(client, model, messages, params, on_delta), estimated_tokens, label
         )
+        record = {'label': label, 'from_cache': False, 'latency_seconds': round(time.time() - started, 3),
+                  'first_token_seconds': first_token_seconds}
+        record.update(usage)
+        record_usage(record, usage_log)
+        store_response(cache_key, content)
+        record_exchange(model, messages, params, content, usage, record['latency_seconds'], first_token_seconds)
+        return content
+
+    response = scheduler.call(
+        lambda: client.chat.completions.create(model=model, messages=messages, **params), estimated_tokens, label
+    )
+    record = {'label': label, 'from_cache': False, 'latency_seconds': round(time.time() - started, 3)}
+    record.update(usage_from_response(response))
+    record_usage(record, usage_log)
+
+    if response.choices and len(response.choices) > 0:
+        content = response.choices[0].message.content
+        store_response(cache_key, content)
+        record_exchange(model, messages, params, content, usage_from_response(response), record['latency_seconds'])
+        return content
+    return None
+
+def send_files_to_chatgpt(file1, file2, file3, prompt, sample_scope=(), api_key=None, client=None,
+                          chunk_instruction="", usage_log=None, label=None, on_delta=None, file3_text=None,
+                          pricing_subset=None):
+    """Build the estimation prompt from the three files and return the model response.
+
+    file1/file2 and the prompt form the static prefix shared by every group;
+    file3 and chunk_instruction are the chunk-specific tail. Used in-process by
+    run_chunked_estimation.py; pass a shared ``client`` to reuse one HTTP
+    connection pool across concurrent calls. on_delta enables streaming
+    (see request_estimate). file3_text, when given, is used instead of
+    reading file3 again. pricing_subset, a group's routed pricing file, is
+    sent after the static prefix in place of file1.
+    """
+    if client is None:
+        api_key = api_key or os.environ.get("OPENAI_API_KEY")
+        if not api_key and not replay_dir():
+            raise ValueError("OpenAI API key must be provided via --api_key or OPENAI_API_KEY environment variable.")
+        client = create_client(api_key)
+
+    system_guardrails, static_prefix = build_static_prompt(file1, file2, prompt, sample_scope,
+                                                           routed_pricing=pricing_subset is not None)
+    pricing_section = None
+    if pricing_subset is not None:
+        pricing_contents, pricing_names = load_file_contents([pricing_subset])
+        pricing_section = (pricing_names[0], pricing_contents[0])
+    if file3_text is None:
+        file3_text = load_file_contents([file3], start=3)[0][0]
+    chunk_suffix = build_chunk_suffix(file3_text, Path(file3).name, chunk_instruction, pricing_section)
+    messages = build_messages(system_guardrails, static_prefix, chunk_suffix)
+
+    print(f"[INFO] Total prompt length: {len(static_prefix) + len(chunk_suffix)} characters ({len(static_prefix)} static prefix)")
+    return request_estimate(client, messages, usage_log=usage_log, label=label, on_delta=on_delta)
+
+def main():
+    parser = argparse.ArgumentParser(description="Send 3 files and a prompt to OpenAI Chat Completions API (gpt-4o), by extracting text content.")
+    parser.add_argument("--file1", required=True, help="First file (PDF, DOCX, or TXT)")
+    parser.add_argument("--file2", required=True, help="Second file (PDF, DOCX, or TXT)")
+    parser.add_argument("--file3", required=True, help="Third file (PDF, DOCX, or TXT)")
+    parser.add_argument("--prompt", required=True, help="Prompt to send to ChatGPT")
+    parser.add_argument("--chunk_instruction", default="", help="Extra instruction placed after file3 (keeps the shared prefix stable)")
+    parser.add_argument("--pricing_subset", default=None, help="Routed pricing rows sent after the shared prefix instead of file1")
+    parser.add_argument("--usage_log", default=None, help="Append per-call token usage (JSON lines) to this file")
+    parser.add_argument("--label", default=None, help="Label recorded with the usage entry")
+    parser.add_argument("--sample_scope", action='append', default=[], help="Sample scope CSV file (can be used multiple times)")
+    parser.add_argument("--api_key", required=False, help="OpenAI API key (optional, will use env if not provided)")
+    parser.add_argument("--stream", action="store_true", help="Stream the completion and print it as it is generated")
+    parser.add_argument("--no-cache", dest="no_cache", action="store_true", help="Always call the API instead of reusing cached responses")
+    parser.add_argument("--pdf_workers", type=int, default=None, help="PDF extraction processes (default: ESTIMATOR_PDF_WORKERS or CPU count; 1 = serial)")
+    parser.add_argument("--pdf_backend", choices=sorted(PDF_BACKENDS), default=None, help="PDF text extraction backend (default: ESTIMATOR_PDF_BACKEND or pdfplumber)")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        disable_llm_cache()
+    if args.pdf_workers is not None:
+        os.environ['ESTIMATOR_PDF_WORKERS'] = str(args.pdf_workers)
+    if args.pdf_backend:
+        os.environ['ESTIMATOR_PDF_BACKEND'] = args.pdf_backend
+
+    api_key = args.api_key or os.environ.get("OPENAI_API_KEY")
+    if not api_key and not replay_dir():
+        raise ValueError("OpenAI API key must be provided via --api_key or OPENAI_API_KEY environment variable.")
+
+    client = create_client(api_key)  # ESTIMATOR_LLM_REPLAY selects the offline stand-in
 
     # Use Chat Completions API
     print("[INFO] Sending request to OpenAI Chat Completions API...")
-    print(f"[INFO] Total prompt length: {len(complete_prompt)} characters")
-    
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_guardrails
-                },
-                {
-                    "role": "user",
-                    "content": complete_prompt
-                }
-            ],
-            max_tokens=4000,
-            temperature=0.1
+        content = send_files_to_chatgpt(
+            args.file1, args.file2, args.file3, args.prompt,
+            sample_scope=args.sample_scope, client=client,
+            chunk_instruction=args.chunk_instruction, usage_log=args.usage_log, label=args.label,
+            pricing_subset=args.pricing_subset,
+            on_delta=(lambda delta: print(delta, end="", flush=True)) if args.stream else None
         )
-        
+
         # Extract and print the response
-        if response.choices and len(response.choices) > 0:
-            content = response.choices[0].message.content
-            print("[RESPONSE]")
-            print(content)
+        if content is not None:
+            if args.stream:
+                print()
+            else:
+                print("[RESPONSE]")
+                print(content)
             
             # Write to file
             with open("estimate_output.txt", "w", encoding="utf-8") as f:
@@ -167,6 +285,8 @@ def main():
         else:
             print("[ERROR] No response received")
             
+    except (FileNotFoundError, ValueError):
+        raise
     except Exception as e:
         print(f"[ERROR] API call failed: {e}")
         return
@@ -0,0 +1,188 @@
+"""
+stream_parser.py
+
+Incremental parsing of streamed estimation responses.
+
+The model answers with one JSON object (usually inside a ```json fence):
+
+  {"sections": [{"name": ..., "items": [{...}, {...}]}, ...], ...}
+
+IncrementalItemsParser is fed the completion text as it arrives and calls
+on_item(section_name, item) as soon as each object in a section's "items"
+array is closed, so cleanup and partial reporting can run while the rest of
+the response is still being generated. Items of a section whose "name" comes
+after its "items" are held until the name arrives (or the section closes). PartialResults collects those items
+per group, appends them to ``partial_items.jsonl`` and keeps the verified
+items for aggregation.
+"""
+import json
+import threading
+
+class IncrementalItemsParser:
+    """Scan a streamed JSON response and emit each finished sections[].items[] object."""
+
+    def __init__(self, on_item=None):
+        self.on_item = on_item
+        self.text = ""
+        self.items = []
+        self.complete = False
+        self._pos = 0
+        self._started = False
+        self._root_start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+
+    def feed(self, delta):
+        """Append a piece of completion text and parse as far as possible."""
+        self.text += delta
+        if self.complete:
+            return
+        if not self._started:
+            start = self.text.find('{', self._pos)
+            if start == -1:
+                self._pos = len(self.text)
+                return
+            self._started = True
+            self._root_start = start
+            self._pos = start
+        self._scan()
+
+    def _scan(self):
+        text = self.text
+        stack = self._stack
+        pos = self._pos
+        while pos < len(text):
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(json.loads(text[self._string_start:pos + 1]))
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in '{[':
+                stack.append({'type': ch, 'start': pos, 'key': None, 'expect_key': ch == '{'})
+            elif ch == ':' and stack and stack[-1]['type'] == '{':
+                stack[-1]['expect_key'] = False
+            elif ch == ',' and stack and stack[-1]['type'] == '{':
+                stack[-1]['expect_key'] = True
+                stack[-1]['key'] = None
+            elif ch in '}]' and stack:
+                frame = stack.pop()
+                if ch == '}' and self._is_item_path():
+                    self._emit(text[frame['start']:pos + 1])
+                elif ch == '}' and frame.get('pending') and len(stack) == 2:
+                    self._flush(frame, '')  # the section closed without a name
+                if not stack:
+                    self.complete = True
+                    self._pos = pos + 1
+                    return
+            pos += 1
+        self._pos = pos
+
+    def _is_item_path(self):
+        # root {} -> "sections" [] -> section {} -> "items" [] -> (item just closed)
+        stack = self._stack
+        return (
+            len(stack) == 4
+            and stack[0]['type'] == '{' and stack[0]['key'] == 'sections'
+            and stack[1]['type'] == '['
+            and stack[2]['type'] == '{' and stack[2]['key'] == 'items'
+            and stack[3]['type'] == '['
+        )
+
+    def _on_string(self, value):
+        frame = self._stack[-1] if self._stack else None
+        if frame is None or frame['type'] != '{':
+            return
+        if frame['expect_key']:
+            frame['key'] = value
+        elif len(self._stack) == 3 and frame['key'] == 'name':
+            frame['section_name'] = value
+            if frame.get('pending'):
+                self._flush(frame, value)
+
+    def _emit(self, raw):
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        section = self._stack[2]
+        if 'section_name' in section:
+            self._deliver(section['section_name'], item)
+        else:
+            section.setdefault('pending', []).append(item)
+
+    def _flush(self, section, section_name):
+        pending, section['pending'] = section['pending'], []
+        for item in pending:
+            self._deliver(section_name, item)
+
+    def _deliver(self, section_name, item):
+        self.items.append((section_name, item))
+        if self.on_item:
+            self.on_item(section_name, item)
+
+    def document(self):
+        """Return the parsed root object once complete and valid, else None."""
+        if not self.complete:
+            return None
+        try:
+            return json.loads(self.text[self._root_start:self._pos])
+        except json.JSONDecodeError:
+            return None
+
+class PartialResults:
+    """Thread-safe collector for items streamed from several groups.
+
+    convert turns (section_name, item) into an aggregation row (e.g.
+    comprehensive_cleanup.convert_estimation_item); rows are appended to
+    partial_path as they arrive so a long run can be inspected mid-flight.
+    """
+
+    def __init__(self, partial_path, convert, report_every=10):
+        self.partial_path = partial_path
+        self.convert = convert
+        self.report_every = report_every
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._verified = {}
+        self._total = 0
+
+    def parser_for(self, group):
+        """Return a fresh parser feeding this group's rows (discarding earlier attempts)."""
+        with self._lock:
+            self._rows[group] = []
+            self._verified.pop(group, None)
+        return IncrementalItemsParser(lambda section, item: self.add(group, section, item))
+
+    def add(self, group, section_name, item):
+        row = self.convert(section_name, item)
+        with self._lock:
+            self._rows.setdefault(group, []).append(row)
+            self._total += 1
+            with open(self.partial_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'group': group, 'item': row}) + "\n")
+            if self._total % self.report_every == 0:
+                print(f"[PARTIAL] {self._total} items streamed so far (group {group}: {len(self._rows[group])})")
+
+    def finish(self, group, parser):
+        """Keep a group's rows only if its response parsed as a complete JSON document."""
+        with self._lock:
+            rows = self._rows.get(group, [])
+            if parser.document() is not None:
+                self._verified[group] = rows
+                print(f"[INFO] Group {group}: {len(rows)} items parsed while streaming")
+            else:
+                print(f"[WARNING] Group {group}: streamed response was not complete JSON; will re-parse output file")
+
+    def verified_items(self):
+        """Return {group_number: rows} for groups whose stream parsed completely."""
+        with self._lock:
+            return dict(self._verified)
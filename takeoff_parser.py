@@ -0,0 +1,260 @@
+"""
+takeoff_parser.py
+
+Structured takeoff parsing: read (description, quantity, unit) rows from a
+text, CSV or XLSX takeoff, price the ones that clearly match a row of
+master_pricing_data.csv, and leave only the rest for the LLM.
+
+Text lines are matched with compiled patterns ("Tile floor - 120 SF",
+"(6) recessed lights", "Outlets x 4", "Baseboard: 85 LF"); a line holding
+only a room name ("KITCHEN", "Bathroom 2:") sets the room for the lines
+below it. CSV/XLSX sheets are read by their header (description/item,
+quantity/qty, unit/uom, optional room); sheets without one are read as text
+lines.
+
+A row is priced when one pricing row with a numeric price and a compatible
+unit shares enough words with its description (Dice score >= MATCH_THRESHOLD)
+and every differently priced row scores at least MATCH_GAP lower. Pricing
+rows of another room (Subcategory or Category 'Bathroom' for a line under
+KITCHEN) are not candidates. It is priced by
+pricing_engine like any other coded item; trade minimums are applied by
+cleanup.
+"""
+import csv
+import os
+import re
+
+from pricing_catalog import PRICING_CSV, get_catalog
+from pricing_engine import price_lines
+from pricing_router import ROOM_KEYWORDS
+
+TAKEOFF_ESTIMATE_NAME = 'takeoff_estimate.json'
+MATCH_THRESHOLD = 0.5
+MATCH_GAP = 0.15  # margin over the best differently priced row; closer matches go to the LLM
+LOCAL_CONFIDENCE = "95"
+
+# Unit spellings -> takeoff unit; pricing units accepted for each
+_UNIT_PATTERNS = [
+    ('SF', r'sq\.?\s*f(?:ee)?t\.?|sqft|square\s+f(?:ee|oo)t|s\.?f\.?'),
+    ('LF', r'lin(?:ear)?\.?\s*f(?:ee|oo)?t\.?|l\.?f\.?'),
+    ('EA', r'each|ea\.?|pcs?\.?|pieces?|units?|qty'),
+    ('LS', r'l\.?s\.?|lump\s+sum'),
+]
+UNIT_MATCHES = {'SF': {'SF'}, 'LF': {'LF'}, 'EA': {'EA', 'UNIT'}, 'LS': {'LS', 'UNIT'}}
+_UNIT = '|'.join(f'(?P<{name}>{pattern})' for name, pattern in _UNIT_PATTERNS)
+_NUMBER = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+
+# "Tile floor - 120 SF", "Baseboard: 85 LF", "120 sf of tile floor"
+_QTY_UNIT = re.compile(rf'(?<![\w.])(?P<qty>{_NUMBER})\s*(?:{_UNIT})(?![\w])', re.IGNORECASE)
+# "(6) recessed lights", "6 x outlets", "6 - outlets"
+_LEADING_COUNT = re.compile(r'^\(?(?P<qty>\d+)\)?\s*(?:x|-|–)?\s*(?P<desc>[A-Za-z].*)$', re.IGNORECASE)
+# "Outlets x 4", "Outlets - 4", "Outlets: 4", "Outlets qty 4"
+_TRAILING_COUNT = re.compile(r'^(?P<desc>[A-Za-z].*?)\s*(?:x|-|–|:|qty\.?)\s*(?P<qty>\d+)$', re.IGNORECASE)
+_BULLET = re.compile(r'^\s*(?:[-*•]+|\d+[.)])\s+')
+_ROOM_LINE = re.compile(
+    r'^(?P<room>(?:' + '|'.join(re.escape(room) for room in ROOM_KEYWORDS) + r')s?(?:\s*(?:#\s*)?\d+)?)\s*:?\s*$',
+    re.IGNORECASE,
+)
+_WORD = re.compile(r'[a-z]+')
+_STOPWORDS = {'a', 'an', 'and', 'at', 'for', 'from', 'in', 'new', 'of', 'on', 'or', 'the', 'to', 'with', 'n', 'na',
+              'standard', 'existing'}
+
+HEADER_ALIASES = {
+    'description': ('description', 'item', 'scope', 'scope item', 'item description', 'task'),
+    'quantity': ('quantity', 'qty', 'count', 'amount'),
+    'unit': ('unit', 'units', 'uom', 'unit of measure'),
+    'room': ('room', 'location', 'area name', 'space'),
+}
+
+def normalize_unit(text):
+    m = re.fullmatch(_UNIT, text.strip(), re.IGNORECASE)
+    return m.lastgroup if m else None
+
+def _number(text):
+    return float(text.replace(',', ''))
+
+def _clean_description(text):
+    return re.sub(r'\s+', ' ', text.strip(' \t-–:;,.()')).strip()
+
+def parse_line(line):
+    """Return {'description', 'quantity', 'unit'} for a takeoff text line, or None."""
+    line = _BULLET.sub('', line).strip()
+    if not line:
+        return None
+    m = _QTY_UNIT.search(line)
+    if m:
+        description = _clean_description(line[:m.start()] + ' ' + re.sub(r'^\s*of\b', '', line[m.end():]))
+        if description:
+            return {'description': description, 'quantity': _number(m.group('qty')), 'unit': m.lastgroup}
+        return None
+    for pattern in (_LEADING_COUNT, _TRAILING_COUNT):
+        m = pattern.match(line)
+        if m:
+            description = _clean_description(m.group('desc'))
+            if description:
+                return {'description': description, 'quantity': float(m.group('qty')), 'unit': 'EA'}
+    return None
+
+def parse_text_lines(lines):
+    """Yield (row or None, line, room) for each non-empty line; room headers set the room."""
+    room = ''
+    for line in lines:
+        text = line.strip()
+        if not text:
+            continue
+        m = _ROOM_LINE.match(text)
+        if m:
+            room = m.group('room').strip().title()
+            continue
+        yield parse_line(text), text, room
+
+def _header_map(header):
+    columns = {}
+    for index, name in enumerate(header):
+        name = str(name or '').strip().lower()
+        for field, aliases in HEADER_ALIASES.items():
+            if name in aliases and field not in columns:
+                columns[field] = index
+    return columns if {'description', 'quantity'} <= set(columns) else None
+
+def parse_table(records):
+    """Yield (row or None, line, room) from sheet records, by header or else as text lines."""
+    records = [[('' if cell is None else str(cell)).strip() for cell in record] for record in records]
+    records = [record for record in records if any(record)]
+    if not records:
+        return
+    columns = _header_map(records[0])
+    if columns is None:
+        yield from parse_text_lines(' '.join(cell for cell in record if cell) for record in records)
+        return
+    get = lambda record, field: record[columns[field]] if field in columns and columns[field] < len(record) else ''
+    for record in records[1:]:
+        line = ' | '.join(cell for cell in record if cell)
+        description = _clean_description(get(record, 'description'))
+        unit = normalize_unit(get(record, 'unit')) if get(record, 'unit') else 'EA'
+        try:
+            quantity = _number(get(record, 'quantity'))
+        except ValueError:
+            quantity = None
+        row = None
+        if description and quantity is not None and unit:
+            row = {'description': description, 'quantity': quantity, 'unit': unit}
+        yield row, line, get(record, 'room').title()
+
+def read_takeoff(path):
+    """Yield (row or None, line, room) for every entry of a .txt/.csv/.xlsx takeoff."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from parse_table(csv.reader(f))
+    elif ext in ('.xlsx', '.xlsm'):
+        from openpyxl import load_workbook
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield from parse_table(sheet.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from parse_text_lines(f)
+
+def _words(text):
+    return {word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+            for word in _WORD.findall(text.lower())} - _STOPWORDS
+
+def build_match_index(records):
+    """Pricing catalog records that can be priced locally, with their match words."""
+    index = []
+    for record in records:
+        unit = record['unit']
+        if record['unit_cost'] is None or unit not in {'SF', 'LF', 'EA', 'UNIT', 'LS'}:
+            continue
+        size = record['size'] if record['size'].upper() not in ('N/A', 'STANDARD', '') else ''
+        rooms = {record[key].lower() for key in ('subcategory', 'category')} & set(ROOM_KEYWORDS)
+        index.append({
+            'record': record, 'unit': unit, 'unit_cost': record['unit_cost'], 'rooms': rooms,
+            'words': _words(f"{record['description']} {record['subcategory']} {size}"),
+        })
+    return index
+
+def room_kinds(room):
+    """Room keywords named by a takeoff room heading ('Bathroom 2' -> {'bathroom'})."""
+    text = f" {re.sub(r'[^a-z]+', ' ', str(room).lower())} "
+    return {keyword for keyword in ROOM_KEYWORDS if f" {keyword} " in text}
+
+def match_pricing(takeoff_row, index, room=''):
+    """Return the index entry that prices takeoff_row, or None if none clearly does.
+
+    Entries for another room than the line's are skipped; a best match within
+    MATCH_GAP of a differently priced entry is ambiguous and left to the LLM.
+    """
+    words = _words(takeoff_row['description'])
+    if not words:
+        return None
+    allowed = UNIT_MATCHES[takeoff_row['unit']]
+    kinds = room_kinds(room)
+    scored = []
+    for entry in index:
+        if entry['unit'] not in allowed or not entry['words']:
+            continue
+        if kinds and entry['rooms'] and not entry['rooms'] & kinds:
+            continue
+        shared = len(words & entry['words'])
+        if shared:
+            scored.append((2 * shared / (len(words) + len(entry['words'])), entry))
+    if not scored:
+        return None
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    best_score, best = scored[0]
+    if best_score < MATCH_THRESHOLD:
+        return None
+    if any(best_score - score < MATCH_GAP and entry['unit_cost'] != best['unit_cost'] for score, entry in scored[1:]):
+        return None  # ambiguous; let the LLM decide
+    return best
+
+def price_item(takeoff_row, entry, room, line):
+    """Return (section name, estimate item) in the estimation JSON schema."""
+    record = entry['record']
+    priced = price_lines([record['item_code']], [f"{takeoff_row['quantity']:g} {takeoff_row['unit']}"])[0]
+    scope = record['description']
+    if record['size'] and record['size'].upper() != 'N/A':
+        scope += f" ({record['size']})"
+    return record['category'], {
+        'room': room or 'General',
+        'scope_item': scope,
+        'item_code': record['item_code'],
+        'description': f"{line} [takeoff, priced from {record['item_code']}]",
+        'quantity': f"{takeoff_row['quantity']:g} {priced['unit']}",
+        'unit_cost': f"${priced['unit_cost']:.2f} per {priced['unit']}",
+        'markup': f"{priced['margin'].normalize():f}",
+        'subtotal': f"{priced['subtotal']:.2f}",
+        'confidence_score': LOCAL_CONFIDENCE,
+    }
+
+def parse_structured_takeoff(path, pricing_csv=PRICING_CSV):
+    """Price what the takeoff states explicitly.
+
+    Returns (estimate, unmatched_lines, stats): estimate is the
+    {'sections': [...]} JSON of priced items; unmatched_lines (prefixed with
+    their room) are left for the LLM.
+    """
+    index = build_match_index(get_catalog(pricing_csv))
+    sections = {}
+    unmatched = []
+    stats = {'lines': 0, 'rows': 0, 'priced': 0}
+    for takeoff_row, line, room in read_takeoff(path):
+        stats['lines'] += 1
+        entry = None
+        if takeoff_row is not None:
+            stats['rows'] += 1
+            entry = match_pricing(takeoff_row, index, room)
+        if entry is None:
+            unmatched.append(f"{room}: {line}" if room else line)
+            continue
+        section, item = price_item(takeoff_row, entry, room, line)
+        sections.setdefault(section, []).append(item)
+        stats['priced'] += 1
+    stats['unmatched'] = len(unmatched)
+    estimate = {'sections': [{'name': name, 'items': items} for name, items in sections.items()]}
+    return estimate, unmatched, stats
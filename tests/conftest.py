@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(autouse=True)
+def repo_root(monkeypatch):
+    """Pipeline modules resolve master_pricing_data.csv and friends relative to the repository root."""
+    monkeypatch.chdir(ROOT)
+    return ROOT
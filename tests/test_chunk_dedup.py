@@ -0,0 +1,39 @@
+from chunk_dedup import NUM_PERM, containment, dedup_chunks, minhash, shingles
+
+TOPICS = ['kitchen cabinets', 'bathroom tile', 'bedroom closet', 'living room floor', 'hallway lighting',
+          'laundry plumbing', 'office windows', 'entry door', 'terrace railing', 'basement drywall']
+
+def turn(topic, variant=0):
+    """A speaker turn of about 40 distinct words."""
+    return (f'Speaker {variant}: For the {topic} we agreed on option {variant}, measured it twice on site, '
+            f'checked the {topic} against the drawings, asked the supplier for the {topic} lead time, '
+            f'and the owner wants the {topic} finished before the painters arrive in week {variant + 3}.')
+
+def chunk(*topics):
+    return '\n'.join(turn(topic, i) for i, topic in enumerate(topics))
+
+def test_minhash_agreement_tracks_similarity():
+    a, b, c = shingles(turn('kitchen cabinets')), shingles(turn('kitchen cabinets', 1)), shingles(turn('entry door'))
+    sig_a = minhash(a)
+    assert minhash(set(a)) == sig_a and len(sig_a) == NUM_PERM
+    same = lambda x, y: sum(p == q for p, q in zip(x, y)) / NUM_PERM
+    assert same(sig_a, minhash(b)) > same(sig_a, minhash(c))
+    assert containment(a, a | c) == 1.0 and containment(set(), a) == 0.0
+
+def test_repeated_turns_are_dropped_but_overlap_with_the_previous_chunk_is_kept():
+    chunks = [chunk(*TOPICS[0:3]), chunk(TOPICS[2], *TOPICS[3:6]), chunk(TOPICS[0], *TOPICS[6:9])]
+    texts, report = dedup_chunks(chunks)
+    assert texts[:2] == chunks[:2]  # chunk 2 repeats chunk 1's last turn: deliberate overlap
+    assert turn(TOPICS[0]) not in texts[2] and turn(TOPICS[6], 1) in texts[2]
+    assert [(d['chunk'], d['duplicate_of_chunk']) for d in report['paragraphs_dropped']] == [(3, 1)]
+    assert report['chunks_dropped'] == []
+
+def test_chunks_covered_by_earlier_text_are_dropped():
+    chunks = [chunk(*TOPICS[0:4]), chunk(*TOPICS[4:8]), chunk(*TOPICS[0:4]), 'Ok.\nThanks, bye.']
+    texts, report = dedup_chunks(chunks)
+    assert texts[2] is None and texts[3] == 'Ok.\nThanks, bye.'  # short lines are never matched
+    assert report['chunks_dropped'][0]['chunk'] == 3
+
+def test_distinct_chunks_are_untouched():
+    chunks = [chunk(*TOPICS[i:i + 2]) for i in range(0, 10, 2)]
+    assert dedup_chunks(chunks) == (chunks, {'threshold': 0.8, 'paragraphs_dropped': [], 'chunks_dropped': []})
@@ -0,0 +1,50 @@
+import json
+
+import chunk_store
+from chunk_store import ChunkStore, count_chunks, load_chunks, write_chunk_store
+from token_chunker import iter_token_chunks
+
+PIECES = [f'Speaker {i % 2}: Pièce {i} — the café wall gets 12 m² of tile, then trim and paint. ✓\n\n'
+          for i in range(60)]
+
+def chunker(pieces):
+    return iter_token_chunks(pieces, max_tokens=120, overlap_tokens=20)
+
+def test_index_offsets_slice_the_source_file(tmp_path):
+    count = write_chunk_store(str(tmp_path), iter(PIECES), chunker)
+    source = ''.join(PIECES)
+    expected = list(iter_token_chunks(iter(PIECES), max_tokens=120, overlap_tokens=20))
+    assert count == len(expected) > 3
+    assert (tmp_path / 'transcript_text.txt').read_text(encoding='utf-8') == source
+    index = json.loads((tmp_path / 'chunk_index.json').read_text())['chunks']
+    data = source.encode('utf-8')
+    for entry, chunk in zip(index, expected):
+        assert data[entry['offset']:entry['offset'] + entry['length']].decode('utf-8') == chunk['text']
+        assert source[entry['start']:entry['end']] == chunk['text']
+    assert index[1]['start'] < index[0]['end']  # chunks overlap
+    assert not list(tmp_path.glob('chunk_*.txt'))
+    assert load_chunks(str(tmp_path)) == ([f'chunk_{n}' for n in range(1, count + 1)], [c['text'] for c in expected])
+
+def test_large_sources_are_memory_mapped(tmp_path, monkeypatch):
+    write_chunk_store(str(tmp_path), iter(PIECES), chunker)
+    _, texts = load_chunks(str(tmp_path))
+    monkeypatch.setattr(chunk_store, 'MMAP_MIN_BYTES', 1)
+    with ChunkStore(str(tmp_path)) as store:
+        assert not isinstance(store._data, bytes)
+        assert store.texts() == texts
+
+def test_chunk_files_are_written_on_request_and_old_layouts_load(tmp_path):
+    store_dir, old_dir = tmp_path / 'store', tmp_path / 'old'
+    store_dir.mkdir()
+    old_dir.mkdir()
+    count = write_chunk_store(str(store_dir), iter(PIECES), chunker, chunk_files=True)
+    _, texts = load_chunks(str(store_dir))
+    assert (store_dir / f'chunk_{count}.txt').read_text(encoding='utf-8') == texts[-1]
+    for n in (1, 2, 10):
+        (old_dir / f'chunk_{n}.txt').write_text(f'text {n}', encoding='utf-8')
+    assert load_chunks(str(old_dir)) == (['chunk_1', 'chunk_2', 'chunk_10'], ['text 1', 'text 2', 'text 10'])
+    assert count_chunks(str(old_dir)) == 3 and count_chunks(str(store_dir)) == count
+
+def test_empty_input_leaves_no_store(tmp_path):
+    assert write_chunk_store(str(tmp_path), iter(['  \n', '']), chunker) == 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,60 @@
+import os
+
+import disk_cache
+import pdf_extraction
+from disk_cache import DiskCache
+
+def test_round_trip_and_miss(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    assert cache.get('missing') is None
+    cache.set('key', {'text': 'Kitchen 12 x 10'})
+    assert cache.get('key') == {'text': 'Kitchen 12 x 10'}
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(disk_cache.time, 'time', lambda: now[0])
+    cache = DiskCache(str(tmp_path), ttl_seconds=60)
+    cache.set('key', 'value')
+    now[0] += 59
+    assert cache.get('key') == 'value'
+    now[0] += 2
+    assert cache.get('key') is None
+    assert not os.path.exists(tmp_path / 'key.json')
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10 ** 6)
+    for age, key in enumerate(['old', 'used', 'new']):
+        cache.set(key, 'x' * 100)
+        os.utime(tmp_path / f'{key}.json', (1000 + age, 1000 + age))
+    assert cache.get('old') == 'x' * 100  # a read makes 'old' the most recently used
+    entry_size = os.path.getsize(tmp_path / 'new.json')
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert sorted(name for name in os.listdir(tmp_path)) == ['new.json', 'old.json']
+
+def test_pdf_text_is_extracted_once_per_content(tmp_path, monkeypatch):
+    calls = []
+    def page_texts(path, start=0, stop=None):
+        calls.append(path)
+        with open(path, encoding='utf-8') as f:
+            yield from f.read().split('\f')[start:stop]
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, 'fake', {
+        'module': 'json', 'version': 'fake-1', 'page_texts': page_texts,
+        'page_count': lambda path: 2,
+    })
+    monkeypatch.setattr(pdf_extraction, '_pdf_cache', DiskCache(str(tmp_path / 'cache')))
+    monkeypatch.setattr(pdf_extraction, '_memo', pdf_extraction.OrderedDict())
+    sheet = tmp_path / 'sheet.pdf'
+    sheet.write_text('Page one\fPage two', encoding='utf-8')
+
+    assert pdf_extraction.extract_pdf_text_cached(str(sheet), workers=1, backend='fake') == 'Page one\nPage two'
+    pdf_extraction._memo.clear()  # a new process: only the disk cache is left
+    copy = tmp_path / 'copy.pdf'
+    copy.write_bytes(sheet.read_bytes())
+    assert pdf_extraction.extract_pdf_text_cached(str(copy), workers=1, backend='fake') == 'Page one\nPage two'
+    assert len(calls) == 1
+
+    sheet.write_text('Page one\fPage 2 revised', encoding='utf-8')
+    assert pdf_extraction.extract_pdf_text_cached(str(sheet), workers=1, backend='fake') == 'Page one\nPage 2 revised'
+    assert len(calls) == 2
@@ -0,0 +1,51 @@
+import threading
+import time
+from argparse import Namespace
+
+import llm_replay
+import rate_limiter
+import run_chunked_estimation
+from run_chunked_estimation import FORCEFUL_INSTRUCTION, dispatch_groups, schedule_longest_first
+
+def test_longest_groups_are_scheduled_first():
+    groups = [['short'], ['a much longer chunk', 'and more'], ['medium text']]
+    assert [number for number, _ in schedule_longest_first(groups)] == [2, 3, 1]
+
+def test_groups_run_concurrently_with_retries_and_failures(tmp_path, monkeypatch):
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+    calls = []
+
+    def estimate(group_file, chunk_instruction, label, retry=False, on_delta=None, pricing_file=None,
+                 transcript_text=None):
+        with lock:
+            calls.append((label, chunk_instruction, pricing_file))
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.05)
+        with lock:
+            state['running'] -= 1
+        if transcript_text.startswith('fail'):
+            raise RuntimeError('API call failed: boom')
+        if transcript_text.startswith('refuse') and not retry:
+            return 'Sorry, I am unable to provide an estimate.'
+        return f'```json\n{{"label": "{label}"}}\n```'
+
+    monkeypatch.setattr(run_chunked_estimation, 'make_inprocess_estimator', lambda *a: estimate)
+    monkeypatch.setattr(llm_replay, 'create_client', lambda api_key=None: object())
+    monkeypatch.setattr(rate_limiter, '_scheduler', None)
+    args = Namespace(dispatch='concurrent', api_key='x', concurrency=3)
+    groups = [['renovate the kitchen ' * 20], ['refuse at first'], ['fail please'], ['paint the bedroom'],
+              ['already estimated']]
+
+    success, failed = dispatch_groups(groups, str(tmp_path), 'Estimate.', args, 'polycam.txt',
+                                      pricing_files={4: 'group_4_pricing.txt'}, skip={5})
+    assert (success, failed) == (3, 1)
+    assert state['peak'] == 3
+    assert rate_limiter.get_scheduler().max_concurrency == 3
+    assert calls[0][0] == 'group_1'  # longest first
+    assert ('group_2_retry', FORCEFUL_INSTRUCTION, None) in calls
+    assert ('group_4', '', 'group_4_pricing.txt') in calls
+    assert not any(label.startswith('group_5') for label, _, _ in calls)
+    assert '"group_2_retry"' in (tmp_path / 'estimate_output_chunk_2.txt').read_text()
+    assert not (tmp_path / 'estimate_output_chunk_3.txt').exists()
@@ -0,0 +1,19 @@
+import os
+
+from estimate_manifest import chunk_hash, find_previous_run, job_key, write_manifest
+
+def make_run(output_dir, name, job, chunks):
+    run_dir = os.path.join(output_dir, name)
+    os.makedirs(run_dir)
+    write_manifest(run_dir, [{'group': 1, 'chunk_hashes': [chunk_hash(text) for text in chunks],
+                              'context_key': 'ctx', 'output': 'estimate_output_chunk_1.txt'}], job_key=job)
+    return run_dir
+
+def test_previous_run_is_limited_to_the_same_job(tmp_path):
+    ours, theirs = job_key('system', 'polycam A'), job_key('system', 'polycam B')
+    hashes = [chunk_hash('Demo the kitchen')]
+    make_run(str(tmp_path), 'run_1', theirs, ['Demo the kitchen'])
+    assert find_previous_run(str(tmp_path), hashes, ours) is None
+    mine = make_run(str(tmp_path), 'run_2', ours, ['Demo the kitchen'])
+    assert find_previous_run(str(tmp_path), hashes, ours)[0] == mine
+    assert find_previous_run(str(tmp_path), hashes, ours, exclude=mine) is None
@@ -0,0 +1,50 @@
+import pytest
+
+from group_planner import (
+    count_message_tokens, count_tokens, first_fit_decreasing, group_messages, plan_groups,
+)
+
+GUARDRAILS = 'Price only the scope in the transcript.'
+PREFIX = 'Estimate the renovation.\n\n=== File 1 (pricing.txt) ===\nKITC-03 Tile floor 12.00\n\n'
+
+def chunk(word, tokens):
+    return ' '.join([word] * tokens)
+
+def test_first_fit_decreasing_fills_bins_largest_first():
+    assert first_fit_decreasing([4, 7, 3, 6, 2], 10) == [[1, 2], [0, 3], [4]]
+    assert first_fit_decreasing([15, 3], 10) == [[0], [1]]
+
+def test_message_tokens_include_chat_overhead():
+    messages = [{'role': 'system', 'content': 'abcd' * 5}, {'role': 'user', 'content': 'abcd' * 10}]
+    content = sum(count_tokens(m['role']) + count_tokens(m['content']) for m in messages)
+    assert count_message_tokens(messages) == content + 2 * 3 + 3
+
+def test_groups_fit_the_budget_and_keep_transcript_order():
+    texts = [chunk('demo', 60), chunk('tile', 90), chunk('paint', 40), chunk('trim', 50), chunk('doors', 70)]
+    budget = 2 * max(count_tokens(text) for text in texts) + 10
+    plan = plan_groups(texts, GUARDRAILS, PREFIX, max_group_tokens=budget)
+    assert sorted(idx for group in plan for idx in group['chunks']) == list(range(len(texts)))
+    assert [group['group'] for group in plan] == list(range(1, len(plan) + 1))
+    for group in plan:
+        assert group['chunks'] == sorted(group['chunks'])
+        assert group['transcript_tokens'] <= budget
+        messages = group_messages(GUARDRAILS, PREFIX, [texts[idx] for idx in group['chunks']], group['group'])
+        assert group['predicted_prompt_tokens'] == count_message_tokens(messages)
+    assert len(plan) < len(texts)
+
+def test_context_budget_splits_groups_and_oversized_chunks_go_alone():
+    texts = [chunk('demo', 30), chunk('tile', 30), chunk('paint', 400)]
+    prompt_limit = count_message_tokens(group_messages(GUARDRAILS, PREFIX, texts[:2], 3)) + 10
+    plan = plan_groups(texts, GUARDRAILS, PREFIX, max_group_tokens=10 ** 6,
+                       context_budget=prompt_limit + 300, completion_tokens=300)
+    assert [group['chunks'] for group in plan] == [[0, 1], [2]]
+    assert plan[0]['predicted_prompt_tokens'] <= prompt_limit < plan[1]['predicted_prompt_tokens']
+
+def test_fixed_groups_stay_together():
+    texts = [chunk('demo', 20), chunk('tile', 20), chunk('paint', 20)]
+    plan = plan_groups(texts, GUARDRAILS, PREFIX, max_group_tokens=1000, fixed_groups=[[0, 2]])
+    assert [group['chunks'] for group in plan] == [[0, 2], [1]]
+
+def test_static_prompt_larger_than_budget_is_an_error():
+    with pytest.raises(ValueError, match='leaves no room for transcript text'):
+        plan_groups(['demo'], GUARDRAILS, PREFIX * 100, max_group_tokens=1000, context_budget=1500, completion_tokens=1000)
@@ -0,0 +1,73 @@
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from llm_replay import CassetteLibrary, ReplayClient, import_run, make_handler, record_exchange
+
+REPLY = '```json\n{"sections": [{"name": "Kitchen", "items": [{"item": "Tile floor"}]}]}\n```'
+
+def messages_for(transcript, prefix='Estimate.'):
+    return [{'role': 'system', 'content': 'Guardrails'},
+            {'role': 'user', 'content': f'{prefix}\n\n[TRANSCRIPT CHUNK] (group_1.txt)\n{transcript}\n'}]
+
+@pytest.fixture
+def cassettes(tmp_path, monkeypatch):
+    monkeypatch.setenv('ESTIMATOR_LLM_RECORD', str(tmp_path))
+    monkeypatch.setenv('ESTIMATOR_REPLAY_SPEED', '0')
+    record_exchange('gpt-4o', messages_for('Tile the kitchen floor'), {'temperature': 0}, REPLY,
+                    usage={'completion_tokens': 25, 'cached_tokens': 1024})
+    record_exchange('gpt-4o', messages_for('Paint the bedroom'), {'temperature': 0}, 'Paint reply')
+    return str(tmp_path)
+
+def test_lookup_prefers_the_exact_request_then_the_transcript(cassettes):
+    library = CassetteLibrary(cassettes)
+    assert library.lookup('gpt-4o', messages_for('Tile the kitchen floor'), {'temperature': 0})[1] == 'exact'
+    cassette, match = library.lookup('gpt-4o', messages_for('Tile the kitchen floor', 'New prompt.'), {'temperature': 0})
+    assert (cassette['content'], match) == (REPLY, 'transcript')
+    unknown = messages_for('Replace the windows')
+    first, match = library.lookup('gpt-4o', unknown, {})
+    assert match == 'fallback' and library.lookup('gpt-4o', unknown, {})[0] is first
+
+def test_client_replays_plain_and_streamed_completions(cassettes):
+    client = ReplayClient(cassettes)
+    messages = messages_for('Tile the kitchen floor')
+    response = client.chat.completions.create(model='gpt-4o', messages=messages, temperature=0)
+    assert response.choices[0].message.content == REPLY
+    assert response.usage.completion_tokens == 25
+    assert response.usage.prompt_tokens_details.cached_tokens == 1024
+
+    chunks = list(client.chat.completions.create(model='gpt-4o', messages=messages, temperature=0,
+                                                 stream=True, stream_options={'include_usage': True}))
+    assert ''.join(c.choices[0].delta.content or '' for c in chunks if c.choices) == REPLY
+    assert chunks[-1].usage.completion_tokens == 25
+
+def test_existing_runs_are_imported(tmp_path):
+    run_dir = tmp_path / 'run'
+    (run_dir / 'transcript_groups').mkdir(parents=True)
+    (run_dir / 'transcript_groups' / 'group_1.txt').write_text('Tile the kitchen floor', encoding='utf-8')
+    (run_dir / 'estimate_output_chunk_1.txt').write_text(
+        f'[INFO] Sending...\n[RESPONSE]\n{REPLY}\n[SUCCESS] Response saved', encoding='utf-8')
+    (run_dir / 'estimate_output_chunk_2.txt').write_text('[ERROR] API call failed', encoding='utf-8')
+    assert import_run(str(run_dir), str(tmp_path / 'cassettes')) == 1
+    cassette, match = CassetteLibrary(str(tmp_path / 'cassettes')).lookup('gpt-4o', messages_for('Tile the kitchen floor'), {})
+    assert (cassette['content'], match) == (REPLY, 'transcript')
+
+def test_http_stand_in_answers_chat_completions(cassettes):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(CassetteLibrary(cassettes)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        request = urllib.request.Request(
+            f'http://127.0.0.1:{server.server_port}/v1/chat/completions',
+            data=json.dumps({'model': 'gpt-4o', 'messages': messages_for('Paint the bedroom'), 'temperature': 0}).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request) as response:
+            body = json.load(response)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert body['choices'][0]['message']['content'] == 'Paint reply'
+    assert body['usage']['prompt_tokens'] > 0
@@ -0,0 +1,87 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import pdf_extraction
+from pdf_extraction import extract_pdf_text, get_pdf_backend, iter_pdf_pages
+
+PAGES = [f'Page {number} text' if number % 7 else None for number in range(40)]
+
+@pytest.fixture
+def backend(monkeypatch):
+    """A 40-page fake backend whose early pages are the slowest to extract."""
+    calls = []
+    def page_texts(path, start=0, stop=None):
+        calls.append((start, stop))
+        for number in range(start, len(PAGES) if stop is None else min(stop, len(PAGES))):
+            time.sleep((len(PAGES) - number) / 20000)
+            yield PAGES[number]
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, 'fake', {
+        'module': 'json', 'version': 'fake-1', 'page_texts': page_texts, 'page_count': lambda path: len(PAGES),
+    })
+    # Threads stand in for the worker processes; sharding and ordering are the same
+    monkeypatch.setattr(pdf_extraction, 'ProcessPoolExecutor', ThreadPoolExecutor)
+    monkeypatch.setattr(pdf_extraction, 'PARALLEL_MIN_PAGES', 16)
+    return calls
+
+def test_parallel_extraction_matches_serial(backend):
+    serial = extract_pdf_text('t.pdf', workers=1, backend='fake')
+    assert backend == [(0, None)]
+    assert extract_pdf_text('t.pdf', workers=4, backend='fake') == serial
+    # 4 workers x SHARDS_PER_WORKER ranges of ceil(40 / 16) = 3 pages
+    assert sorted(backend[1:]) == [(start, start + 3) for start in range(0, 40, 3)]
+
+def test_small_pdfs_are_read_serially(backend, monkeypatch):
+    monkeypatch.setattr(pdf_extraction, 'PARALLEL_MIN_PAGES', 100)
+    assert list(iter_pdf_pages('t.pdf', workers=4, keep_empty=True, backend='fake')) == [p or '' for p in PAGES]
+    assert backend == [(0, None)]
+
+def test_failed_pool_falls_back_to_serial_from_the_next_page(backend, monkeypatch):
+    def broken_pool(pdf_path, page_count, workers, backend_name=None):
+        yield pdf_extraction._extract_page_range(pdf_path, 0, 10, backend_name)
+        raise OSError('no process support')
+    monkeypatch.setattr(pdf_extraction, '_iter_shards_parallel', broken_pool)
+    assert list(iter_pdf_pages('t.pdf', workers=4, keep_empty=True, backend='fake')) == [p or '' for p in PAGES]
+    assert backend == [(0, 10), (10, None)]
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown PDF backend 'nope'"):
+        get_pdf_backend('nope')
+
+def register(monkeypatch, name, pages, module='json'):
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, name, {
+        'module': module, 'version': f'{name}-1', 'page_count': lambda path: len(pages),
+        'page_texts': lambda path, start=0, stop=None: iter(pages[start:stop]),
+    })
+
+def test_backend_is_chosen_per_call_and_keys_the_cache(tmp_path, monkeypatch):
+    register(monkeypatch, 'fake', ['Kitchen tile'])
+    register(monkeypatch, 'other', ['Kitchen  tile'])
+    register(monkeypatch, 'missing', [], module='no_such_pdf_library')
+    pdf = tmp_path / 'sheet.pdf'
+    pdf.write_bytes(b'%PDF-1.3')
+    monkeypatch.setenv('ESTIMATOR_PDF_BACKEND', 'other')
+    assert extract_pdf_text(str(pdf), workers=1) == 'Kitchen  tile'
+    assert extract_pdf_text(str(pdf), workers=1, backend='fake') == 'Kitchen tile'
+    assert (pdf_extraction.extraction_cache_key(str(pdf), 'fake')
+            != pdf_extraction.extraction_cache_key(str(pdf), 'other'))
+    available = pdf_extraction.available_pdf_backends()
+    assert 'fake' in available and 'missing' not in available
+
+def test_backend_comparison_reports_agreement_with_the_first_backend(monkeypatch):
+    import benchmark_pipeline
+    register(monkeypatch, 'fake', ['Kitchen tile floor', None, 'Bathroom vanity'])
+    register(monkeypatch, 'other', ['Kitchen tile', 'Bathroom vanity'])
+    def broken(path, start=0, stop=None):
+        raise RuntimeError('cannot open')
+        yield
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, 'broken', dict(pdf_extraction.PDF_BACKENDS['fake'], page_texts=broken))
+    args = SimpleNamespace(pdf_backends=['fake', 'other', 'broken'], pdf=['sample.pdf'])
+    fake, other, failed = benchmark_pipeline.run_backend_comparison(args)
+    assert (fake['pages'], fake['agreement']) == (3, 1.0)
+    assert other['agreement_with'] == 'fake'
+    assert other['agreement'] == benchmark_pipeline.text_agreement('Kitchen tile\nBathroom vanity',
+                                                                   'Kitchen tile floor\n\nBathroom vanity') == 0.8889
+    assert failed['error'] == 'RuntimeError: cannot open'
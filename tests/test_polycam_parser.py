@@ -0,0 +1,53 @@
+import json
+
+import polycam_parser
+from polycam_parser import format_polycam_summary, load_floor_areas, parse_polycam_text, process_polycam
+
+REPORT = """Spatial Report
+Overview
+Number of bedrooms 1
+Number of bathrooms 1
+Total livable floor area 412.5 sf
+Total wall area 1210.0 sf
+Room Floor area Wall area Dimensions Perimeter Ceiling height Volume
+Kitchen 120.00 310.50 (B) 10 x 12 (I) 9.5 x 11.5 44.0 8.5 1020.0
+Bathroom 56.00 190.25 (B) 7 x 8 30.0 8 - 8.5 448.0
+Kitchen
+Overview
+Floor area 120.0 sf
+Wall area (incl. openings) 340.0 sf
+Wall area (excl. openings) 310.5 sf
+Perimeter 44.0 ft
+Ceiling height 8.5 ft
+Dimensions (bounding box) 10 x 12 ft
+"""
+
+def test_summary_table_and_detail_pages_are_merged():
+    geometry = parse_polycam_text(REPORT)
+    assert geometry['overview'] == {'bedrooms': 1.0, 'bathrooms': 1.0, 'livable_floor_area_sf': 412.5,
+                                    'wall_area_sf': 1210.0}
+    rooms = {room['room']: room for room in geometry['rooms']}
+    assert sorted(rooms) == ['Bathroom', 'Kitchen']
+    assert rooms['Kitchen']['wall_area_incl_openings_sf'] == 340.0
+    assert rooms['Kitchen']['ceiling_area_sf'] == 120.0
+    assert rooms['Bathroom']['ceiling_height_ft'] == '8-8.5'
+    assert rooms['Bathroom']['dimensions_ft'] == '7 x 8'
+
+def test_summary_is_a_compact_table():
+    summary = format_polycam_summary(parse_polycam_text(REPORT), 'report.pdf')
+    assert summary.startswith('POLYCAM MEASUREMENTS (report.pdf)\nOverview: Bedrooms 1, Bathrooms 1, Livable floor area 412.5 SF')
+    assert '| Kitchen | 120.0 | 310.5 | 120.0 | 44.0 | 8.5 | 10 x 12 |' in summary
+    assert len(summary) < len(REPORT)
+
+def test_process_polycam_writes_the_geometry_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(polycam_parser, 'extract_pdf_text_cached', lambda path: REPORT)
+    summary_path = process_polycam('report.pdf', str(tmp_path))
+    assert summary_path == str(tmp_path / 'polycam_summary.txt')
+    assert len(json.loads((tmp_path / 'polycam_rooms.json').read_text())['rooms']) == 2
+    assert (tmp_path / 'polycam_rooms.csv').read_text().splitlines()[0] == ','.join(polycam_parser.CSV_FIELDS)
+    assert load_floor_areas(str(tmp_path)) == {'total': 412.5, 'rooms': {'Kitchen': 120.0, 'Bathroom': 56.0}}
+
+def test_report_without_rooms_falls_back_to_raw_text(tmp_path, monkeypatch):
+    monkeypatch.setattr(polycam_parser, 'extract_pdf_text_cached', lambda path: 'Scanned page with no text layer')
+    assert process_polycam('report.pdf', str(tmp_path)) is None
+    assert load_floor_areas(str(tmp_path)) is None
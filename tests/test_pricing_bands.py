@@ -0,0 +1,27 @@
+import pytest
+
+from pricing_catalog import get_catalog, parse_size_band
+from pricing_engine import select_bands
+
+@pytest.mark.parametrize('text, band', [
+    ('Up to 600 sf', (0.0, 600.0, 'SF')),
+    ('600 > 1,200 sf', (600.0, 1200.0, 'SF')),
+    ('2500 sf +', (2500.0, float('inf'), 'SF')),
+    ('10 FT +', (10.0, float('inf'), 'FT')),
+    ('Standard', None),
+])
+def test_parse_size_band(text, band):
+    assert parse_size_band(text) == band
+
+@pytest.mark.parametrize('size, code', [(0, 'CLEN-01'), (600, 'CLEN-01'), (601, 'CLEN-02'), (2000, 'CLEN-04'), (9000, 'CLEN-05')])
+def test_select_band_covers_the_size(size, code):
+    assert get_catalog().select_band('CLEN-03', size)['item_code'] == code
+
+def test_select_band_ignores_unbanded_codes():
+    assert get_catalog().select_band('TRIM-02', 100) is None
+
+def test_room_bands_use_the_room_area():
+    areas = {'total': 900, 'rooms': {'Kitchen': 150, 'Bathroom': 70}}
+    items = [{'ItemCode': 'DEMO-03', 'Room': 'Bathroom'}, {'ItemCode': 'CLEN-01', 'Room': 'Bathroom'}]
+    assert select_bands(items, areas) == 2
+    assert [item['ItemCode'] for item in items] == ['DEMO-04', 'CLEN-02']
@@ -0,0 +1,33 @@
+from decimal import Decimal
+
+from pricing_engine import parse_quantity, price_lines
+
+def test_parse_quantity_reads_numbers_and_units():
+    assert parse_quantity('1,200 sq ft') == (Decimal('1200'), 'SF')
+    assert parse_quantity('6') == (Decimal('6'), '')
+    assert parse_quantity('n/a') is None
+
+def test_price_lines_uses_sheet_rates_and_margin():
+    crown, lights = price_lines(['TRIM-02', 'ELEC-09'], ['40 LF', '6 units'])
+    assert crown['labor'] == Decimal('360.00') and crown['material'] == Decimal('320.00')
+    assert crown['subtotal'] == Decimal('1190.00')  # (360 + 320) * 1.75
+    assert lights['unit'] == 'UNIT' and lights['subtotal'] == Decimal('1995.00')
+
+def test_price_lines_rounds_to_the_cent():
+    [line] = price_lines(['FINSH-01'], ['33.33 SF'])
+    assert line['labor'] == Decimal('116.66') and line['subtotal'] == Decimal('204.15')
+
+def test_price_lines_skips_unpriceable_rows():
+    assert price_lines(['NOPE-01', 'TRIM-02', 'TRIM-02', ''], ['1', '40 SF', 'several', '3']) == [None] * 4
+
+def test_bare_count_is_not_priced_per_area():
+    assert price_lines(['FINSH-01', 'TRIM-02', 'ELEC-09'], ['6', '6', '6']) == [None, None, price_lines(['ELEC-09'], ['6 EA'])[0]]
+
+def test_integer_columns_match_without_numpy(monkeypatch):
+    import pricing_engine
+
+    codes, quantities = ['TRIM-02', 'FINSH-01', 'ELEC-09', 'FINSH-01'], ['40 LF', '33.335 SF', '-2 EA', '900000000 SF']
+    expected = price_lines(codes, quantities)
+    assert expected[3]['subtotal'] == Decimal('5512500000.00')  # too large for int64 products
+    monkeypatch.setattr(pricing_engine, 'np', None)
+    assert price_lines(codes, quantities) == expected
@@ -0,0 +1,32 @@
+from pricing_matcher import get_matcher, link_item_codes
+
+def cleaning_item(unit_cost=''):
+    return {'Category': 'Cleaning', 'Room': 'General', 'ItemName': 'Commercial Cleaning',
+            'Description': 'Commercial cleaning of the apartment', 'Quantity': '1 UNIT',
+            'UnitCost': unit_cost, 'Total': '2000.00', 'ItemCode': ''}
+
+def test_banded_rows_are_not_linked_without_areas():
+    item = cleaning_item()
+    assert link_item_codes([item]) == (0, 0)
+    assert item['ItemCode'] == '' and 'SuggestedCode' not in item
+    assert item['Total'] == '2000.00'
+
+def test_text_match_is_only_a_suggestion():
+    item = cleaning_item()
+    assert link_item_codes([item], areas={'total': 450, 'rooms': {}}) == (0, 1)
+    assert item['SuggestedCode'] == 'CLEN-01'
+    assert item['ItemCode'] == '' and item['Total'] == '2000.00'
+
+def test_quoted_rate_links_the_measured_band():
+    item = cleaning_item('$825 per UNIT')
+    assert link_item_codes([item], areas={'total': 450, 'rooms': {}}) == (1, 0)
+    assert item['ItemCode'] == 'CLEN-01'
+
+def test_quoted_rate_of_another_band_is_not_linked():
+    item = cleaning_item('$1,375 per UNIT')
+    assert link_item_codes([item], areas={'total': 450, 'rooms': {}}) == (0, 0)
+    assert item['ItemCode'] == ''
+
+def test_match_ranks_spelling_variants():
+    [candidates] = get_matcher().match(['Recessed lights'], 3)
+    assert candidates[0][0]['description'] == 'Recessed lighting'
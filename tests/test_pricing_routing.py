@@ -0,0 +1,36 @@
+from argparse import Namespace
+
+import send_files_to_chatgpt_text
+from group_planner import count_message_tokens, plan_groups
+from run_chunked_estimation import make_pricing_layout, route_group_pricing
+from send_files_to_chatgpt_text import build_static_prompt, send_files_to_chatgpt
+
+CHUNKS = [
+    'Full gut of the bathroom: new tile floor and tile walls, waterproofing, new vanity and toilet.',
+    'We also talked about the weather and the schedule for next spring.',
+]
+
+def test_groups_are_sized_on_the_pricing_they_are_sent(tmp_path, monkeypatch):
+    sheet, polycam = tmp_path / 'sheet.txt', tmp_path / 'polycam.txt'
+    with open('master_pricing_data.csv', encoding='utf-8') as f:
+        sheet.write_text(f.read(), encoding='utf-8')
+    polycam.write_text('Bathroom 8 x 7 ft, floor area 56 sq ft, ceiling 8 ft', encoding='utf-8')
+    args = Namespace(master_pricing=str(sheet))
+    guardrails, static_prefix = build_static_prompt(str(sheet), str(polycam), 'Estimate.')
+    layout = make_pricing_layout(args, polycam, 'Estimate.', [], static_prefix)
+    plan = plan_groups(CHUNKS, guardrails, static_prefix, max_group_tokens=30,
+                       layout_for=lambda text, number: layout(text, number)[:2])
+    assert [group['chunks'] for group in plan] == [[0], [1]]
+    pricing_files = route_group_pricing(plan, CHUNKS, str(tmp_path), layout)
+    assert list(pricing_files) == [1]  # the small talk keeps the full sheet in the shared prefix
+
+    sent = []
+    monkeypatch.setattr(send_files_to_chatgpt_text, 'request_estimate', lambda client, messages, **kw: sent.append(messages))
+    for group in plan:
+        group_file = tmp_path / f"group_{group['group']}.txt"
+        group_file.write_text(CHUNKS[group['chunks'][0]], encoding='utf-8')
+        send_files_to_chatgpt(str(sheet), str(polycam), str(group_file), 'Estimate.', client=object(),
+                              pricing_subset=pricing_files.get(group['group']))
+    assert [count_message_tokens(messages) for messages in sent] == [group['predicted_prompt_tokens'] for group in plan]
+    assert sent[1][1]['content'].startswith(static_prefix)
+    assert 'Item Code,Description' not in sent[0][1]['content']
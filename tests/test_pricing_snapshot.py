@@ -0,0 +1,82 @@
+import os
+from argparse import Namespace
+import shutil
+
+import pytest
+
+import pricing_catalog
+from pricing_catalog import read_pricing_rows
+from pricing_snapshot import (PricingSnapshot, build, load_snapshot_catalog, sheet_version, validate_catalog,
+                              write_snapshot)
+
+@pytest.fixture
+def catalog_rows():
+    return read_pricing_rows('master_pricing_data.csv')
+
+def test_master_catalog_validates(catalog_rows):
+    errors, _ = validate_catalog(catalog_rows)
+    assert errors == []
+
+def test_snapshot_round_trip(tmp_path, catalog_rows):
+    path = str(tmp_path / 'pricing.bin')
+    write_snapshot(catalog_rows, path, 'Q1-2025', '2025-01-01')
+    with PricingSnapshot(path) as snapshot:
+        assert snapshot.verify()
+        assert (snapshot.version, snapshot.effective_date) == ('Q1-2025', '2025-01-01')
+        assert snapshot.rows() == catalog_rows
+        assert snapshot.row(3) == catalog_rows[3]
+    catalog = load_snapshot_catalog(path)
+    assert catalog.version == 'Q1-2025'
+    assert catalog.get('CLEN-02')['unit_cost'] == pricing_catalog.PricingCatalog(catalog_rows).get('CLEN-02')['unit_cost']
+
+def test_corrupt_snapshot_is_rejected(tmp_path, catalog_rows):
+    path = str(tmp_path / 'pricing.bin')
+    write_snapshot(catalog_rows, path, 'Q1-2025', '2025-01-01')
+    with open(path, 'r+b') as f:
+        f.seek(-10, os.SEEK_END)
+        f.write(b'xxxx')
+    with pytest.raises(ValueError, match='checksum'):
+        load_snapshot_catalog(path)
+    with open(path, 'r+b') as f:
+        f.truncate(50)
+    with pytest.raises(ValueError):
+        PricingSnapshot(path)
+
+def test_get_catalog_prefers_current_snapshot(tmp_path, monkeypatch, repo_root, catalog_rows):
+    monkeypatch.chdir(tmp_path)
+    shutil.copy(os.path.join(repo_root, 'master_pricing_data.csv'), tmp_path)
+    assert pricing_catalog.get_catalog().version is None
+    write_snapshot(catalog_rows, 'pricing_snapshot.bin', 'Q1-2025', '2025-01-01')
+    assert pricing_catalog.get_catalog().version == 'Q1-2025'
+    os.utime('master_pricing_data.csv', (os.path.getmtime('pricing_snapshot.bin') + 10,) * 2)
+    assert pricing_catalog.get_catalog().version is None
+
+def test_sheet_version():
+    assert sheet_version('Master Pricing Sheet - Q1 - 2025 (2).pdf') == ('Q1-2025', '2025-01-01')
+    assert sheet_version('Q4-2024') == ('Q4-2024', '2024-10-01')
+    assert sheet_version('master_pricing_data.csv') == (None, None)
+
+def test_validation_errors_stop_the_build(catalog_rows):
+    rows = [dict(row) for row in catalog_rows[:3]]
+    rows[1]['Item Code'] = rows[0]['Item Code']
+    rows[2]['Labor'] = '-5.00'
+    errors, _ = validate_catalog(rows)
+    assert errors == [f"{rows[0]['Item Code']}: duplicate Item Code", f"{rows[2]['Item Code']}: negative Labor -5.00"]
+
+def test_placeholders_and_repeated_rows_are_warnings(catalog_rows):
+    [crown] = [row for row in catalog_rows if row['Item Code'] == 'TRIM-02']
+    rows = [crown, dict(crown, **{'Item Code': 'TEST-01', 'Labor': '999.00'}),
+            dict(crown, **{'Item Code': 'TEST-02', 'Description': 'ADD RADIATOR COVER COSTS', 'Size/Type': 'N/A',
+                           'Unit': 'N/A', 'Labor': '0.00', 'Material': 'N/A'})]
+    errors, warnings = validate_catalog(rows)
+    assert errors == []
+    assert any('TEST-01 repeats TRIM-02' in warning for warning in warnings)
+    assert any("TEST-02: 'ADD RADIATOR COVER COSTS' is a $0 / QUOTE placeholder" in warning for warning in warnings)
+
+def test_build_without_a_version_keeps_the_previous_one(tmp_path):
+    output = str(tmp_path / 'pricing.bin')
+    def run(version):
+        return build(Namespace(source='master_pricing_data.csv', output=output, version=version, effective=None, force=False))
+    assert run(None) == 0 and load_snapshot_catalog(output).version == 'unversioned'
+    assert run('Q2-2025') == 0
+    assert run(None) == 0 and load_snapshot_catalog(output).version == 'Q2-2025'
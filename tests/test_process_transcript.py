@@ -0,0 +1,41 @@
+import pdf_extraction
+from chunk_store import load_chunks
+from pdf_extraction import extract_pdf_text, iter_pdf_pages
+from process_transcript import iter_chunks, process_transcript, split_by_tokens
+
+def transcript_pages(count):
+    return [''.join(f'Speaker {turn % 3}: On page {page} we talked about item {turn}, the tile and the trim. '
+                    f'It was agreed to price it.\n\n' for turn in range(12)) for page in range(count)]
+
+def test_streamed_chunks_match_whole_text_chunking():
+    pages = transcript_pages(30)
+    streamed = list(iter_chunks(iter(pages), max_tokens=300, overlap_tokens=40))
+    assert streamed == split_by_tokens(''.join(pages), max_tokens=300, overlap_tokens=40)
+    assert len(streamed) > 5
+
+def test_chunks_are_yielded_before_the_input_ends():
+    read = []
+    def pages():
+        for page in transcript_pages(200):
+            read.append(page)
+            yield page
+    first = next(iter_chunks(pages(), max_tokens=300, overlap_tokens=40))
+    assert first['start'] == 0
+    assert len(read) < 200
+
+def test_pdf_pages_stream_into_the_chunk_store(tmp_path, monkeypatch):
+    pages = transcript_pages(10)
+    pages[3] = None  # a scanned page without a text layer
+    def page_texts(path, start=0, stop=None):
+        yield from pages[start:stop]
+    monkeypatch.setitem(pdf_extraction.PDF_BACKENDS, 'fake', {
+        'module': 'json', 'version': 'fake-1', 'page_texts': page_texts, 'page_count': lambda path: len(pages),
+    })
+    assert list(iter_pdf_pages('t.pdf', workers=1, backend='fake')) == [p for p in pages if p]
+    assert list(iter_pdf_pages('t.pdf', workers=1, keep_empty=True, backend='fake'))[3] == ''
+    assert extract_pdf_text('t.pdf', workers=1, backend='fake') == '\n'.join(p for p in pages if p).strip()
+
+    assert process_transcript('t.pdf', str(tmp_path), 200, workers=1, overlap_tokens=20, pdf_backend='fake')
+    _, texts = load_chunks(str(tmp_path))
+    expected = split_by_tokens(''.join(p + '\n' for p in pages if p), max_tokens=200, overlap_tokens=20)
+    assert texts == [chunk['text'] for chunk in expected]
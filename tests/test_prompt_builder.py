@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from llm_usage import record_usage, summarize_usage, usage_from_response
+from prompt_builder import build_chunk_suffix, build_messages
+from send_files_to_chatgpt_text import build_static_prompt
+
+def test_routed_pricing_follows_the_shared_prefix(tmp_path):
+    sheet, polycam = tmp_path / 'pricing.txt', tmp_path / 'polycam.txt'
+    sheet.write_text('FULL SHEET ROWS', encoding='utf-8')
+    polycam.write_text('Kitchen 120 sf floor, 8 ft ceiling, two windows and one door', encoding='utf-8')
+    _, full_prefix = build_static_prompt(str(sheet), str(polycam), 'Estimate.')
+    _, routed_prefix = build_static_prompt(str(sheet), str(polycam), 'Estimate.', routed_pricing=True)
+    assert 'FULL SHEET ROWS' in full_prefix
+    assert 'FULL SHEET ROWS' not in routed_prefix and 'Kitchen 120 sf' in routed_prefix
+
+    suffix = build_chunk_suffix('Tile the kitchen floor', 'group_1.txt', pricing_section=('File 1 (group_1_pricing.txt)', 'KITC-03'))
+    assert suffix.index('KITC-03') < suffix.index('Tile the kitchen floor')
+
+def test_shared_sections_come_before_the_chunk(tmp_path):
+    sheet, polycam, scope = tmp_path / 'pricing.txt', tmp_path / 'polycam.txt', tmp_path / 'scope.csv'
+    sheet.write_text('FULL SHEET ROWS', encoding='utf-8')
+    polycam.write_text('Kitchen 120 sf floor, 8 ft ceiling, two windows and one door', encoding='utf-8')
+    scope.write_text('Item,Total\nDemo,500\n', encoding='utf-8')
+    _, prefix = build_static_prompt(str(sheet), str(polycam), 'Estimate.', [str(scope)])
+    order = ['Estimate.', '| Demo | 500 |', 'FULL SHEET ROWS', 'Kitchen 120 sf']
+    assert [prefix.index(part) for part in order] == sorted(prefix.index(part) for part in order)
+
+    groups = [build_messages('Guardrails', prefix, build_chunk_suffix(text, f'group_{i}.txt', 'Only this chunk.'))
+              for i, text in enumerate(['Demo the kitchen', 'Paint the bedroom'], 1)]
+    assert groups[0][0] == groups[1][0]
+    assert all(messages[1]['content'].startswith(prefix) for messages in groups)
+    assert groups[1][1]['content'][len(prefix):] == '[TRANSCRIPT CHUNK] (group_2.txt)\nPaint the bedroom\n\nOnly this chunk.\n'
+
+def test_usage_summary_counts_cached_prompt_tokens(tmp_path):
+    usage = SimpleNamespace(prompt_tokens=2000, completion_tokens=300,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=1536))
+    assert usage_from_response(SimpleNamespace(usage=usage)) == {
+        'prompt_tokens': 2000, 'completion_tokens': 300, 'cached_tokens': 1536}
+    assert usage_from_response(SimpleNamespace(usage=None)) == {}
+
+    log = str(tmp_path / 'llm_usage.jsonl')
+    record_usage({'label': 'group 1', 'prompt_tokens': 2000, 'cached_tokens': 0, 'completion_tokens': 300,
+                  'latency_seconds': 2.0}, log)
+    record_usage({'label': 'group 2', 'prompt_tokens': 2000, 'cached_tokens': 1536, 'completion_tokens': 300,
+                  'latency_seconds': 1.0, 'first_token_seconds': 0.4}, log)
+    record_usage({'label': 'group 3', 'from_cache': True, 'prompt_tokens': 2000}, log)
+    summary = summarize_usage(log)
+    assert (summary['calls'], summary['api_calls'], summary['prompt_tokens'], summary['cached_tokens']) == (3, 2, 4000, 1536)
+    assert summary['cached_ratio'] == 0.384
+    assert summary['first_token_seconds_avg'] == 0.4
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimitScheduler, TokenBucket, classify_error, retry_after_seconds
+
+class APIError(Exception):
+    def __init__(self, status_code, headers=None, code=None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.code = code
+        self.response = SimpleNamespace(headers=headers or {})
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock that time.sleep advances, so retries take no real time."""
+    now = [1000.0]
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(rate_limiter.time, 'sleep', sleep)
+    return sleeps
+
+def failing(errors, result='ok'):
+    errors = list(errors)
+    def fn():
+        if errors:
+            raise errors.pop(0)
+        return result
+    return fn
+
+def test_errors_are_classified():
+    assert classify_error(APIError(429)) == 'rate_limit'
+    assert classify_error(APIError(429, code='insufficient_quota')) is None
+    assert classify_error(APIError(503)) == 'transient'
+    assert classify_error(APIError(400)) is None
+    assert classify_error(ValueError('bad json')) is None
+
+def test_retry_after_headers():
+    assert retry_after_seconds(APIError(429, {'retry-after-ms': '1500'})) == 1.5
+    assert retry_after_seconds(APIError(429, {'retry-after': '7'})) == 7.0
+    assert retry_after_seconds(APIError(429, {'retry-after': 'Wed, 21 Oct 2026 07:28:00 GMT'})) is None
+    assert retry_after_seconds(APIError(429)) is None
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(60)  # one unit per second
+    now = bucket.updated
+    assert bucket.wait_time(60, now) == 0.0
+    bucket.take(60)
+    assert bucket.wait_time(3, now) == pytest.approx(3.0)
+    assert bucket.wait_time(500, now + 30) == pytest.approx(30.0)  # capped at a full bucket
+
+def test_concurrency_halves_on_429_and_grows_additively(clock):
+    scheduler = RateLimitScheduler(max_concurrency=8)
+    assert scheduler.call(failing([APIError(429, {'retry-after': '2'})])) == 'ok'
+    assert clock == [2.0]  # the server's Retry-After, not the backoff
+    assert scheduler.limit == pytest.approx(4 + 1 / 4)
+    for _ in range(4):
+        scheduler.call(failing([]))
+    assert 5 <= scheduler.limit < 6
+    stats = scheduler.stats()
+    assert (stats['calls'], stats['rate_limited'], stats['retries']) == (5, 1, 1)
+
+def test_rate_limit_pauses_the_whole_scheduler(clock):
+    scheduler = RateLimitScheduler(max_concurrency=2)
+    scheduler.call(failing([APIError(429, {'retry-after-ms': '2500'})]))
+    assert scheduler.paused_until == pytest.approx(1000.0 + 2.5)
+
+def test_transient_errors_back_off_without_shrinking(clock):
+    scheduler = RateLimitScheduler(max_concurrency=4, base_delay=1.0)
+    assert scheduler.call(failing([APIError(502), APIError(500)])) == 'ok'
+    assert len(clock) == 2 and 0.5 <= clock[0] <= 1.0 and 1.0 <= clock[1] <= 2.0
+    assert scheduler.limit == 4
+
+def test_quota_and_exhausted_retries_are_raised(clock):
+    scheduler = RateLimitScheduler(max_retries=2)
+    with pytest.raises(APIError):
+        scheduler.call(failing([APIError(429, code='insufficient_quota')]))
+    with pytest.raises(APIError):
+        scheduler.call(failing([APIError(500)] * 3))
+    assert scheduler.stats()['failed'] == 2
+    assert scheduler.in_flight == 0
@@ -0,0 +1,22 @@
+import json
+
+from stream_parser import IncrementalItemsParser
+
+def feed_in_pieces(document, size=7):
+    parser = IncrementalItemsParser()
+    text = "```json\n" + json.dumps(document) + "\n```"
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    return parser
+
+def test_items_are_emitted_with_their_section():
+    parser = feed_in_pieces({'sections': [{'name': 'Kitchen', 'items': [{'item': 'Demo'}, {'item': 'Tile'}]}]})
+    assert parser.items == [('Kitchen', {'item': 'Demo'}), ('Kitchen', {'item': 'Tile'})]
+    assert parser.document() is not None
+
+def test_name_after_items_is_applied_to_held_items():
+    parser = feed_in_pieces({'sections': [
+        {'items': [{'item': 'Vanity'}], 'name': 'Bathroom'},
+        {'items': [{'item': 'Permit'}]},
+    ]})
+    assert parser.items == [('Bathroom', {'item': 'Vanity'}), ('', {'item': 'Permit'})]
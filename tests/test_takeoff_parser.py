@@ -0,0 +1,27 @@
+import pytest
+
+from pricing_catalog import get_catalog
+from takeoff_parser import build_match_index, match_pricing, parse_line
+
+@pytest.fixture(scope='module')
+def index():
+    return build_match_index(get_catalog())
+
+def code(line, index, room=''):
+    entry = match_pricing(parse_line(line), index, room)
+    return entry and entry['record']['item_code']
+
+def test_parse_line_reads_quantity_and_unit():
+    assert parse_line('- Tile floor - 120 SF') == {'description': 'Tile floor', 'quantity': 120.0, 'unit': 'SF'}
+    assert parse_line('(6) recessed lights')['unit'] == 'EA'
+    assert parse_line('Kitchen notes') is None
+
+def test_clear_match_is_priced(index):
+    assert code('Crown molding - 40 LF', index) == 'TRIM-02'
+
+def test_rows_of_another_room_are_skipped(index):
+    assert code('Tile floor - 120 SF', index, 'Bathroom 2') == 'BATH-02'
+    assert code('Tile floor - 120 SF', index, 'Kitchen') != 'BATH-02'
+
+def test_close_runner_up_goes_to_the_llm(index):
+    assert code('Install drywall 300 sf', index) is None
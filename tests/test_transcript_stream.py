@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from process_transcript import extract_text_from_json, iter_json_transcript_text
+from transcript_stream import iter_meeting
+
+SAMPLE = 'archive_non_pipeline_20250909_091152/20250812173901.json'
+
+MEETING = {
+    'id': 42,
+    'summary': 'Kitchen and bath renovation walk-through {draft}',
+    'transcript': {'speaker_blocks': [
+        {'speaker': {'name': 'Ana'}, 'words': 'We want "quartz" counters, 3/4" thick.', 'start': 1.5},
+        {'speaker': {'name': 'Ana'}, 'words': 'And new tile — herringbone [maybe].', 'start': 12.25},
+        {'speaker': {'name': 'Ben'}, 'words': 'Noted: 120 sf of tile, {wall} and floor.', 'start': 30},
+    ]},
+    'action_items': [{'text': 'Send the tile quote'}],
+    'duration': 1800.5,
+    'archived': False,
+}
+
+def write(tmp_path, document):
+    path = tmp_path / 'meeting.json'
+    path.write_text(json.dumps(document, indent=1), encoding='utf-8')
+    return str(path)
+
+@pytest.mark.parametrize('block_chars', [1, 3, 7, 64, 1 << 16])
+def test_events_do_not_depend_on_the_read_size(tmp_path, block_chars):
+    events = list(iter_meeting(write(tmp_path, MEETING), block_chars=block_chars))
+    assert events == [
+        ('field', 'id', 42),
+        ('field', 'summary', MEETING['summary']),
+        *[('block', block) for block in MEETING['transcript']['speaker_blocks']],
+        ('field', 'action_items', MEETING['action_items']),
+        ('field', 'duration', 1800.5),
+        ('field', 'archived', False),
+    ]
+
+def test_list_export_reads_only_the_first_meeting(tmp_path):
+    events = list(iter_meeting(write(tmp_path, [MEETING, {'id': 43}]), block_chars=5))
+    assert ('field', 'id', 43) not in events
+    assert events[0] == ('field', 'id', 42)
+
+def test_streamed_text_matches_the_loaded_document(tmp_path):
+    header_first = {key: MEETING[key] for key in ('id', 'summary', 'action_items', 'transcript')}
+    text = ''.join(iter_json_transcript_text(write(tmp_path, header_first)))
+    assert text == extract_text_from_json(header_first)
+    assert 'Ana: We want "quartz" counters, 3/4" thick. And new tile — herringbone [maybe].\n' in text
+
+def test_fields_after_the_transcript_are_appended(tmp_path):
+    text = ''.join(iter_json_transcript_text(write(tmp_path, MEETING)))
+    assert text.startswith('SUMMARY: Kitchen and bath renovation walk-through {draft}\n\nTRANSCRIPT:\n')
+    assert text.endswith('Ben: Noted: 120 sf of tile, {wall} and floor.\n\nACTION ITEMS: Send the tile quote')
+
+def test_sample_export_streams_every_speaker_block():
+    with open(SAMPLE, encoding='utf-8') as f:
+        document = json.load(f)
+    meeting = document[0] if isinstance(document, list) else document
+    blocks = [event[1] for event in iter_meeting(SAMPLE, block_chars=4096) if event[0] == 'block']
+    assert blocks == meeting['transcript']['speaker_blocks']
+
+def test_truncated_file_is_an_error(tmp_path):
+    path = tmp_path / 'meeting.json'
+    path.write_text(json.dumps(MEETING)[:-40], encoding='utf-8')
+    with pytest.raises(ValueError):
+        list(iter_meeting(str(path), block_chars=16))
@@ -0,0 +1,156 @@
+"""
+token_chunker.py
+
+Token-exact transcript chunking with real overlap.
+
+The text is encoded once and the token array is cut into windows of at most
+max_tokens tokens; each window after the first starts overlap_tokens before
+the end of the previous one. A window end is pulled back to the last
+speaker-turn end (a blank line, or a line break before a "Name: " label) or,
+failing that, sentence end within its final SNAP_FRACTION, and the overlap
+start is moved forward to the next such boundary, so chunks neither stop nor
+restart mid-sentence.
+
+Chunks are dicts with 'text', 'start' and 'end' (character offsets into the
+source, text == source[start:end]) and 'tokens' (the window's exact size).
+
+Without tiktoken, words split into pieces of up to 4 characters stand in for
+tokens (1 token ≈ 4 characters), so sizes are estimates.
+"""
+import re
+
+from group_planner import get_encoding
+
+# How far back from a window's end a break may be moved to land on a boundary
+SNAP_FRACTION = 0.3
+SENTENCE_END = re.compile(r'[.!?]["\')\]]*$')
+SPEAKER_LABEL = re.compile(r'[^\n:]{1,80}:\s')
+APPROX_TOKEN = re.compile(r'\s*\S{1,4}|\s+')
+# Streaming: chunk the buffer once it holds about this many windows
+STREAM_WINDOWS = 4
+STREAM_CHARS_PER_TOKEN = 4
+# Chunks ending this close to the buffer end wait for more text, since the
+# tokens at the end can still change when it arrives
+STREAM_MARGIN_CHARS = 200
+
+def token_offsets(text, model="gpt-4o"):
+    """Encode text once; return (exact, starts) with starts[i] the character offset of token i."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return False, [m.start() for m in APPROX_TOKEN.finditer(text)]
+    tokens = encoding.encode(text, disallowed_special=())
+    _, starts = encoding.decode_with_offsets(tokens)
+    return True, starts
+
+def _boundary_kind(text, offset):
+    """2 at a speaker-turn end, 1 at a sentence end, else 0."""
+    if offset <= 0 or offset >= len(text):
+        return 2
+    before = text[max(0, offset - 8):offset]
+    if before.endswith('\n\n') or (before.endswith('\n') and SPEAKER_LABEL.match(text, offset)):
+        return 2
+    # Wrapped PDF lines end in a line break mid-sentence, so only punctuation counts here
+    if (before[-1:].isspace() or text[offset].isspace()) and SENTENCE_END.search(before.rstrip()):
+        return 1
+    return 0
+
+def _snap_end(text, starts, lo, hi):
+    """Return the token index in (lo, hi] to end a window at: last turn end, else last sentence end, else hi."""
+    sentence = None
+    for idx in range(hi, lo, -1):
+        kind = _boundary_kind(text, starts[idx])
+        if kind == 2:
+            return idx
+        if kind == 1 and sentence is None:
+            sentence = idx
+    return sentence if sentence is not None else hi
+
+def _snap_start(text, starts, lo, hi):
+    """Return the token index in [lo, hi) to start an overlap at: first turn or sentence start, else lo."""
+    for idx in range(lo, hi):
+        if _boundary_kind(text, starts[idx]):
+            return idx
+    return lo
+
+def _make_chunk(text, start, end, tokens):
+    # Trim surrounding whitespace but keep the offsets pointing at the text
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return {'text': text[start:end], 'start': start, 'end': end, 'tokens': tokens}
+
+def _windows(text, starts, max_tokens, overlap_tokens):
+    """Yield (first_token, end_token) windows over the token starts."""
+    count = len(starts)
+    starts = starts + [len(text)]
+    snap = max(1, int(max_tokens * SNAP_FRACTION))
+    first = 0
+    while first < count:
+        end = min(first + max_tokens, count)
+        if end < count:
+            end = _snap_end(text, starts, max(first, end - snap), end)
+        yield first, end
+        if end >= count:
+            return
+        if overlap_tokens:
+            next_first = _snap_start(text, starts, max(first + 1, end - overlap_tokens), end)
+        else:
+            next_first = end
+        first = next_first
+
+def chunk_by_tokens(text, max_tokens, overlap_tokens=0, model="gpt-4o"):
+    """Split text into chunks of at most max_tokens tokens, each overlapping the previous by up to overlap_tokens."""
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+    if not text.strip():
+        return []
+    _, starts = token_offsets(text, model)
+    bounds = starts + [len(text)]
+    chunks = []
+    for first, end in _windows(text, starts, max_tokens, overlap_tokens):
+        chunk = _make_chunk(text, bounds[first], bounds[end], end - first)
+        if chunk['text']:
+            chunks.append(chunk)
+    return chunks
+
+def iter_token_chunks(text_pieces, max_tokens, overlap_tokens=0, model="gpt-4o"):
+    """Chunk a stream of text pieces (e.g. PDF pages), yielding chunks as they are final.
+
+    Offsets are into the concatenation of the pieces. Only the unchunked tail
+    is buffered, so memory stays at a few windows however long the input is.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError(f"overlap_tokens ({overlap_tokens}) must be smaller than max_tokens ({max_tokens})")
+    initial_threshold = STREAM_WINDOWS * max_tokens * STREAM_CHARS_PER_TOKEN
+    threshold = initial_threshold
+    buffer = ""
+    base = 0  # offset of buffer[0] in the whole stream
+
+    def emit(final):
+        nonlocal buffer, base, threshold
+        _, starts = token_offsets(buffer, model)
+        bounds = starts + [len(buffer)]
+        resume = None
+        for first, end in _windows(buffer, starts, max_tokens, overlap_tokens):
+            if not final and bounds[end] > len(buffer) - STREAM_MARGIN_CHARS:
+                resume = bounds[first]
+                break
+            chunk = _make_chunk(buffer, bounds[first], bounds[end], end - first)
+            if chunk['text']:
+                chunk['start'] += base
+                chunk['end'] += base
+                yield chunk
+        if resume is not None:
+            buffer = buffer[resume:]
+            base += resume
+            # Text with many characters per token may not fill a window yet;
+            # wait for twice as much rather than re-encoding on every piece
+            threshold = initial_threshold if resume else 2 * len(buffer)
+
+    for piece in text_pieces:
+        buffer += piece
+        if len(buffer) >= threshold:
+            yield from emit(final=False)
+    if buffer.strip():
+        yield from emit(final=True)
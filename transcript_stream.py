@@ -0,0 +1,131 @@
+"""
+transcript_stream.py
+
+Incremental reader for meeting transcript JSON exports (one meeting object,
+or a list whose first element is the meeting).
+
+iter_meeting(path) reads the file in blocks and yields, in file order:
+
+  ('field', name, value)   each top-level member of the meeting except "transcript"
+  ('block', block)         each transcript.speaker_blocks element
+
+Only the member or speaker block being read is held in memory, so a
+transcript of any length is read with flat memory.
+"""
+import json
+import re
+
+READ_BLOCK_CHARS = 1 << 16
+
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_PLAIN = re.compile(r'[^"{}\[\]:,]+')
+
+class _Frame:
+    __slots__ = ('type', 'key', 'expect_key')
+
+    def __init__(self, type_):
+        self.type = type_
+        self.key = None
+        self.expect_key = type_ == '{'
+
+def iter_meeting(path, block_chars=READ_BLOCK_CHARS):
+    """Stream a transcript JSON file as ('field', name, value) and ('block', block) events."""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from _scan(iter(lambda: f.read(block_chars), ''))
+
+def _scan(pieces):
+    buf = ""
+    pos = 0
+    stack = []
+    meeting_depth = None  # len(stack) while directly inside the meeting object
+    capture = None        # (kind, name, depth) of the value being captured
+    capture_start = 0
+    pieces = iter(pieces)
+    at_eof = False
+
+    while not at_eof:
+        piece = next(pieces, None)
+        if piece is None:
+            at_eof = True
+        else:
+            buf += piece
+
+        while pos < len(buf):
+            ch = buf[pos]
+            frame = stack[-1] if stack else None
+            in_meeting = capture is None and meeting_depth is not None and len(stack) == meeting_depth
+
+            if ch == '"':
+                m = _STRING.match(buf, pos)
+                if m is None:
+                    if at_eof:
+                        raise ValueError("Unterminated string in transcript JSON")
+                    break  # string continues in the next block
+                if frame is not None and frame.type == '{' and frame.expect_key:
+                    frame.key = json.loads(m.group())
+                elif in_meeting and frame.key != 'transcript':
+                    yield ('field', frame.key, json.loads(m.group()))
+                pos = m.end()
+                continue
+
+            if ch in '{[':
+                stack.append(_Frame(ch))
+                depth = len(stack)
+                if meeting_depth is None:
+                    if ch == '{':
+                        meeting_depth = depth
+                elif in_meeting and frame.key != 'transcript':
+                    capture = ('field', frame.key, depth)
+                    capture_start = pos
+                elif capture is None and _is_block_start(stack, meeting_depth):
+                    capture = ('block', None, depth)
+                    capture_start = pos
+            elif ch in '}]':
+                if not stack:
+                    raise ValueError(f"Unexpected '{ch}' in transcript JSON")
+                stack.pop()
+                if capture is not None and len(stack) == capture[2] - 1:
+                    value = json.loads(buf[capture_start:pos + 1])
+                    yield ('field', capture[1], value) if capture[0] == 'field' else ('block', value)
+                    capture = None
+                if meeting_depth is not None and len(stack) < meeting_depth:
+                    return  # rest of a list export is not part of the meeting
+                if not stack:
+                    return
+            elif ch == ':':
+                if frame is not None and frame.type == '{':
+                    frame.expect_key = False
+            elif ch == ',':
+                if frame is not None and frame.type == '{':
+                    frame.expect_key = True
+                    frame.key = None
+            else:
+                m = _PLAIN.match(buf, pos)
+                if m.end() == len(buf) and not at_eof:
+                    break  # a number or literal may continue in the next block
+                value = m.group().strip()
+                if value and in_meeting and frame.key != 'transcript':
+                    yield ('field', frame.key, json.loads(value))
+                pos = m.end()
+                continue
+            pos += 1
+
+        # Drop everything already consumed except a value still being captured
+        keep = capture_start if capture is not None else pos
+        buf = buf[keep:]
+        pos -= keep
+        capture_start = 0
+
+    if stack or meeting_depth is None:
+        raise ValueError("Transcript JSON ended before the meeting object was complete")
+
+def _is_block_start(stack, meeting_depth):
+    # meeting {} -> "transcript" {} -> "speaker_blocks" [] -> block {} (just opened)
+    base = meeting_depth - 1
+    return (
+        len(stack) == meeting_depth + 3
+        and stack[-1].type == '{'
+        and stack[base].key == 'transcript'
+        and stack[base + 1].type == '{' and stack[base + 1].key == 'speaker_blocks'
+        and stack[base + 2].type == '['
+    )